@@ -1,47 +1,45 @@
 """Functions for generating CT images from a trained model."""
 
-import numpy as np
+from pathlib import Path
+from typing import TYPE_CHECKING
+
 import SimpleITK as sitk
 import torch
 from tqdm import tqdm
 
 from ctnerf.constants import MU_AIR, MU_WATER
-from ctnerf.model import XRayModel
-from ctnerf.setup.config import InferenceConfig
+from ctnerf.image_creation import numpy_inference
+from ctnerf.model import TensorVMModel, VoxelGridModel, XRayModel
+from ctnerf.occupancy_grid import OccupancyGrid
+
+if TYPE_CHECKING:
+    # Only imported for type checking, so that running an exported model does not import the
+    # training stack
+    from ctnerf.setup.config import InferenceConfig
 
 
 @torch.no_grad()
-def generate_ct(conf: InferenceConfig) -> None:
+def generate_ct(conf: "InferenceConfig") -> None:
     """Generate a CT image from a trained model.
 
     Args:
         conf (InferenceConfig): The inference configuration.
 
     """
-    # Define image size and spacing, giving x the same value as y
-    original_size = [conf.xray_metadata["size"][0]] + conf.xray_metadata["size"]
-    original_spacing = [conf.xray_metadata["spacing"][0]] + conf.xray_metadata["spacing"]
-
-    # Determine image size and spacing
-    if conf.voxel_spacing is not None:
-        original_spacing = np.array(original_spacing)
-        original_size = np.array(original_size)
-        new_spacing = np.array(conf.voxel_spacing)
-        image_size = (original_size / original_spacing * new_spacing).astype(int)
-        voxel_spacing = conf.voxel_spacing
-    elif conf.image_size is not None:
-        original_spacing = np.array(original_spacing)
-        original_size = np.array(original_size)
-        new_size = np.array(conf.image_size)
-        voxel_spacing = original_spacing * original_size / new_size
-        image_size = conf.image_size
+    if conf.exported_model_path is not None:
+        model = load_exported_model(conf.exported_model_path)
+    else:
+        model = conf.fine_model or conf.coarse_model
 
+    image_size, voxel_spacing = get_image_geometry(conf)
     output = run_inference(
-        conf.fine_model or conf.coarse_model,
+        model,
         image_size,
         conf.chunk_size,
         conf.attenuation_scaling_factor,
         conf.device,
+        autocast_dtype=torch.bfloat16 if conf.precision == "bf16" else None,
+        occupancy_grid=conf.occupancy_grid,
     )
     ct_image = tensor_to_sitk(
         output,
@@ -54,6 +52,23 @@ def generate_ct(conf: InferenceConfig) -> None:
     sitk.WriteImage(ct_image, conf.output_path)
 
 
+def get_image_geometry(conf: "InferenceConfig") -> tuple[list[int], list[float]]:
+    """Get the size and voxel spacing of the CT image to generate.
+
+    Args:
+        conf (InferenceConfig): The inference configuration.
+
+    Returns:
+        tuple[list[int], list[float]]: The image size and voxel spacing.
+
+    """
+    return numpy_inference.get_image_geometry(
+        conf.xray_metadata,
+        conf.voxel_spacing,
+        conf.image_size,
+    )
+
+
 @torch.no_grad()
 def run_inference(
     model: XRayModel,
@@ -61,6 +76,8 @@ def run_inference(
     chunk_size: int,
     attenuation_scaling_factor: float | None,
     device: torch.device,
+    autocast_dtype: torch.dtype | None = None,
+    occupancy_grid: OccupancyGrid | None = None,
 ) -> torch.Tensor:
     """Run inference on the model.
 
@@ -70,6 +87,11 @@ def run_inference(
         chunk_size (int): Number of coordinate points to process in each batch to avoid OOM errors.
         attenuation_scaling_factor (float | None): Scaling factor for attenuation values.
         device (torch.device): The device to run the model inference on.
+        autocast_dtype (torch.dtype | None, optional): If set, the model is run under autocast to
+            this dtype. Defaults to None.
+        occupancy_grid (OccupancyGrid | None, optional): If set, voxels in empty cells of the grid
+            are set to zero attenuation without evaluating the model. Ignored for voxelgrid and
+            tensorvm models. Defaults to None.
 
     Returns:
         torch.Tensor: The output image.
@@ -77,21 +99,16 @@ def run_inference(
     """
     model.eval()
 
-    # Generate coordinates
-    x = torch.linspace(-1, 1, img_size[0])
-    y = torch.linspace(-1, 1, img_size[1])
-    z = torch.linspace(-1, 1, img_size[2])
-    coords = torch.stack(torch.meshgrid((x, y, z), indexing="xy"), dim=-1)
-    coords = coords.view(-1, 3)
-
-    # To avoid oom, inference is done in batches and result stored on cpu
-    output = torch.empty(len(coords), device=torch.device("cpu"))
-    coords = coords.split(chunk_size, dim=0)
-    for i, chunk in enumerate(tqdm(coords, desc="Generating", total=len(coords), leave=False)):
-        chunk = chunk.to(device)
-        output_chunk = model(chunk)
-        output_chunk = output_chunk.view(-1)
-        output[i * chunk_size : (i + 1) * chunk_size] = output_chunk.cpu()
+    with torch.autocast(
+        torch.device(device).type,
+        dtype=autocast_dtype,
+        enabled=autocast_dtype is not None,
+    ):
+        if isinstance(model, VoxelGridModel | TensorVMModel):
+            # The model already holds the image, so it only needs to be resampled
+            output = model.resample((img_size[2], img_size[1], img_size[0])).float().cpu()
+        else:
+            output = _evaluate_lattice(model, img_size, chunk_size, device, occupancy_grid)
 
     # Convert to hounsfield
     if attenuation_scaling_factor is not None:
@@ -99,14 +116,155 @@ def run_inference(
     output = 1000 * (output - MU_WATER) / (MU_WATER - MU_AIR)
     output = output.clamp_min(-1024)
 
+    model.train()
+    return output
+
+
+def _evaluate_lattice(
+    model: XRayModel,
+    img_size: tuple[int, int, int],
+    chunk_size: int,
+    device: torch.device,
+    occupancy_grid: OccupancyGrid | None = None,
+) -> torch.Tensor:
+    """Evaluate the model at every voxel of the output image.
+
+    An XRayModel is evaluated with its separable first layer, see XRayModel.forward_lattice.
+
+    Args:
+        model (XRayModel): The model to evaluate.
+        img_size (tuple[int, int, int]): The size of the output image.
+        chunk_size (int): Number of coordinate points to process in each batch to avoid OOM errors.
+        device (torch.device): The device to run the model inference on.
+        occupancy_grid (OccupancyGrid | None, optional): If set, only the voxels in occupied cells
+            are evaluated. Defaults to None.
+
+    Returns:
+        torch.Tensor: The output of the model, in the orientation of the output image.
+
+    """
+    # Generate coordinates
+    x, y, z = (torch.from_numpy(axis) for axis in numpy_inference.lattice_axes(img_size))
+
+    if isinstance(model, XRayModel):
+        output = _evaluate_lattice_separable(model, x, y, z, chunk_size, device, occupancy_grid)
+    else:
+        coords = torch.stack(torch.meshgrid((x, y, z), indexing="xy"), dim=-1)
+        coords = coords.view(-1, 3)
+
+        # To avoid oom, inference is done in batches and result stored on cpu
+        output = torch.empty(len(coords), device=torch.device("cpu"))
+        coords = coords.split(chunk_size, dim=0)
+        for i, chunk in enumerate(
+            tqdm(coords, desc="Generating", total=len(coords), leave=False),
+        ):
+            chunk = chunk.to(device)
+            if occupancy_grid is not None:
+                output_chunk = occupancy_grid.query(model, chunk)
+            else:
+                output_chunk = model(chunk)
+            output_chunk = output_chunk.view(-1)
+            output[i * chunk_size : (i + 1) * chunk_size] = output_chunk.cpu()
+
     # Reshape and permute to get correct orientation
     output = output.reshape(img_size[0], img_size[1], img_size[2])
-    output = torch.permute(output, (2, 0, 1))
+    return torch.permute(output, (2, 0, 1))
 
-    model.train()
+
+def _evaluate_lattice_separable(
+    model: XRayModel,
+    x: torch.Tensor,
+    y: torch.Tensor,
+    z: torch.Tensor,
+    chunk_size: int,
+    device: torch.device,
+    occupancy_grid: OccupancyGrid | None = None,
+) -> torch.Tensor:
+    """Evaluate an XRayModel on a lattice with XRayModel.forward_lattice.
+
+    The lattice is evaluated in slabs of whole rows along y, holding about chunk_size points each.
+
+    Args:
+        model (XRayModel): The model to evaluate.
+        x (torch.Tensor): shape (X,). Coordinates of the lattice along the x axis.
+        y (torch.Tensor): shape (Y,). Coordinates of the lattice along the y axis.
+        z (torch.Tensor): shape (Z,). Coordinates of the lattice along the z axis.
+        chunk_size (int): Number of coordinate points to process in each batch to avoid OOM errors.
+        device (torch.device): The device to run the model inference on.
+        occupancy_grid (OccupancyGrid | None, optional): If set, only the points in occupied cells
+            are evaluated past the first layer. Defaults to None.
+
+    Returns:
+        torch.Tensor: shape (Y * X * Z,). The output of the model, in the same order as the
+        flattened meshgrid((x, y, z), indexing="xy").
+
+    """
+    x = x.to(device)
+    z = z.to(device)
+    slab_size = len(x) * len(z)
+    output = torch.empty(len(y) * slab_size, device=torch.device("cpu"))
+    slabs = y.split(max(1, chunk_size // slab_size))
+    start = 0
+    for slab in tqdm(slabs, desc="Generating", total=len(slabs), leave=False):
+        slab = slab.to(device)
+        mask = occupancy_grid.lattice_mask(x, slab, z) if occupancy_grid is not None else None
+        output_slab = model.forward_lattice(x, slab, z, mask).view(-1)
+        output[start : start + len(output_slab)] = output_slab.cpu()
+        start += len(output_slab)
     return output
 
 
+def export_model(model: torch.nn.Module, package_path: Path, batch_size: int = 4096) -> Path:
+    """Compile a model ahead of time into an AOTInductor package.
+
+    The model is exported with torch.export, with a dynamic batch dimension, and compiled for the
+    device it is on. The package can be run with load_exported_model without the Python modules
+    of the model.
+
+    Args:
+        model (torch.nn.Module): The model to export.
+        package_path (Path): Path to write the package to. Should end with .pt2.
+        batch_size (int, optional): Batch size of the example input used for tracing. Any batch
+            size can be used with the package. Defaults to 4096.
+
+    Returns:
+        Path: Path of the written package.
+
+    """
+    model.eval()
+    device = next(model.parameters()).device
+    coords = torch.rand(batch_size, 3, device=device) * 2 - 1
+    batch = torch.export.Dim("batch", min=1)
+    with torch.no_grad():
+        exported = torch.export.export(model, (coords,), dynamic_shapes=({0: batch},))
+    return Path(torch._inductor.aoti_compile_and_package(exported, package_path=str(package_path)))  # noqa: SLF001
+
+
+def load_exported_model(package_path: Path) -> torch.nn.Module:
+    """Load a model exported by export_model.
+
+    Args:
+        package_path (Path): Path of the package.
+
+    Returns:
+        torch.nn.Module: Module running the compiled model, with the same forward(coords) contract
+        as the models in ctnerf.model.
+
+    """
+    return _ExportedModel(package_path)
+
+
+class _ExportedModel(torch.nn.Module):
+    """Module wrapping a compiled AOTInductor package, so run_inference can run it like a model."""
+
+    def __init__(self, package_path: Path) -> None:
+        super().__init__()
+        self.compiled_model = torch._inductor.aoti_load_package(str(package_path))  # noqa: SLF001
+
+    def forward(self, coords: torch.Tensor) -> torch.Tensor:
+        return self.compiled_model(coords)
+
+
 def tensor_to_sitk(
     image_tensor: torch.Tensor,
     metadata: dict | None = None,
@@ -127,18 +285,4 @@ def tensor_to_sitk(
         sitk.Image: The sitk image.
 
     """
-    ct_array = image_tensor.numpy().astype(np.int16)
-    ct_image = sitk.GetImageFromArray(ct_array)
-
-    if direction is not None:
-        ct_image.SetDirection(direction)
-    if origin is not None:
-        ct_image.SetOrigin(origin)
-    if spacing is not None:
-        ct_image.SetSpacing(spacing)
-
-    if metadata is not None and "ct_meta" in metadata:
-        for key, value in metadata["ct_meta"].items():
-            ct_image.SetMetaData(key, value)
-
-    return ct_image
+    return numpy_inference.array_to_sitk(image_tensor.numpy(), metadata, direction, origin, spacing)
@@ -0,0 +1,441 @@
+"""NumPy-only runtime for generating CT images from trained XRayModel checkpoints.
+
+Neither torch nor the training stack is imported, so processes that only generate CT images start
+quickly. The checkpoints written by torch.save are read with a restricted unpickler, and only the
+tensors of the requested model are read from the archive. The forward pass and the CT generation
+mirror XRayModel.forward_lattice and run_inference in ct_creation. The fields of inference
+configuration files that do not need torch are also resolved here, so that get_inference_config
+and scripts/generate_ct_numpy.py read them the same way.
+"""
+
+import json
+import pickle
+import zipfile
+from collections import OrderedDict
+from collections.abc import Callable
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+import SimpleITK as sitk
+
+from ctnerf.constants import MU_AIR, MU_WATER
+
+# NumPy dtypes of the torch storage types
+_STORAGE_DTYPES = {
+    "FloatStorage": np.float32,
+    "DoubleStorage": np.float64,
+    "HalfStorage": np.float16,
+    "LongStorage": np.int64,
+    "IntStorage": np.int32,
+    "ShortStorage": np.int16,
+    "CharStorage": np.int8,
+    "ByteStorage": np.uint8,
+    "BoolStorage": np.bool_,
+}
+
+
+class _Storage(NamedTuple):
+    """Reference to a tensor storage in a checkpoint archive."""
+
+    key: str
+    storage_type: str
+
+
+class _LazyTensor(NamedTuple):
+    """Tensor in a checkpoint archive, read when loaded."""
+
+    storage: _Storage
+    offset: int
+    size: tuple[int, ...]
+    stride: tuple[int, ...]
+
+    def load(self, archive: zipfile.ZipFile, prefix: str, byteorder: str) -> np.ndarray:
+        """Read the tensor from the archive."""
+        if self.storage.storage_type not in _STORAGE_DTYPES:
+            msg = f"Unsupported tensor type in checkpoint: {self.storage.storage_type}"
+            raise ValueError(msg)
+        dtype = np.dtype(_STORAGE_DTYPES[self.storage.storage_type]).newbyteorder(
+            "<" if byteorder == "little" else ">",
+        )
+        data = np.frombuffer(archive.read(f"{prefix}data/{self.storage.key}"), dtype=dtype)
+        array = np.lib.stride_tricks.as_strided(
+            data[self.offset :],
+            shape=self.size,
+            strides=[stride * dtype.itemsize for stride in self.stride],
+        )
+        return array.astype(dtype.newbyteorder("="))
+
+
+def _rebuild_tensor(
+    storage: _Storage,
+    storage_offset: int,
+    size: tuple[int, ...],
+    stride: tuple[int, ...],
+    *_args: tuple,
+) -> _LazyTensor:
+    """Stand-in for torch._utils._rebuild_tensor_v2, deferring the read of the tensor."""
+    return _LazyTensor(storage, storage_offset, tuple(size), tuple(stride))
+
+
+class _CheckpointUnpickler(pickle.Unpickler):
+    """Unpickler for checkpoints written by torch.save, allowing only tensors and plain types."""
+
+    def find_class(self, module: str, name: str) -> object:
+        if (module, name) == ("torch._utils", "_rebuild_tensor_v2"):
+            return _rebuild_tensor
+        if module == "torch" and name.endswith("Storage"):
+            return name
+        if (module, name) == ("collections", "OrderedDict"):
+            return OrderedDict
+        msg = f"Unsupported object in checkpoint: {module}.{name}"
+        raise pickle.UnpicklingError(msg)
+
+    def persistent_load(self, pid: tuple) -> _Storage:
+        _, storage_type, key, _, _ = pid  # ("storage", type, key, location, numel)
+        return _Storage(key, storage_type)
+
+
+def load_state_dict(checkpoint_path: Path, model_type: str = "coarse") -> dict[str, np.ndarray]:
+    """Load the state dict of a model in a checkpoint into NumPy arrays.
+
+    Args:
+        checkpoint_path (Path): Path of the checkpoint.
+        model_type (str, optional): 'coarse' or 'fine'. Defaults to 'coarse'.
+
+    Returns:
+        dict[str, np.ndarray]: The state dict of the model.
+
+    """
+    with zipfile.ZipFile(checkpoint_path) as archive:
+        data_pkl = next(name for name in archive.namelist() if name.endswith("data.pkl"))
+        prefix = data_pkl[: -len("data.pkl")]
+        byteorder = "little"
+        if f"{prefix}byteorder" in archive.namelist():
+            byteorder = archive.read(f"{prefix}byteorder").decode()
+        with archive.open(data_pkl) as f:
+            checkpoint = _CheckpointUnpickler(f).load()
+
+        model_config = checkpoint.get("model_config") or {}
+        if model_config.get("encoding", "sinusoidal") != "sinusoidal":
+            msg = "Only models with model.encoding: sinusoidal can be run with NumPy."
+            raise ValueError(msg)
+
+        state_dict = checkpoint[f"{model_type}_model_state_dict"]
+        return {
+            name: tensor.load(archive, prefix, byteorder) for name, tensor in state_dict.items()
+        }
+
+
+class NumpyXRayModel:
+    """NumPy implementation of the forward pass of XRayModel.
+
+    Hidden layers are lists of linear maps, holding the two factors of a LowRankLinear layer.
+    """
+
+    def __init__(self, state_dict: dict[str, np.ndarray]) -> None:
+        """Initialize the NumpyXRayModel.
+
+        Args:
+            state_dict (dict[str, np.ndarray]): State dict of an XRayModel, e.g. from
+                load_state_dict.
+
+        """
+        self.L = state_dict["input_layer.weight"].shape[1] // 6
+        self.layer_dim = state_dict["input_layer.weight"].shape[0]
+        self.input_layer = _get_layer(state_dict, "input_layer")
+        self.pre_concat_layers = _get_layers(state_dict, "pre_concat_layers")
+        self.middle_layer = _get_layer(state_dict, "middle_layer")
+        self.post_concat_layers = _get_layers(state_dict, "post_concat_layers")
+        self.output_layer = _get_layer(state_dict, "output_layer")
+
+    def forward(self, coords: np.ndarray) -> np.ndarray:
+        """Forward pass of the model.
+
+        Args:
+            coords (np.ndarray): shape (B, 3). Input coordinates.
+
+        Returns:
+            np.ndarray: shape (B, 1). Output of the model.
+
+        """
+        angles = self._angles(coords.astype(np.float32)).reshape(len(coords), -1)
+        pos_enc = np.concatenate((np.sin(angles), np.cos(angles)), axis=1)
+
+        x = _relu(_linear(pos_enc, *self.input_layer))
+        for layer in self.pre_concat_layers:
+            x = _relu(_hidden_linear(x, layer))
+
+        x = _relu(_linear(np.concatenate((x, pos_enc), axis=1), *self.middle_layer))
+        for layer in self.post_concat_layers:
+            x = _relu(_hidden_linear(x, layer))
+
+        return _linear(x, *self.output_layer)
+
+    def forward_lattice(self, x: np.ndarray, y: np.ndarray, z: np.ndarray) -> np.ndarray:
+        """Evaluate the model at every point of an axis-aligned lattice.
+
+        Uses the separable first layer of XRayModel.forward_lattice.
+
+        Args:
+            x (np.ndarray): shape (X,). Coordinates of the lattice along the x axis.
+            y (np.ndarray): shape (Y,). Coordinates of the lattice along the y axis.
+            z (np.ndarray): shape (Z,). Coordinates of the lattice along the z axis.
+
+        Returns:
+            np.ndarray: shape (Y, X, Z, 1). Output of the model at each point.
+
+        """
+        L, layer_dim = self.L, self.layer_dim  # noqa: N806
+        weight = np.concatenate((self.input_layer[0], self.middle_layer[0][:, layer_dim:]))
+        bias = np.concatenate((self.input_layer[1], self.middle_layer[1]))
+
+        tables = []
+        for axis, values in enumerate((x, y, z)):
+            angles = self._angles(values.astype(np.float32))
+            sin_weight = weight[:, axis * L : (axis + 1) * L]
+            cos_weight = weight[:, (3 + axis) * L : (4 + axis) * L]
+            tables.append(np.sin(angles) @ sin_weight.T + np.cos(angles) @ cos_weight.T)
+        x_table, y_table, z_table = tables
+
+        pre_activations = (
+            y_table[:, None, None] + x_table[None, :, None] + z_table[None, None, :] + bias
+        )
+        hidden = _relu(pre_activations[..., :layer_dim])
+        for layer in self.pre_concat_layers:
+            hidden = _relu(_hidden_linear(hidden, layer))
+
+        hidden = hidden @ self.middle_layer[0][:, :layer_dim].T
+        hidden = _relu(hidden + pre_activations[..., layer_dim:])
+        for layer in self.post_concat_layers:
+            hidden = _relu(_hidden_linear(hidden, layer))
+
+        return _linear(hidden, *self.output_layer)
+
+    def _angles(self, values: np.ndarray) -> np.ndarray:
+        """Get the angles of the positional encoding, shape (*values.shape, L)."""
+        frequencies = np.power(np.float32(2), np.arange(self.L, dtype=np.float32))
+        return (frequencies * np.float32(np.pi)) * values[..., None]
+
+
+def _get_layer(state_dict: dict[str, np.ndarray], name: str) -> tuple[np.ndarray, np.ndarray]:
+    """Get the weight and bias of a linear layer."""
+    return state_dict[f"{name}.weight"], state_dict[f"{name}.bias"]
+
+
+def _get_layers(
+    state_dict: dict[str, np.ndarray],
+    name: str,
+) -> list[list[tuple[np.ndarray, np.ndarray | None]]]:
+    """Get the linear maps of the Linear or LowRankLinear layers of a ModuleList."""
+    num_layers = len({key.split(".")[1] for key in state_dict if key.startswith(f"{name}.")})
+    layers = []
+    for i in range(num_layers):
+        if f"{name}.{i}.weight" in state_dict:
+            layers.append([_get_layer(state_dict, f"{name}.{i}")])
+        else:
+            down = (state_dict[f"{name}.{i}.down.weight"], None)
+            layers.append([down, _get_layer(state_dict, f"{name}.{i}.up")])
+    return layers
+
+
+def _hidden_linear(x: np.ndarray, layer: list[tuple[np.ndarray, np.ndarray | None]]) -> np.ndarray:
+    for weight, bias in layer:
+        x = _linear(x, weight, bias)
+    return x
+
+
+def _linear(x: np.ndarray, weight: np.ndarray, bias: np.ndarray | None) -> np.ndarray:
+    if bias is None:
+        return x @ weight.T
+    return x @ weight.T + bias
+
+
+def _relu(x: np.ndarray) -> np.ndarray:
+    return np.maximum(x, 0, out=x)
+
+
+def lattice_axes(img_size: tuple[int, int, int]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Get the coordinates of the voxels of a CT image along the x, y, and z axes.
+
+    Shared by the torch and NumPy runtimes, since the high frequencies of the positional encoding
+    amplify any difference in the rounding of the coordinates, and torch.linspace rounds
+    differently depending on the vector width of the cpu.
+
+    Args:
+        img_size (tuple[int, int, int]): The size of the image.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray]: float32 coordinates in [-1, 1] along each axis.
+
+    """
+    return tuple(np.linspace(-1, 1, size, dtype=np.float32) for size in img_size)
+
+
+def run_inference(
+    model: NumpyXRayModel,
+    img_size: tuple[int, int, int],
+    chunk_size: int,
+    attenuation_scaling_factor: float | None,
+) -> np.ndarray:
+    """Generate a CT image in HU with a NumpyXRayModel.
+
+    The lattice is evaluated in slabs of whole rows along y, holding about chunk_size points each,
+    and every slab is converted to HU as it is produced.
+
+    Args:
+        model (NumpyXRayModel): The model to run inference on.
+        img_size (tuple[int, int, int]): The size of the output image.
+        chunk_size (int): Number of coordinate points to process in each slab.
+        attenuation_scaling_factor (float | None): Scaling factor for attenuation values.
+
+    Returns:
+        np.ndarray: The output image, in the orientation of ct_creation.run_inference.
+
+    """
+    x, y, z = lattice_axes(img_size)
+    slab_size = len(x) * len(z)
+    output = np.empty(len(y) * slab_size, dtype=np.float32)
+    start = 0
+    for slab in np.array_split(y, -(-len(y) // max(1, chunk_size // slab_size))):
+        output_slab = model.forward_lattice(x, slab, z).reshape(-1)
+        if attenuation_scaling_factor is not None:
+            output_slab = output_slab * np.float32(attenuation_scaling_factor)
+        output_slab = 1000 * (output_slab - MU_WATER) / (MU_WATER - MU_AIR)
+        output[start : start + len(output_slab)] = np.maximum(output_slab, -1024)
+        start += len(output_slab)
+
+    # Reshape and permute to get correct orientation
+    return output.reshape(img_size[0], img_size[1], img_size[2]).transpose(2, 0, 1)
+
+
+def get_checkpoint_path(conf_dict: dict, model_dir: Path) -> Path | None:
+    """Get the path of the checkpoint set in the checkpoint section of a configuration.
+
+    Args:
+        conf_dict (dict): The configuration dictionary.
+        model_dir (Path): The directory the checkpoint directory is relative to.
+
+    Returns:
+        Path | None: The path of the checkpoint, or None if no checkpoint directory is set.
+
+    """
+    checkpoint = conf_dict["checkpoint"]
+    if checkpoint.get("checkpoint_dir") is None:
+        return None
+    return model_dir / checkpoint["checkpoint_dir"] / f"{checkpoint['resume_epoch']}.pt"
+
+
+def get_xray_metadata(
+    conf_dict: dict,
+    xray_dir: Path,
+    read_metadata: Callable[[Path], dict] | None = None,
+) -> dict:
+    """Get the metadata of the X-rays the CT image of an inference configuration is aligned with.
+
+    The metadata is read from the dataset in xray_dir if set, and otherwise built from xray_size and
+    xray_pixel_spacing. If xray_metadata is set, it is used instead.
+
+    Args:
+        conf_dict (dict): The inference configuration dictionary.
+        xray_dir (Path): The directory the dataset directory is relative to.
+        read_metadata (Callable[[Path], dict] | None, optional): Function reading the metadata of a
+            dataset directory, such as ctnerf.utils.get_dataset_metadata. Defaults to None, to read
+            meta.json of the dataset.
+
+    Returns:
+        dict: The metadata of the X-rays.
+
+    Raises:
+        ValueError: If neither image_size nor voxel_spacing is set.
+
+    """
+    if "xray_dir" in conf_dict:
+        dataset_path = xray_dir / conf_dict["xray_dir"]
+        if read_metadata is not None:
+            xray_metadata = read_metadata(dataset_path)
+        else:
+            with (dataset_path / "meta.json").open() as f:
+                xray_metadata = json.load(f)
+    else:
+        xray_metadata = {
+            "size": conf_dict["xray_size"],
+            "spacing": conf_dict["xray_pixel_spacing"],
+        }
+    if conf_dict.get("image_size") is None and conf_dict.get("voxel_spacing") is None:
+        msg = "Either image_size or voxel_spacing must be specified."
+        raise ValueError(msg)
+    return conf_dict.get("xray_metadata") or xray_metadata
+
+
+def get_image_geometry(
+    xray_metadata: dict,
+    voxel_spacing: list[float] | None,
+    image_size: list[int] | None,
+) -> tuple[list[int], list[float]]:
+    """Get the size and voxel spacing of the CT image to generate.
+
+    Args:
+        xray_metadata (dict): Metadata of the X-rays, with their size and spacing.
+        voxel_spacing (list[float] | None): Voxel spacing of the output image. Takes precedence
+            over image_size.
+        image_size (list[int] | None): Size of the output image.
+
+    Returns:
+        tuple[list[int], list[float]]: The image size and voxel spacing.
+
+    """
+    # Define image size and spacing, giving x the same value as y
+    original_size = [xray_metadata["size"][0]] + xray_metadata["size"]
+    original_spacing = [xray_metadata["spacing"][0]] + xray_metadata["spacing"]
+
+    # Determine image size and spacing
+    if voxel_spacing is not None:
+        original_spacing = np.array(original_spacing)
+        original_size = np.array(original_size)
+        new_spacing = np.array(voxel_spacing)
+        image_size = (original_size / original_spacing * new_spacing).astype(int)
+    elif image_size is not None:
+        original_spacing = np.array(original_spacing)
+        original_size = np.array(original_size)
+        new_size = np.array(image_size)
+        voxel_spacing = original_spacing * original_size / new_size
+
+    return image_size, voxel_spacing
+
+
+def array_to_sitk(
+    image_array: np.ndarray,
+    metadata: dict | None = None,
+    direction: tuple[float] | None = None,
+    origin: tuple[float, float, float] | None = None,
+    spacing: tuple[float, float, float] | None = None,
+) -> sitk.Image:
+    """Convert an array to a sitk image.
+
+    Args:
+        image_array (np.ndarray): The array to convert to a sitk image.
+        metadata (dict, optional): Metadata to add to the image. Defaults to None.
+        direction (tuple[float], optional): Direction of the image. Defaults to None.
+        origin (tuple[float, float, float], optional): Origin of the image. Defaults to None.
+        spacing (tuple[float, float, float], optional): Spacing of the image. Defaults to None.
+
+    Returns:
+        sitk.Image: The sitk image.
+
+    """
+    ct_array = image_array.astype(np.int16)
+    ct_image = sitk.GetImageFromArray(ct_array)
+
+    if direction is not None:
+        ct_image.SetDirection(direction)
+    if origin is not None:
+        ct_image.SetOrigin(origin)
+    if spacing is not None:
+        ct_image.SetSpacing(spacing)
+
+    if metadata is not None and "ct_meta" in metadata:
+        for key, value in metadata["ct_meta"].items():
+            ct_image.SetMetaData(key, value)
+
+    return ct_image
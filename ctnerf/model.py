@@ -59,6 +59,7 @@ class XRayModel(torch.nn.Module):
         layer_dim: int,
         L: int,  # noqa: N803
         *args: tuple,
+        rank: int | None = None,
         **kwargs: dict[str, Any],
     ) -> None:
         """Initialize the XRayModel.
@@ -68,6 +69,8 @@ class XRayModel(torch.nn.Module):
             layer_dim (int): Dimension of the layers
             L (int): Number of frequencies to use for the positional encoding
             *args: Additional positional arguments passed to the base class
+            rank (int, optional): If set, the square hidden layers are LowRankLinear layers of this
+                rank. Defaults to None.
             **kwargs: Additional keyword arguments passed to the base class
 
         """
@@ -75,15 +78,24 @@ class XRayModel(torch.nn.Module):
 
         self.input_layer = torch.nn.Linear(3 * 2 * L, layer_dim)
         self.pre_concat_layers = torch.nn.ModuleList(
-            [torch.nn.Linear(layer_dim, layer_dim) for _ in range(n_layers // 2)],
+            [self._hidden_layer(layer_dim, rank) for _ in range(n_layers // 2)],
         )
         self.middle_layer = torch.nn.Linear(layer_dim + 3 * 2 * L, layer_dim)
         self.post_concat_layers = torch.nn.ModuleList(
-            [torch.nn.Linear(layer_dim, layer_dim) for _ in range(n_layers // 2 - 1)],
+            [self._hidden_layer(layer_dim, rank) for _ in range(n_layers // 2 - 1)],
         )
         self.output_layer = torch.nn.Linear(layer_dim, 1)
 
+        self.n_layers = n_layers
+        self.layer_dim = layer_dim
         self.L = L
+        self.rank = rank
+
+    @staticmethod
+    def _hidden_layer(layer_dim: int, rank: int | None) -> torch.nn.Module:
+        if rank is None:
+            return torch.nn.Linear(layer_dim, layer_dim)
+        return LowRankLinear(layer_dim, layer_dim, rank)
 
     def forward(self, coords: torch.Tensor) -> torch.Tensor:
         """Forward pass of the model.
@@ -118,6 +130,158 @@ class XRayModel(torch.nn.Module):
         # return torch.nn.functional.leaky_relu(x)  # noqa: ERA001
         # return torch.nn.functional.sigmoid(x)  # noqa: ERA001
 
+    @torch.no_grad()
+    def forward_lattice(
+        self,
+        x: torch.Tensor,
+        y: torch.Tensor,
+        z: torch.Tensor,
+        mask: torch.Tensor | None = None,
+    ) -> torch.Tensor:
+        """Evaluate the model at every point of an axis-aligned lattice.
+
+        The positional encoding of a point is the concatenation of encodings of each coordinate,
+        so the layers applied to it, input_layer and the encoding part of middle_layer, are sums
+        of one term per axis. These terms are computed once for every x, y, and z value, and the
+        pre-activations at each point are formed by broadcast addition. This avoids computing the
+        positional encoding and its projections at every point.
+
+        Args:
+            x (torch.Tensor): shape (X,). Coordinates of the lattice along the x axis.
+            y (torch.Tensor): shape (Y,). Coordinates of the lattice along the y axis.
+            z (torch.Tensor): shape (Z,). Coordinates of the lattice along the z axis.
+            mask (torch.Tensor | None, optional): shape (Y, X, Z). If set, only the points where it
+                is True are evaluated past the first layer, and the output is zero elsewhere, see
+                OccupancyGrid.lattice_mask. Defaults to None.
+
+        Returns:
+            torch.Tensor: shape (Y, X, Z, 1). Output of the model at each point, matching the
+            output of forward for the coordinates of meshgrid((x, y, z), indexing="xy").
+
+        """
+        L = self.L  # noqa: N806
+        layer_dim = self.input_layer.out_features
+        weight = torch.cat((self.input_layer.weight, self.middle_layer.weight[:, layer_dim:]))
+        bias = torch.cat((self.input_layer.bias, self.middle_layer.bias))
+
+        # Projections of the encoding of each axis, shape (N, 2 * layer_dim)
+        tables = []
+        for axis, values in enumerate((x, y, z)):
+            frequencies = torch.arange(L, dtype=torch.float32, device=values.device)
+            angles = torch.pow(2, frequencies) * torch.pi
+            angles = angles.unsqueeze(0) * values.unsqueeze(-1)
+            sin_weight = weight[:, axis * L : (axis + 1) * L]
+            cos_weight = weight[:, (3 + axis) * L : (4 + axis) * L]
+            tables.append(torch.sin(angles) @ sin_weight.T + torch.cos(angles) @ cos_weight.T)
+        x_table, y_table, z_table = tables
+
+        pre_activations = (
+            y_table[:, None, None] + x_table[None, :, None] + z_table[None, None, :] + bias
+        )
+        if mask is not None:
+            pre_activations = pre_activations[mask]
+        hidden = torch.nn.functional.relu(pre_activations[..., :layer_dim])
+
+        for layer in self.pre_concat_layers:
+            hidden = torch.nn.functional.relu(layer(hidden))
+
+        hidden = torch.nn.functional.linear(hidden, self.middle_layer.weight[:, :layer_dim])
+        hidden = torch.nn.functional.relu(hidden + pre_activations[..., layer_dim:])
+
+        for layer in self.post_concat_layers:
+            hidden = torch.nn.functional.relu(layer(hidden))
+
+        output = self.output_layer(hidden)
+        if mask is not None:
+            masked_output = output.new_zeros((*mask.shape, output.shape[-1]))
+            masked_output[mask] = output
+            output = masked_output
+        return output
+
+    @torch.no_grad()
+    def pruned(self, layer_dim: int) -> "XRayModel":
+        """Get a copy of the model with its hidden channels pruned to layer_dim.
+
+        Every hidden activation keeps the layer_dim channels with the largest product of the norms
+        of their incoming and outgoing weights. The weights of the kept channels are copied, so the
+        pruned model approximates the model without any training.
+
+        Args:
+            layer_dim (int): Number of channels to keep in each hidden activation.
+
+        Returns:
+            XRayModel: The pruned model, without low-rank factorisation.
+
+        """
+        n_encoding = 3 * 2 * self.L
+        layers = [
+            _dense(layer)
+            for layer in (
+                self.input_layer,
+                *self.pre_concat_layers,
+                self.middle_layer,
+                *self.post_concat_layers,
+                self.output_layer,
+            )
+        ]
+        middle = len(self.pre_concat_layers) + 1
+
+        # Channels kept in the output of each layer but the last
+        kept = []
+        for i, (weight, _) in enumerate(layers[:-1]):
+            outgoing = layers[i + 1][0]
+            if i + 1 == middle:
+                outgoing = outgoing[:, : weight.shape[0]]
+            importance = weight.norm(dim=1) * outgoing.norm(dim=0)
+            kept.append(importance.topk(layer_dim).indices.sort().values)
+
+        model = XRayModel(self.n_layers, layer_dim, self.L).to(self.input_layer.weight.device)
+        new_layers = (
+            model.input_layer,
+            *model.pre_concat_layers,
+            model.middle_layer,
+            *model.post_concat_layers,
+            model.output_layer,
+        )
+        encoding = torch.arange(n_encoding, device=kept[0].device)
+        for i, (new_layer, (weight, bias)) in enumerate(zip(new_layers, layers, strict=True)):
+            rows = kept[i] if i < len(kept) else slice(None)
+            if i == 0:
+                columns = slice(None)
+            elif i == middle:
+                columns = torch.cat((kept[i - 1], self.layer_dim + encoding))
+            else:
+                columns = kept[i - 1]
+            new_layer.weight.copy_(weight[rows][:, columns])
+            new_layer.bias.copy_(bias[rows])
+        return model
+
+    @torch.no_grad()
+    def low_rank(self, rank: int) -> "XRayModel":
+        """Get a copy of the model with its square hidden layers factorised to the given rank.
+
+        The factors of each layer are its truncated singular value decomposition, the best
+        approximation of its weight of that rank in the Frobenius norm.
+
+        Args:
+            rank (int): Rank of the factorised layers.
+
+        Returns:
+            XRayModel: The factorised model.
+
+        """
+        model = XRayModel(self.n_layers, self.layer_dim, self.L, rank=rank)
+        model = model.to(self.input_layer.weight.device)
+        for name in ("input_layer", "middle_layer", "output_layer"):
+            getattr(model, name).load_state_dict(getattr(self, name).state_dict())
+        for new_layers, layers in (
+            (model.pre_concat_layers, self.pre_concat_layers),
+            (model.post_concat_layers, self.post_concat_layers),
+        ):
+            for new_layer, layer in zip(new_layers, layers, strict=True):
+                new_layer.factorise(*_dense(layer))
+        return model
+
     @torch.no_grad()
     def _positional_encoding(self, coords: torch.Tensor, L: int) -> torch.Tensor:  # noqa: N803
         """Compute the positional encoding for the input coordinates.
@@ -137,9 +301,459 @@ class XRayModel(torch.nn.Module):
             encoding of the input coordinates.
 
         """
-        position_enc = torch.empty(coords.shape[0], 3 * 2 * L, device=coords.device)
-        angles = torch.pow(2, torch.arange(L, device=coords.device)) * torch.pi
+        # Float exponents, since AOTInductor miscompiles integer powers. Both are exact.
+        frequencies = torch.arange(L, dtype=torch.float32, device=coords.device)
+        angles = torch.pow(2, frequencies) * torch.pi
         angles = angles.unsqueeze(0).unsqueeze(0) * coords.unsqueeze(-1)
-        position_enc[:, : 3 * L] = torch.sin(angles.view(coords.shape[0], -1))
-        position_enc[:, 3 * L :] = torch.cos(angles.view(coords.shape[0], -1))
-        return position_enc
+        angles = angles.view(coords.shape[0], -1)
+        # Built out of place, so that the encoding can be vectorised over models with vmap
+        return torch.cat((torch.sin(angles), torch.cos(angles)), dim=1)
+
+
+class LowRankLinear(torch.nn.Module):
+    """Linear layer whose weight is the product of two low-rank factors, up.weight @ down.weight.
+
+    Takes rank * (in_features + out_features) multiply-adds per input instead of
+    in_features * out_features, which is fewer when rank is below half of a square layer.
+    """
+
+    def __init__(self, in_features: int, out_features: int, rank: int) -> None:
+        """Initialize the LowRankLinear layer.
+
+        Args:
+            in_features (int): Number of input features.
+            out_features (int): Number of output features.
+            rank (int): Rank of the weight.
+
+        """
+        super().__init__()
+        self.down = torch.nn.Linear(in_features, rank, bias=False)
+        self.up = torch.nn.Linear(rank, out_features)
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        """Forward pass of the layer.
+
+        Args:
+            x (torch.Tensor): shape (..., in_features). Input tensor.
+
+        Returns:
+            torch.Tensor: shape (..., out_features). Output tensor.
+
+        """
+        return self.up(self.down(x))
+
+    @torch.no_grad()
+    def factorise(self, weight: torch.Tensor, bias: torch.Tensor) -> None:
+        """Set the factors to the truncated singular value decomposition of a dense weight.
+
+        Args:
+            weight (torch.Tensor): shape (out_features, in_features). Weight to factorise.
+            bias (torch.Tensor): shape (out_features,). Bias of the layer.
+
+        """
+        rank = self.down.out_features
+        u, s, vh = torch.linalg.svd(weight, full_matrices=False)
+        scale = s[:rank].sqrt()
+        self.up.weight.copy_(u[:, :rank] * scale)
+        self.down.weight.copy_(scale.unsqueeze(1) * vh[:rank])
+        self.up.bias.copy_(bias)
+
+    def dense_weight(self) -> torch.Tensor:
+        """Get the weight of the equivalent dense layer, shape (out_features, in_features)."""
+        return self.up.weight @ self.down.weight
+
+
+def _dense(layer: torch.nn.Module) -> tuple[torch.Tensor, torch.Tensor]:
+    """Get the weight and bias of a Linear or LowRankLinear layer as a dense layer."""
+    if isinstance(layer, LowRankLinear):
+        return layer.dense_weight(), layer.up.bias
+    return layer.weight, layer.bias
+
+
+class HashGridModel(torch.nn.Module):
+    """Model using a multi-resolution hash grid encoding followed by a small MLP.
+
+    In the style of Instant-NGP (Müller et al., 2022). The volume is covered by n_levels grids with
+    resolutions growing geometrically from base_resolution to max_resolution. Each grid vertex has
+    n_features_per_level trainable features, stored in a table that is indexed directly if the grid
+    fits in 2^log2_hashmap_size entries, and through a spatial hash otherwise. The features of a
+    point are trilinearly interpolated from the eight surrounding vertices on every level, and the
+    concatenated features of all levels are decoded by the MLP.
+
+    Since most of the capacity is in the tables, which are only looked up, the MLP can be far
+    smaller than that of XRayModel. The tables are trained with a much higher learning rate than
+    the MLP usually needs, around 1e-2, and converge in far fewer steps.
+    """
+
+    def __init__(
+        self,
+        n_levels: int = 16,
+        n_features_per_level: int = 2,
+        log2_hashmap_size: int = 19,
+        base_resolution: int = 16,
+        max_resolution: int = 2048,
+        hidden_dim: int = 64,
+        n_hidden_layers: int = 2,
+        *args: tuple,
+        **kwargs: dict[str, Any],
+    ) -> None:
+        """Initialize the HashGridModel.
+
+        Args:
+            n_levels (int, optional): Number of grid levels. Defaults to 16.
+            n_features_per_level (int, optional): Number of features per grid vertex. Defaults to 2.
+            log2_hashmap_size (int, optional): Log2 of the maximum number of entries in the table of
+                each level. Defaults to 19.
+            base_resolution (int, optional): Resolution of the coarsest grid. Defaults to 16.
+            max_resolution (int, optional): Resolution of the finest grid. Defaults to 2048.
+            hidden_dim (int, optional): Dimension of the hidden layers of the MLP. Defaults to 64.
+            n_hidden_layers (int, optional): Number of hidden layers of the MLP. Defaults to 2.
+            *args: Additional positional arguments passed to the base class
+            **kwargs: Additional keyword arguments passed to the base class
+
+        """
+        super().__init__(*args, **kwargs)
+
+        if n_levels > 1:
+            growth_factor = (max_resolution / base_resolution) ** (1 / (n_levels - 1))
+        else:
+            growth_factor = 1.0
+        self.resolutions = [
+            int(base_resolution * growth_factor**level) for level in range(n_levels)
+        ]
+        self.table_sizes = [
+            min(2**log2_hashmap_size, (resolution + 1) ** 3) for resolution in self.resolutions
+        ]
+        self.table_offsets = [sum(self.table_sizes[:level]) for level in range(n_levels)]
+
+        self.embeddings = torch.nn.Parameter(
+            torch.empty(sum(self.table_sizes), n_features_per_level).uniform_(-1e-4, 1e-4),
+        )
+        self.register_buffer(
+            "corners",
+            torch.tensor([[i, j, k] for i in (0, 1) for j in (0, 1) for k in (0, 1)]),
+            persistent=False,
+        )
+        self.register_buffer(
+            "primes",
+            torch.tensor([1, 2654435761, 805459861]),
+            persistent=False,
+        )
+
+        layers = []
+        in_features = n_levels * n_features_per_level
+        for _ in range(n_hidden_layers):
+            layers += [torch.nn.Linear(in_features, hidden_dim), torch.nn.ReLU()]
+            in_features = hidden_dim
+        layers.append(torch.nn.Linear(in_features, 1))
+        self.mlp = torch.nn.Sequential(*layers)
+
+    def forward(self, coords: torch.Tensor) -> torch.Tensor:
+        """Forward pass of the model.
+
+        Args:
+            coords (torch.Tensor): shape (B, 3). Input coordinates in [-1, 1].
+
+        Returns:
+            torch.Tensor: shape (B, 1). Output of the model.
+
+        """
+        return self.mlp(self._hash_grid_encoding(coords))
+
+    def _hash_grid_encoding(self, coords: torch.Tensor) -> torch.Tensor:
+        """Compute the hash grid encoding for the input coordinates.
+
+        Args:
+            coords (torch.Tensor): shape (B, 3). Input coordinates in [-1, 1].
+
+        Returns:
+            torch.Tensor: shape (B, n_levels * n_features_per_level). Interpolated features of
+            each level.
+
+        """
+        coords = ((coords + 1) / 2).clamp(0, 1).to(self.embeddings.dtype)
+
+        indices = []
+        vertex_weights = []
+        for resolution, table_size, table_offset in zip(
+            self.resolutions,
+            self.table_sizes,
+            self.table_offsets,
+            strict=True,
+        ):
+            scaled = coords * resolution
+            lower = scaled.floor().clamp(0, resolution - 1)
+            weights = scaled - lower
+
+            # Indices and trilinear weights of the eight surrounding vertices, shape (B, 8)
+            vertices = lower.long().unsqueeze(1) + self.corners
+            axis_weights = torch.stack((1 - weights, weights), dim=1)
+            vertex_weights.append(
+                (
+                    axis_weights[:, :, None, None, 0]
+                    * axis_weights[:, None, :, None, 1]
+                    * axis_weights[:, None, None, :, 2]
+                ).flatten(start_dim=1),
+            )
+            if (resolution + 1) ** 3 <= table_size:
+                level_indices = (
+                    vertices[..., 0]
+                    + vertices[..., 1] * (resolution + 1)
+                    + vertices[..., 2] * (resolution + 1) ** 2
+                )
+            else:
+                hashed = vertices * self.primes
+                level_indices = hashed[..., 0] ^ hashed[..., 1] ^ hashed[..., 2]
+                level_indices &= table_size - 1
+            indices.append(level_indices + table_offset)
+
+        # Gather the features of all levels at once, since each gather costs a pass over the whole
+        # table in the backward pass
+        indices = torch.stack(indices, dim=1)
+        vertex_features = self.embeddings.index_select(0, indices.flatten())
+        vertex_features = vertex_features.view(*indices.shape, -1)
+        vertex_weights = torch.stack(vertex_weights, dim=1).unsqueeze(-1)
+        return (vertex_weights * vertex_features).sum(dim=2).flatten(start_dim=1)
+
+
+class VoxelGridModel(torch.nn.Module):
+    """Model storing the attenuation coefficients explicitly in a dense voxel grid.
+
+    The grid covers [-1, 1] along every axis, with its corner voxels centred on the corners of the
+    volume, and is sampled with trilinear interpolation. The volume is stored in (z, y, x) order,
+    which is both the order grid_sample expects and the order of a CT image array, so a CT image is
+    obtained by resampling the grid instead of evaluating the model at every voxel.
+    """
+
+    def __init__(
+        self,
+        resolution: tuple[int, int, int] = (256, 256, 256),
+        *args: tuple,
+        **kwargs: dict[str, Any],
+    ) -> None:
+        """Initialize the VoxelGridModel.
+
+        Args:
+            resolution (tuple[int, int, int], optional): Number of voxels along the x, y, and z
+                axes. Defaults to (256, 256, 256).
+            *args: Additional positional arguments passed to the base class
+            **kwargs: Additional keyword arguments passed to the base class
+
+        """
+        super().__init__(*args, **kwargs)
+        self.volume = torch.nn.Parameter(torch.zeros(1, 1, *reversed(resolution)))
+
+    def forward(self, coords: torch.Tensor) -> torch.Tensor:
+        """Forward pass of the model.
+
+        Args:
+            coords (torch.Tensor): shape (B, 3). Input coordinates in [-1, 1].
+
+        Returns:
+            torch.Tensor: shape (B, 1). Output of the model.
+
+        """
+        grid = coords.to(self.volume.dtype).view(1, 1, 1, -1, 3)
+        output = torch.nn.functional.grid_sample(
+            self.volume,
+            grid,
+            mode="bilinear",  # trilinear for volumes
+            padding_mode="border",
+            align_corners=True,
+        )
+        return output.view(-1, 1)
+
+    def total_variation(self, num_samples: int | None = None) -> torch.Tensor:
+        """Compute the anisotropic total variation of the grid.
+
+        Args:
+            num_samples (int | None, optional): Number of random voxels to estimate the total
+                variation from. Computing it over the whole grid in every step costs several passes
+                over the grid, while an estimate only costs a few gathers. If None, the whole grid
+                is used. Defaults to None.
+
+        Returns:
+            torch.Tensor: shape (). Mean absolute difference between neighbouring voxels, summed
+            over the three axes.
+
+        """
+        volume = self.volume.view(self.volume.shape[2:])
+        if num_samples is None:
+            return sum(volume.diff(dim=dim).abs().mean() for dim in range(3))
+
+        # Draw voxels that have a neighbour after them along every axis
+        strides = volume.stride()
+        indices = sum(
+            torch.randint(size - 1, (num_samples,), device=volume.device) * stride
+            for size, stride in zip(volume.shape, strides, strict=True)
+        )
+        # Gather the voxels and their neighbours at once, since each gather costs a pass over the
+        # whole grid in the backward pass
+        offsets = torch.tensor((0, *strides), device=volume.device)
+        values = volume.view(-1).index_select(0, (indices.unsqueeze(1) + offsets).view(-1))
+        values = values.view(num_samples, 4)
+        return (values[:, 1:] - values[:, :1]).abs().mean(dim=0).sum()
+
+    def resample(self, size: tuple[int, int, int]) -> torch.Tensor:
+        """Resample the grid to a CT image of another size.
+
+        The samples are placed on the same lattice as the points evaluated by run_inference, i.e.
+        evenly spaced from -1 to 1 inclusive along every axis.
+
+        Args:
+            size (tuple[int, int, int]): Size of the image along the z, y, and x axes.
+
+        Returns:
+            torch.Tensor: shape size. The resampled image.
+
+        """
+        return torch.nn.functional.interpolate(
+            self.volume,
+            size=size,
+            mode="trilinear",
+            align_corners=True,
+        )[0, 0]
+
+
+class TensorVMModel(torch.nn.Module):
+    """Model storing the attenuation coefficients as a vector-matrix factorised tensor.
+
+    In the style of TensoRF (Chen et al., 2022). The volume is the sum of n_components outer
+    products of an xy plane and a z line, the same number of xz planes and y lines, and the same
+    number of yz planes and x lines. The factors are sampled with bilinear and linear
+    interpolation, with the same alignment as VoxelGridModel. A 512x512x536 volume with 16
+    components per plane takes 13M parameters instead of the 140M of a dense grid, and a query costs
+    six small interpolations instead of the layers of an MLP.
+    """
+
+    # Axes indexing each plane and its line, as indices into (x, y, z)
+    plane_axes = ((0, 1), (0, 2), (1, 2))
+    line_axes = (2, 1, 0)
+
+    def __init__(
+        self,
+        resolution: tuple[int, int, int] = (256, 256, 256),
+        n_components: int = 16,
+        *args: tuple,
+        **kwargs: dict[str, Any],
+    ) -> None:
+        """Initialize the TensorVMModel.
+
+        Args:
+            resolution (tuple[int, int, int], optional): Number of samples along the x, y, and z
+                axes. Defaults to (256, 256, 256).
+            n_components (int, optional): Number of plane and line pairs along each axis.
+                Defaults to 16.
+            *args: Additional positional arguments passed to the base class
+            **kwargs: Additional keyword arguments passed to the base class
+
+        """
+        super().__init__(*args, **kwargs)
+
+        # Planes are stored as (1, n_components, second axis, first axis) and lines as
+        # (1, n_components, axis, 1), the layout grid_sample expects
+        self.planes = torch.nn.ParameterList(
+            [
+                torch.nn.Parameter(
+                    0.1 * torch.randn(1, n_components, resolution[j], resolution[i]),
+                )
+                for i, j in self.plane_axes
+            ],
+        )
+        self.lines = torch.nn.ParameterList(
+            [
+                torch.nn.Parameter(0.1 * torch.randn(1, n_components, resolution[i], 1))
+                for i in self.line_axes
+            ],
+        )
+
+    def forward(self, coords: torch.Tensor) -> torch.Tensor:
+        """Forward pass of the model.
+
+        Args:
+            coords (torch.Tensor): shape (B, 3). Input coordinates in [-1, 1].
+
+        Returns:
+            torch.Tensor: shape (B, 1). Output of the model.
+
+        """
+        coords = coords.to(self.planes[0].dtype)
+        line_coords = torch.stack((torch.zeros_like(coords), coords), dim=-1)
+
+        output = 0
+        for plane, line, (i, j), k in zip(
+            self.planes,
+            self.lines,
+            self.plane_axes,
+            self.line_axes,
+            strict=True,
+        ):
+            plane_features = self._sample(plane, coords[:, [i, j]])
+            line_features = self._sample(line, line_coords[:, k])
+            output = output + (plane_features * line_features).sum(dim=0)
+        return output.view(-1, 1)
+
+    def resample(self, size: tuple[int, int, int]) -> torch.Tensor:
+        """Reconstruct the volume at another size.
+
+        The samples are placed on the same lattice as the points evaluated by run_inference, i.e.
+        evenly spaced from -1 to 1 inclusive along every axis. The factors are resampled first and
+        then multiplied out, which is much cheaper than evaluating the model at every voxel.
+
+        Args:
+            size (tuple[int, int, int]): Size of the image along the z, y, and x axes.
+
+        Returns:
+            torch.Tensor: shape size. The resampled image.
+
+        """
+        size_xyz = size[::-1]
+        output = 0
+        for plane, line, (i, j), k in zip(
+            self.planes,
+            self.lines,
+            self.plane_axes,
+            self.line_axes,
+            strict=True,
+        ):
+            plane = torch.nn.functional.interpolate(
+                plane,
+                size=(size_xyz[j], size_xyz[i]),
+                mode="bilinear",
+                align_corners=True,
+            )[0]
+            line = torch.nn.functional.interpolate(
+                line,
+                size=(size_xyz[k], 1),
+                mode="bilinear",
+                align_corners=True,
+            )[0, :, :, 0]
+            # Letters of the axes in (z, y, x) order, e.g. xy plane and z line -> "ryx,rz->zyx"
+            plane_letters = "xyz"[j] + "xyz"[i]
+            output = output + torch.einsum(
+                f"r{plane_letters},r{'xyz'[k]}->zyx",
+                plane,
+                line,
+            )
+        return output
+
+    @staticmethod
+    def _sample(factor: torch.Tensor, coords: torch.Tensor) -> torch.Tensor:
+        """Interpolate a plane or line factor at a batch of 2D coordinates.
+
+        Args:
+            factor (torch.Tensor): shape (1, C, H, W). The factor to sample.
+            coords (torch.Tensor): shape (B, 2). Coordinates along the W and H axes in [-1, 1].
+
+        Returns:
+            torch.Tensor: shape (C, B). The interpolated features.
+
+        """
+        features = torch.nn.functional.grid_sample(
+            factor,
+            coords.view(1, -1, 1, 2),
+            mode="bilinear",
+            padding_mode="border",
+            align_corners=True,
+        )
+        return features.view(factor.shape[1], -1)
@@ -0,0 +1,180 @@
+"""Occupancy grid of the volume, used to skip the empty space when evaluating a model."""
+
+import torch
+
+from ctnerf.constants import MU_AIR, MU_WATER
+from ctnerf.model import XRayModel
+
+
+class OccupancyGrid(torch.nn.Module):
+    """Coarse grid of bits marking the cells of the volume [-1, 1]^3 that may hold matter.
+
+    Points in empty cells are given zero attenuation without evaluating the model, see query and
+    lattice_mask. The grid is refreshed from the model by update, which evaluates the model at a
+    point in every cell, jittered within the cell between updates. As in Instant NGP, a running
+    estimate of the attenuation of each cell is kept as the maximum of the new value and the
+    decayed previous estimate, so a cell is only marked empty once the model has agreed on it for
+    several updates. The cells below the threshold are empty, after the occupied cells are dilated
+    by one cell so that matter straddling a cell boundary is not cut off.
+
+    Every cell is occupied until the first update, and step does not update the grid during the
+    warmup steps, so a model initialised near zero attenuation is trained everywhere before any
+    cell is marked empty. Since the model is not trained in empty cells, at each update a random
+    fraction of the empty cells is kept occupied until the next update, so that the model is
+    trained there and those cells can be found to be occupied again.
+    """
+
+    def __init__(
+        self,
+        resolution: int = 128,
+        threshold_hu: float = -950,
+        decay: float = 0.95,
+        update_interval: int = 16,
+        warmup_steps: int = 256,
+        explore_fraction: float = 0.05,
+        attenuation_scaling_factor: float | None = None,
+    ) -> None:
+        """Initialize the OccupancyGrid.
+
+        Args:
+            resolution (int, optional): Number of cells along each axis. Defaults to 128.
+            threshold_hu (float, optional): Attenuation in HU below which a cell is empty. Defaults
+                to -950, above air and below lung tissue.
+            decay (float, optional): Factor the attenuation estimate of each cell decays by at each
+                update. Defaults to 0.95.
+            update_interval (int, optional): Number of steps between updates, see step. Defaults
+                to 16.
+            warmup_steps (int, optional): Number of steps before the first update by step, during
+                which every cell is occupied. Defaults to 256.
+            explore_fraction (float, optional): Fraction of the empty cells kept occupied at each
+                update. Defaults to 0.05.
+            attenuation_scaling_factor (float | None, optional): Scaling factor of the attenuation
+                output by the model, as in run_inference. Defaults to None.
+
+        """
+        super().__init__()
+        self.resolution = resolution
+        self.decay = decay
+        self.update_interval = update_interval
+        self.warmup_steps = warmup_steps
+        self.explore_fraction = explore_fraction
+
+        # Inverse of the conversion to HU in run_inference
+        threshold = threshold_hu * (MU_WATER - MU_AIR) / 1000 + MU_WATER
+        self.threshold = threshold / (attenuation_scaling_factor or 1)
+
+        shape = (resolution, resolution, resolution)
+        self.register_buffer("attenuation", torch.zeros(shape))
+        self.register_buffer("occupied", torch.ones(shape, dtype=torch.bool))
+        self.register_buffer("num_steps", torch.zeros((), dtype=torch.long))
+        self.register_buffer("num_updates", torch.zeros((), dtype=torch.long))
+
+    def step(self, model: torch.nn.Module) -> bool:
+        """Count a training step, and update the grid from the model every update_interval steps.
+
+        The grid is not updated during the first warmup_steps steps.
+
+        Args:
+            model (torch.nn.Module): The model being trained.
+
+        Returns:
+            bool: Whether the grid was updated.
+
+        """
+        self.num_steps += 1
+        if self.num_steps < self.warmup_steps or self.num_steps % self.update_interval != 0:
+            return False
+        self.update(model)
+        return True
+
+    @torch.no_grad()
+    def update(self, model: torch.nn.Module, chunk_size: int = 2**18) -> None:
+        """Update the grid from the attenuation of a model at a jittered point in every cell.
+
+        A random explore_fraction of the cells found to be empty is kept occupied.
+
+        Args:
+            model (torch.nn.Module): The model to query.
+            chunk_size (int, optional): Number of points to evaluate at once. Defaults to 2^18.
+
+        """
+        device = self.attenuation.device
+        # One jitter per axis keeps the points on a lattice, so XRayModel.forward_lattice applies
+        cells = torch.arange(self.resolution, device=device)
+        x, y, z = (
+            (cells + torch.rand((), device=device)) * 2 / self.resolution - 1 for _ in range(3)
+        )
+
+        attenuation = torch.empty_like(self.attenuation)
+        for slab in cells.split(max(1, chunk_size // self.resolution**2)):
+            if isinstance(model, XRayModel):
+                values = model.forward_lattice(x[slab], y, z).transpose(0, 1)
+            else:
+                coords = torch.stack(torch.meshgrid(x[slab], y, z, indexing="ij"), dim=-1)
+                values = model(coords.view(-1, 3))
+            attenuation[slab] = values.reshape(len(slab), self.resolution, self.resolution).float()
+
+        self.attenuation = torch.maximum(self.attenuation * self.decay, attenuation)
+        occupied = (self.attenuation > self.threshold).float()[None, None]
+        occupied = torch.nn.functional.max_pool3d(occupied, kernel_size=3, stride=1, padding=1)
+        explored = torch.rand(occupied.shape[2:], device=device) < self.explore_fraction
+        self.occupied = occupied[0, 0].bool() | explored
+        self.num_updates += 1
+
+    def occupied_fraction(self) -> float:
+        """Get the fraction of the cells that are occupied."""
+        return self.occupied.float().mean().item()
+
+    def is_occupied(self, points: torch.Tensor) -> torch.Tensor:
+        """Look up whether points lie in occupied cells.
+
+        Args:
+            points (torch.Tensor): shape (N, 3). Points in [-1, 1].
+
+        Returns:
+            torch.Tensor: shape (N,). Whether each point lies in an occupied cell.
+
+        """
+        cells = self._cells(points)
+        return self.occupied[cells[:, 0], cells[:, 1], cells[:, 2]]
+
+    def query(self, model: torch.nn.Module, points: torch.Tensor) -> torch.Tensor:
+        """Evaluate a model at points, giving the points in empty cells zero attenuation.
+
+        The model is only called on the points in occupied cells, so gradients only flow through
+        those points.
+
+        Args:
+            model (torch.nn.Module): The model to evaluate.
+            points (torch.Tensor): shape (N, 3). Points in [-1, 1].
+
+        Returns:
+            torch.Tensor: shape (N, 1). The output of the model, zero in empty cells.
+
+        """
+        mask = self.is_occupied(points)
+        values = model(points[mask])
+        output = values.new_zeros((len(points), values.shape[-1]))
+        output[mask] = values
+        return output
+
+    def lattice_mask(self, x: torch.Tensor, y: torch.Tensor, z: torch.Tensor) -> torch.Tensor:
+        """Look up whether the points of an axis-aligned lattice lie in occupied cells.
+
+        Args:
+            x (torch.Tensor): shape (X,). Coordinates of the lattice along the x axis.
+            y (torch.Tensor): shape (Y,). Coordinates of the lattice along the y axis.
+            z (torch.Tensor): shape (Z,). Coordinates of the lattice along the z axis.
+
+        Returns:
+            torch.Tensor: shape (Y, X, Z). Whether each point lies in an occupied cell, in the order
+            of XRayModel.forward_lattice.
+
+        """
+        x_cells, y_cells, z_cells = (self._cells(values) for values in (x, y, z))
+        return self.occupied[x_cells[None, :, None], y_cells[:, None, None], z_cells[None, None, :]]
+
+    def _cells(self, values: torch.Tensor) -> torch.Tensor:
+        """Get the indices of the cells holding coordinates in [-1, 1]."""
+        cells = ((values + 1) * (self.resolution / 2)).long()
+        return cells.clamp(0, self.resolution - 1)
@@ -35,7 +35,48 @@ def beer_lambert_law(
     # scale to cm because the CT creation scripts uses attenuation per cm
     distances = distances * slice_size_cm / 2
 
-    exp = torch.exp(-torch.sum(attenuation_coeffs * distances, dim=1))
+    return _transmittance(torch.sum(attenuation_coeffs * distances, dim=1), s, k)
+
+
+def packed_beer_lambert_law(
+    attenuation_coeffs: torch.Tensor,
+    distances: torch.Tensor,
+    ray_indices: torch.Tensor,
+    n_rays: int,
+    s: float | None,
+    k: float | None,
+    slice_size_cm: float,
+) -> torch.Tensor:
+    """Use Beer-Lambert law to calculate transmittance of rays with packed samples.
+
+    Same as beer_lambert_law, for the packed samples of get_packed_samples, where the rays have
+    different numbers of samples. The attenuation of the samples is summed per ray with a segment
+    sum over the ray indices.
+
+    Args:
+        attenuation_coeffs (torch.Tensor): shape (N,)
+        distances (torch.Tensor): shape (N,)
+        ray_indices (torch.Tensor): shape (N,). Index of the ray of each sample
+        n_rays (int): number of rays B
+        s (float | None): scaling factor
+        k (float | None): offset
+        slice_size_cm (float): size of an axial slice in centimetres
+
+    Returns:
+        torch.Tensor: shape (B,). Transmittance
+
+    """
+    # scale to cm because the CT creation scripts uses attenuation per cm
+    distances = distances * slice_size_cm / 2
+
+    attenuation = attenuation_coeffs * distances
+    optical_depths = attenuation.new_zeros(n_rays).index_add(0, ray_indices, attenuation)
+    return _transmittance(optical_depths, s, k)
+
+
+def _transmittance(optical_depths: torch.Tensor, s: float | None, k: float | None) -> torch.Tensor:
+    """Get the transmittance of rays from their optical depths, scaled by s and k if provided."""
+    exp = torch.exp(-optical_depths)
     if s is not None and k is not None:
         return torch.log(exp + k) / s
     return exp
@@ -46,7 +87,8 @@ def get_rays(
     pixel_pos: torch.Tensor,
     angles: torch.Tensor,
     img_shape: torch.Tensor,
-) -> tuple[torch.Tensor, torch.Tensor]:
+    ray_bounds: torch.Tensor | None = None,
+) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
     """Get the start position, heading vector, and ray bounds defining each ray.
 
     Given the positions of pixels in an image and the angles of the xray source, compute the start
@@ -56,6 +98,8 @@ def get_rays(
         pixel_pos (torch.Tensor): shape (B, 2)
         angles (torch.Tensor): shape (B,)
         img_shape (torch.Tensor): shape (2,)
+        ray_bounds (torch.Tensor, optional): shape (B, 2). Precomputed ray bounds. If None, the ray
+            bounds are computed from the start positions and heading vectors.
 
     Returns:
         torch.Tensor: shape (B, 3). Start position
@@ -73,7 +117,8 @@ def get_rays(
     # rotate to account for angle
     rotation_matrix, heading_vector = _create_z_rotation_matrix(angles)
     start_pos = torch.bmm(rotation_matrix, normalized_pos.unsqueeze(2)).squeeze(2)
-    ray_bounds = _get_ray_bounds(start_pos, heading_vector)
+    if ray_bounds is None:
+        ray_bounds = _get_ray_bounds(start_pos, heading_vector)
 
     return start_pos, heading_vector, ray_bounds
 
@@ -157,6 +202,62 @@ def get_coarse_samples(
     return t_samples, sampled_points, sampling_distances
 
 
+@torch.no_grad()
+def get_packed_samples(
+    start_pos: torch.Tensor,
+    heading_vector: torch.Tensor,
+    ray_bounds: torch.Tensor,
+    step_size: float,
+) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor]:
+    """Get the coarse samples along the rays, in numbers proportional to the lengths of the rays.
+
+    Each ray gets ceil((t2 - t1) / step_size) samples, and at least one, stratified uniformly within
+    its ray bounds as in cylinder_sampling. Rays near the edge of the cylinder are short, so they
+    get fewer samples than rays through the centre, with the same spacing. As the rays have
+    different numbers of samples, the samples of all rays are packed into one dimension, ray after
+    ray, with the index of the ray of each sample, see packed_beer_lambert_law.
+
+    Args:
+        start_pos (torch.Tensor): shape (B, 3). Starting position of the ray.
+        heading_vector (torch.Tensor): shape (B, 3). Heading vector of the ray.
+        ray_bounds (torch.Tensor): shape (B, 2). Ray bounds.
+        step_size (float): target distance between adjacent samples.
+
+    Returns:
+        torch.Tensor: shape (N,). t values of the sampled points.
+        torch.Tensor: shape (N, 3). Sampled points.
+        torch.Tensor: shape (N,). Distances between adjacent samples.
+        torch.Tensor: shape (N,). Index of the ray of each sample, in ascending order.
+
+    """
+    lengths = ray_bounds[:, 1] - ray_bounds[:, 0]
+    n_samples = torch.ceil(lengths / step_size).long().clamp_min(1)
+    ray_indices = torch.repeat_interleave(
+        torch.arange(ray_bounds.shape[0], device=ray_bounds.device),
+        n_samples,
+    )
+
+    # index of each sample within its ray
+    first_samples = torch.cumsum(n_samples, dim=0) - n_samples
+    sample_indices = (
+        torch.arange(ray_indices.shape[0], device=ray_bounds.device) - first_samples[ray_indices]
+    )
+
+    interval_size = (lengths / n_samples)[ray_indices]
+    perturbation = torch.rand(ray_indices.shape[0], device=ray_bounds.device) * interval_size
+    t_samples = ray_bounds[ray_indices, 0] + sample_indices * interval_size + perturbation
+
+    # the distance for the last sample of a ray is the distance to the far bound, as in
+    # get_sampling_distances
+    is_last = sample_indices == n_samples[ray_indices] - 1
+    next_t_samples = torch.where(is_last, ray_bounds[ray_indices, 1], t_samples.roll(-1))
+    sampling_distances = next_t_samples - t_samples
+
+    sampled_points = start_pos[ray_indices] + t_samples.unsqueeze(1) * heading_vector[ray_indices]
+
+    return t_samples, sampled_points, sampling_distances, ray_indices
+
+
 @torch.no_grad()
 def get_fine_samples(
     start_pos: torch.Tensor,
@@ -1,7 +1,8 @@
 """Defines configurations used for training and inferencing with the CT-NeRF model."""
 
+import copy
 from _collections_abc import Callable
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from datetime import datetime
 from pathlib import Path
 
@@ -12,7 +13,11 @@ from torch.nn import MSELoss
 from torch.utils.data import DataLoader
 
 from ctnerf import ray_sampling
-from ctnerf.model import XRayModel
+from ctnerf.image_creation import numpy_inference
+from ctnerf.model import HashGridModel, TensorVMModel, VoxelGridModel, XRayModel
+from ctnerf.occupancy_grid import OccupancyGrid
+from ctnerf.training.dataloading import RayBatchIterator
+from ctnerf.training.samplers import LossWeightedSampler
 from ctnerf.utils import (
     get_ct_dir,
     get_dataset_metadata,
@@ -21,7 +26,16 @@ from ctnerf.utils import (
     get_xray_dir,
 )
 
-from .setup_functions import get_aim_run, get_dataloader, get_model, get_optimizer, load_checkpoint
+from .setup_functions import (
+    get_aim_run,
+    get_checkpoint_model_config,
+    get_dataloader,
+    get_model,
+    get_occupancy_grid,
+    get_optimizer,
+    load_checkpoint,
+    quantize_model,
+)
 
 
 @dataclass(frozen=True)
@@ -34,7 +48,7 @@ class TrainingConfig:
     k: float | None  # offset for X-ray intensities
 
     # Training
-    dataloader: DataLoader  # data loader
+    dataloader: DataLoader | RayBatchIterator  # data loader
     batch_size: int  # batch size
     loss_fn: torch.nn.Module  # loss function
     use_amp: bool  # use automatic mixed precision
@@ -45,12 +59,21 @@ class TrainingConfig:
     xray_dir: Path  # directory containing X-ray images
     start_epoch: int  # starting epoch
     tracker: Run  # aim tracker
+    ray_sampler: LossWeightedSampler | None  # sampler drawing the rays of each batch
+    air_constraint_samples: int | None  # number of air points constrained to zero attenuation
+    air_constraint_weight: float  # weight of the zero attenuation constraint in the loss
+    resolution_schedule: dict[int, int] | None  # epochs to train at each binning factor
+    tv_weight: float | None  # weight of the total variation regularisation in the loss
+    tv_samples: int | None  # number of voxels to estimate the total variation from
+    occupancy_grid: OccupancyGrid | None  # grid of the empty cells skipped when evaluating models
+    model_config: dict  # model section of the configuration, stored in checkpoints
 
     # Coarse model
-    coarse_model: XRayModel | None  # coarse model
+    coarse_model: XRayModel | HashGridModel | VoxelGridModel | TensorVMModel | None  # coarse model
     coarse_optimizer: torch.optim.Optimizer | None  # coarse optimizer
     coarse_scaler: torch.GradScaler | None  # coarse gradient scaler
     n_coarse_samples: int  # number of coarse samples
+    sample_step_size: float | None  # distance between packed coarse samples, None if not packed
     plateau_ratio: float | None  # ratio of plateau width to standard deviation
     coarse_sampling_function: Callable[
         [int, int, torch.device, dict],
@@ -58,7 +81,7 @@ class TrainingConfig:
     ]  # sampling func
 
     # Fine model
-    fine_model: XRayModel | None  # fine model
+    fine_model: XRayModel | HashGridModel | VoxelGridModel | TensorVMModel | None  # fine model
     fine_optimizer: torch.optim.Optimizer | None  # fine optimizer
     fine_scaler: torch.GradScaler | None  # fine gradient scaler
     n_fine_samples: int | None  # number of fine samples
@@ -78,10 +101,27 @@ def get_training_config(config_path: Path) -> TrainingConfig:
 
     - name: str. Name of the run
 
-    - model:
-        n_layers: int. Number of layers in the model
-        layer_dim: int. Dimension of the layers
-        L: int. Number of frequencies to use for the positional encoding
+    - model: Ignored if a checkpoint is loaded that stores the model section it was trained with
+        encoding: str. 'sinusoidal', 'hashgrid', 'voxelgrid' or 'tensorvm'. Defaults to
+          'sinusoidal'
+        n_layers: int. Number of layers in the model. Sinusoidal only
+        layer_dim: int. Dimension of the layers. Sinusoidal only
+        L: int. Number of frequencies to use for the positional encoding. Sinusoidal only
+        rank: int. Rank of the factorised hidden layers, see LowRankLinear. Sinusoidal only,
+          defaults to None for dense layers
+        n_levels: int. Number of hash grid levels. Hashgrid only, defaults to 16
+        n_features_per_level: int. Number of features per grid vertex. Hashgrid only, defaults
+          to 2
+        log2_hashmap_size: int. Log2 of the maximum table size of a level. Hashgrid only,
+          defaults to 19
+        base_resolution: int. Resolution of the coarsest grid. Hashgrid only, defaults to 16
+        max_resolution: int. Resolution of the finest grid. Hashgrid only, defaults to 2048
+        hidden_dim: int. Dimension of the hidden layers of the MLP. Hashgrid only, defaults to 64
+        n_hidden_layers: int. Number of hidden layers of the MLP. Hashgrid only, defaults to 2
+        grid_resolution: int | list[int, int, int]. Number of voxels along the x, y, and z axes, or
+          along every axis if an int. Voxelgrid and tensorvm only, defaults to 256
+        n_components: int. Number of plane and line pairs along each axis. Tensorvm only,
+          defaults to 16
 
     - device: str. Device to run the model on
 
@@ -89,6 +129,30 @@ def get_training_config(config_path: Path) -> TrainingConfig:
         xray_dir: str. Directory containing the X-ray images
         source_ct_path: str. Path to the source CT image. Can be None
         num_workers: int. Number of workers to use for data loading
+        load_workers: int. Number of threads to use for reading X-ray images. Defaults to 1
+        compact_rays: bool. Whether to store only the X-ray images and rebuild the ray geometry on
+          the device for each batch. Defaults to False
+        cache: bool. Whether to cache the processed X-rays in data/cache and memory-map them on
+          later runs. The cache takes as much disk space as the processed rays take in memory,
+          36 bytes per ray in float32 unless compact_rays is set. Defaults to False
+        streaming: bool. Whether to stream the X-rays from disk instead of holding every ray in
+          memory. Defaults to False
+        shuffle_buffer_projections: int. Number of projections whose rays are shuffled together
+          when streaming. Defaults to 8
+        ray_buffer: str. If set, batches are gathered from one contiguous buffer of rays instead of
+          using a DataLoader. 'cpu', 'pinned' or 'device'. Defaults to None
+        air_rays: dict. How to handle rays that pass through air only. Optional
+            policy: str. 'keep', 'drop', 'subsample' or 'constrain'. Defaults to 'keep'
+            threshold: float. Transmittance at or above which a ray passes through air only.
+              Defaults to 0.97
+            keep_fraction: float. Fraction of the air rays kept by 'subsample'. Defaults to 0.1
+            constraint_samples: int. Number of points on air rays constrained to zero attenuation
+              in each step by 'constrain'. Defaults to 4096
+            constraint_weight: float. Weight of the constraint in the loss. Defaults to 1.0
+        block_shuffle: dict. If set, rays are shuffled in contiguous blocks and then within
+          windows of blocks instead of with a full permutation. Optional
+            block_size: int. Number of consecutive rays in a block. Defaults to 256
+            window_blocks: int. Number of blocks whose rays are shuffled together. Defaults to 64
         pin_memory: bool. Whether to pin memory for data loading
 
     - checkpoint:
@@ -105,12 +169,51 @@ def get_training_config(config_path: Path) -> TrainingConfig:
         num_fine_samples: int. Number of fine samples. If None, no fine model is used
         dtype: str. Data type of the input tensors
         use_amp: bool. Whether to use automatic mixed precision
+        importance_sampling: dict. If set, rays are drawn in proportion to a running estimate of
+          their loss, and the loss is importance weighted. Requires data.ray_buffer. Optional
+            tile_size: int. Number of consecutive rays sharing a loss estimate. Defaults to 64
+            momentum: float. Weight of a new loss observation in the estimates. Defaults to 0.1
+            uniform_mix: float. Fraction of the sampling distribution that is uniform. Defaults
+              to 0.1
+        resolution_schedule: dict[int, int]. Number of epochs to train on binned X-rays before
+          moving to full resolution, keyed by binning factor, e.g. {4: 2, 2: 2}. Training starts at
+          the largest binning factor. Cannot be used with data.ray_buffer or data.streaming.
+          Optional
+        tv_weight: float. Weight of the total variation of the grid in the loss. Voxelgrid only,
+          optional
+        tv_samples: int | None. Number of random voxels the total variation is estimated from in
+          each step. If None, it is computed over the whole grid. Defaults to 262144
+        occupancy_grid: dict. If set, samples in cells of the volume found to be empty are given
+          zero attenuation without evaluating the models, see OccupancyGrid. The grid is updated
+          from the coarse model and saved in checkpoints. Not used by sweeps. Optional
+            resolution: int. Number of cells along each axis. Defaults to 128
+            threshold_hu: float. Attenuation in HU below which a cell is empty. Defaults to -950
+            decay: float. Decay of the attenuation estimate of a cell at each update. Defaults
+              to 0.95
+            update_interval: int. Number of steps between updates of the grid. Defaults to 16
+            warmup_steps: int. Number of steps before the first update of the grid, during which
+              every cell is occupied. Defaults to 256
+            explore_fraction: float. Fraction of the empty cells kept occupied at each update, so
+              that the model is still trained there. Defaults to 0.05
+        packed_sampling: dict. If set, each ray gets a number of coarse samples proportional to its
+          length inside the cylinder instead of num_coarse_samples, see get_packed_samples.
+          coarse_sampling_function and plateau_ratio are ignored. Cannot be used with
+          num_fine_samples or in a sweep. Optional
+            step_size: float. Target distance between adjacent samples, where the cylinder has
+              radius 1. Defaults to 2 / num_coarse_samples, so that rays through the centre keep
+              num_coarse_samples samples
 
     - scaling:
         attenuation_scaling_factor: float | None. Scaling factor to raise X-ray to the reciprocal of
         s: float | None. Scaling factor
         k: float | None. Offset
 
+    - sweep: list[dict]. Members of a hyperparameter sweep, see get_sweep_config. Ignored when
+      training a single model. Optional
+
+    - compression: dict. Compression of the trained model, see get_compression_config. Ignored
+      when training. Optional
+
 
     Args:
         config_path (Path): Path to the configuration file.
@@ -123,6 +226,9 @@ def get_training_config(config_path: Path) -> TrainingConfig:
     with config_path.open("r") as f:
         conf_dict = yaml.load(f, Loader=yaml.SafeLoader)
 
+    conf_dict["model"] = get_checkpoint_model_config(conf_dict)
+    _validate_training_config(conf_dict)
+
     # Get coarse model
     coarse_model = get_model(conf_dict)
     coarse_optimizer = get_optimizer(conf_dict, coarse_model)
@@ -138,6 +244,9 @@ def get_training_config(config_path: Path) -> TrainingConfig:
         fine_optimizer = None
         fine_scaler = None
 
+    grid_dict = conf_dict["training"].get("occupancy_grid")
+    occupancy_grid = get_occupancy_grid(conf_dict, grid_dict) if grid_dict is not None else None
+
     # Load checkpoint. If checkpoint_dir is not specified, this will be a no-op.
     start_epoch, run_hash = load_checkpoint(
         conf_dict,
@@ -145,7 +254,57 @@ def get_training_config(config_path: Path) -> TrainingConfig:
         coarse_optimizer,
         fine_model,
         fine_optimizer,
+        occupancy_grid,
+    )
+
+    conf = _get_shared_training_config(conf_dict, start_epoch, run_hash)
+    return replace(
+        conf,
+        occupancy_grid=occupancy_grid,
+        coarse_model=coarse_model,
+        coarse_optimizer=coarse_optimizer,
+        coarse_scaler=coarse_scaler,
+        fine_model=fine_model,
+        fine_optimizer=fine_optimizer,
+        fine_scaler=fine_scaler,
     )
+
+
+def _validate_training_config(conf_dict: dict) -> None:
+    """Check the combinations of options of a training configuration dictionary."""
+    tv_weight = conf_dict["training"].get("tv_weight")
+    if tv_weight is not None and conf_dict["model"].get("encoding") != "voxelgrid":
+        msg = "training.tv_weight requires model.encoding: voxelgrid."
+        raise ValueError(msg)
+
+    if (
+        conf_dict["training"].get("packed_sampling") is not None
+        and conf_dict["training"].get("num_fine_samples") is not None
+    ):
+        msg = "training.packed_sampling cannot be used with training.num_fine_samples."
+        raise ValueError(msg)
+
+
+def _get_shared_training_config(
+    conf_dict: dict,
+    start_epoch: int,
+    run_hash: str,
+) -> TrainingConfig:
+    """Get the parts of a training configuration that do not depend on the models.
+
+    Creates the dataloader, tracker and checkpoint directory of the run, and parses the rest of the
+    training configuration dictionary, see get_training_config. The models, optimizers, scalers and
+    occupancy grid are left as None.
+
+    Args:
+        conf_dict (dict): The training configuration dictionary.
+        start_epoch (int): The epoch training starts from.
+        run_hash (str): Hash of the aim run to continue, or "" for a new run.
+
+    Returns:
+        TrainingConfig: The configuration without models.
+
+    """
     run = get_aim_run(conf_dict, run_hash)
 
     # Create checkpoint directory
@@ -160,6 +319,20 @@ def get_training_config(config_path: Path) -> TrainingConfig:
     # Create dataloader and loss function
     dataloader = get_dataloader(conf_dict)
     loss_fn = MSELoss(reduction="none")
+    air_rays = conf_dict["data"].get("air_rays") or {}
+    if air_rays.get("policy") == "constrain":
+        air_constraint_samples = air_rays.get("constraint_samples", 4096)
+    else:
+        air_constraint_samples = None
+
+    packed_sampling = conf_dict["training"].get("packed_sampling")
+    if packed_sampling is not None:
+        sample_step_size = packed_sampling.get(
+            "step_size",
+            2 / conf_dict["training"]["num_coarse_samples"],
+        )
+    else:
+        sample_step_size = None
 
     # Get X-rays and metadata
     xray_dir = get_xray_dir() / conf_dict["data"]["xray_dir"]
@@ -182,18 +355,29 @@ def get_training_config(config_path: Path) -> TrainingConfig:
         xray_dir=xray_dir,
         start_epoch=start_epoch,
         tracker=run,
-        coarse_model=coarse_model,
-        coarse_optimizer=coarse_optimizer,
-        coarse_scaler=coarse_scaler,
+        ray_sampler=(
+            dataloader.sampler if isinstance(dataloader.sampler, LossWeightedSampler) else None
+        ),
+        air_constraint_samples=air_constraint_samples,
+        air_constraint_weight=air_rays.get("constraint_weight", 1.0),
+        resolution_schedule=conf_dict["training"].get("resolution_schedule"),
+        tv_weight=conf_dict["training"].get("tv_weight"),
+        tv_samples=conf_dict["training"].get("tv_samples", 2**18),
+        occupancy_grid=None,
+        model_config=conf_dict["model"],
+        coarse_model=None,
+        coarse_optimizer=None,
+        coarse_scaler=None,
         n_coarse_samples=conf_dict["training"]["num_coarse_samples"],
+        sample_step_size=sample_step_size,
         coarse_sampling_function=getattr(
             ray_sampling,
             conf_dict["training"]["coarse_sampling_function"],
         ),
         plateau_ratio=conf_dict["training"].get("plateau_ratio"),
-        fine_model=fine_model,
-        fine_optimizer=fine_optimizer,
-        fine_scaler=fine_scaler,
+        fine_model=None,
+        fine_optimizer=None,
+        fine_scaler=None,
         n_fine_samples=conf_dict["training"].get("num_fine_samples"),
         ct_size=ct_size,
         slice_size_cm=slice_size_cm,
@@ -201,13 +385,183 @@ def get_training_config(config_path: Path) -> TrainingConfig:
     )
 
 
+@dataclass(frozen=True)
+class SweepMember:
+    """Configuration of one member of a hyperparameter sweep."""
+
+    name: str  # name of the member, used as its tracker context
+    model: XRayModel  # coarse model
+    lr: float  # learning rate of the model
+    plateau_ratio: float | None  # ratio of plateau width to standard deviation
+    checkpoint_dir: Path  # directory to save checkpoints
+    model_config: dict  # model section of the configuration, stored in checkpoints
+
+
+@dataclass(frozen=True)
+class SweepConfig:
+    """Configuration for training the members of a hyperparameter sweep in one process."""
+
+    training: TrainingConfig  # configuration shared by the members, without models
+    members: list[SweepMember]  # members of the sweep
+
+
+# Fields of the training section that can differ between the members of a sweep
+_SWEEP_TRAINING_FIELDS = ("lr", "plateau_ratio")
+
+
+def get_sweep_config(config_path: Path) -> SweepConfig:
+    """Get the configuration for training the members of a hyperparameter sweep in one process.
+
+    The sweep is defined in the training yaml config file, see get_training_config, by a sweep
+    field listing the members as overrides of the model and training sections:
+
+    - sweep: list[dict]. One entry per member, e.g. {training: {lr: 0.001, plateau_ratio: 5}}
+        model: dict. Fields of the model section to override. Optional
+        training: dict. Fields of the training section to override. Only lr and plateau_ratio can
+          be overridden. Optional
+
+    The rest of the configuration is shared by the members, which are trained on the same batches
+    of rays from a single dataset. Only coarse sinusoidal models are supported, so
+    training.num_fine_samples, training.importance_sampling, and training.tv_weight must not be
+    set. Sweeps are not resumed from checkpoints, so checkpoint.checkpoint_dir must not be set
+    either. Each member is checkpointed in a member_<index> subdirectory of the run, and its
+    metrics are tracked with the context {"member": "<index>"}.
+
+    Args:
+        config_path (Path): Path to the configuration file.
+
+    Returns:
+        SweepConfig: The configuration of the sweep.
+
+    """
+    # Load yaml config file
+    with config_path.open("r") as f:
+        conf_dict = yaml.load(f, Loader=yaml.SafeLoader)
+
+    if not conf_dict.get("sweep"):
+        msg = "The configuration has no sweep members."
+        raise ValueError(msg)
+    if conf_dict["checkpoint"].get("checkpoint_dir") is not None:
+        msg = "Sweeps cannot be resumed from checkpoint.checkpoint_dir."
+        raise ValueError(msg)
+    for field in ("num_fine_samples", "importance_sampling", "tv_weight", "packed_sampling"):
+        if conf_dict["training"].get(field) is not None:
+            msg = f"training.{field} cannot be used in a sweep."
+            raise ValueError(msg)
+
+    member_dicts = []
+    for overrides in conf_dict["sweep"]:
+        if not set(overrides) <= {"model", "training"}:
+            msg = f"Sweep members can only override model and training: {overrides}"
+            raise ValueError(msg)
+        if not set(overrides.get("training", {})) <= set(_SWEEP_TRAINING_FIELDS):
+            msg = f"Sweep members can only override training.{_SWEEP_TRAINING_FIELDS}: {overrides}"
+            raise ValueError(msg)
+
+        member_dict = copy.deepcopy(conf_dict)
+        member_dict["model"].update(overrides.get("model", {}))
+        member_dict["training"].update(overrides.get("training", {}))
+        if member_dict["model"].get("encoding", "sinusoidal") != "sinusoidal":
+            msg = "Only model.encoding: sinusoidal is supported in a sweep."
+            raise ValueError(msg)
+        member_dicts.append(member_dict)
+
+    # The shared configuration holds the dataloader, tracker, and run directory. Sweeps are not
+    # resumed, so they start from epoch 0 in a new run
+    conf = _get_shared_training_config(conf_dict, 0, "")
+
+    members = []
+    for i, member_dict in enumerate(member_dicts):
+        model = get_model(member_dict)
+        checkpoint_dir = conf.checkpoint_dir / f"member_{i}"
+        checkpoint_dir.mkdir(exist_ok=True)
+        members.append(
+            SweepMember(
+                name=str(i),
+                model=model,
+                lr=member_dict["training"]["lr"],
+                plateau_ratio=member_dict["training"].get("plateau_ratio"),
+                checkpoint_dir=checkpoint_dir,
+                model_config=member_dict["model"],
+            ),
+        )
+
+    return SweepConfig(training=conf, members=members)
+
+
+@dataclass(frozen=True)
+class CompressionConfig:
+    """Configuration for compressing a trained XRayModel by pruning and low-rank factorisation."""
+
+    training: TrainingConfig  # fine-tuning configuration, whose coarse model is compressed
+    layer_dims: list[int]  # numbers of hidden channels to prune to
+    ranks: list[int | None]  # ranks to factorise the hidden layers to, None for dense layers
+    finetune_steps: int  # number of batches to fine-tune each compressed model on
+    lr: float  # learning rate of the fine-tuning
+    image_size: tuple[int, int, int]  # size of the CT images compared in the table
+
+
+def get_compression_config(config_path: Path) -> CompressionConfig:
+    """Get the configuration for compressing a trained XRayModel.
+
+    The coarse model of the checkpoint of a training yaml config file, see get_training_config, is
+    compressed as described by a compression field:
+
+    - compression:
+        layer_dims: list[int]. Numbers of hidden channels to prune the model to
+        ranks: list[int | None]. Ranks to factorise the hidden layers to, None for dense layers.
+          Every combination with a layer dimension is compressed, except those with a rank of at
+          least half the layer dimension, whose factorised layers would be no smaller than dense
+          ones
+        finetune_steps: int. Number of batches of the training data to fine-tune each compressed
+          model on
+        image_size: list[int, int, int]. Size of the CT images compared in the table of results.
+          Defaults to the size of the CT image used for evaluation during training
+
+    The fine-tuning uses the rest of the configuration, with the fine model disabled.
+
+    Args:
+        config_path (Path): Path to the configuration file.
+
+    Returns:
+        CompressionConfig: The configuration for compression.
+
+    """
+    # Load yaml config file
+    with config_path.open("r") as f:
+        conf_dict = yaml.load(f, Loader=yaml.SafeLoader)
+
+    if conf_dict["checkpoint"].get("checkpoint_dir") is None:
+        msg = "Compression requires a trained model to be loaded from checkpoint.checkpoint_dir."
+        raise ValueError(msg)
+    compression = conf_dict.get("compression")
+    if compression is None:
+        msg = "The configuration has no compression section."
+        raise ValueError(msg)
+
+    conf = get_training_config(config_path)
+    if not isinstance(conf.coarse_model, XRayModel):
+        msg = "Only models with model.encoding: sinusoidal can be compressed."
+        raise ValueError(msg)  # noqa: TRY004
+    conf = replace(conf, fine_model=None, fine_optimizer=None, fine_scaler=None)
+
+    return CompressionConfig(
+        training=conf,
+        layer_dims=compression["layer_dims"],
+        ranks=compression["ranks"],
+        finetune_steps=compression["finetune_steps"],
+        lr=conf_dict["training"]["lr"],
+        image_size=tuple(compression.get("image_size") or conf.ct_size),
+    )
+
+
 @dataclass(frozen=True)
 class InferenceConfig:
     """Configuration for the CT-NeRF model."""
 
     attenuation_scaling_factor: float | None  # scaling factor to raise X-rays to the reciprocal of
-    coarse_model: XRayModel | None  # coarse model
-    fine_model: XRayModel | None  # fine model
+    coarse_model: XRayModel | HashGridModel | VoxelGridModel | TensorVMModel | None  # coarse model
+    fine_model: XRayModel | HashGridModel | VoxelGridModel | TensorVMModel | None  # fine model
     output_path: Path  # path to save the generated CT image
     device: torch.device  # device to run the model inference on
     image_size: list[int, int, int] | None  # size of the output image
@@ -215,7 +569,10 @@ class InferenceConfig:
     image_origin: list[float, float, float] | None  # origin of the output image
     image_direction: list[float] | None  # direction of the output image
     chunk_size: int  # number of rays to process in each batch
+    precision: str  # precision to run the model in, 'fp32', 'bf16' or 'int8'
     xray_metadata: dict  # metadata of the input X-rays
+    exported_model_path: Path | None  # path of an exported model to run instead
+    occupancy_grid: OccupancyGrid | None  # grid of the empty cells skipped when evaluating
 
 
 def get_inference_config(config_path: Path) -> InferenceConfig:
@@ -231,10 +588,27 @@ def get_inference_config(config_path: Path) -> InferenceConfig:
 
     - model_type: 'coarse' or 'fine'
 
-    - model:
-        n_layers: int. Number of layers in the model
-        layer_dim: int. Dimension of the layers
-        L: int. Number of frequencies to use for the positional encoding
+    - model: Ignored if a checkpoint is loaded that stores the model section it was trained with
+        encoding: str. 'sinusoidal', 'hashgrid', 'voxelgrid' or 'tensorvm'. Defaults to
+          'sinusoidal'
+        n_layers: int. Number of layers in the model. Sinusoidal only
+        layer_dim: int. Dimension of the layers. Sinusoidal only
+        L: int. Number of frequencies to use for the positional encoding. Sinusoidal only
+        rank: int. Rank of the factorised hidden layers, see LowRankLinear. Sinusoidal only,
+          defaults to None for dense layers
+        n_levels: int. Number of hash grid levels. Hashgrid only, defaults to 16
+        n_features_per_level: int. Number of features per grid vertex. Hashgrid only, defaults
+          to 2
+        log2_hashmap_size: int. Log2 of the maximum table size of a level. Hashgrid only,
+          defaults to 19
+        base_resolution: int. Resolution of the coarsest grid. Hashgrid only, defaults to 16
+        max_resolution: int. Resolution of the finest grid. Hashgrid only, defaults to 2048
+        hidden_dim: int. Dimension of the hidden layers of the MLP. Hashgrid only, defaults to 64
+        n_hidden_layers: int. Number of hidden layers of the MLP. Hashgrid only, defaults to 2
+        grid_resolution: int | list[int, int, int]. Number of voxels along the x, y, and z axes, or
+          along every axis if an int. Voxelgrid and tensorvm only, defaults to 256
+        n_components: int. Number of plane and line pairs along each axis. Tensorvm only,
+          defaults to 16
 
     - device: str. Device to run the model inference on
 
@@ -261,6 +635,22 @@ def get_inference_config(config_path: Path) -> InferenceConfig:
     - chunk_size: int. Number of rays to process in each batch to avoid OOM errors. If None,
       4096 * 16 is used.
 
+    - precision: str. 'fp32', 'bf16' to run the model under bfloat16 autocast, or 'int8' to run
+      it with its hidden layers dynamically quantised to int8. int8 is only supported for the
+      sinusoidal model on cpu. Defaults to 'fp32'
+
+    - exported_model: str. Path of a model package written by scripts/export_model.py, relative to
+      the model directory. If set, the package is run instead of building the model, and model,
+      model_type and checkpoint are ignored. Optional
+
+    - occupancy_grid: dict. If set, voxels in cells of the volume found to be empty are set to
+      zero attenuation without evaluating the model, see OccupancyGrid. The grid saved in the
+      checkpoint during training is used if there is one, otherwise it is computed from the model.
+      Cannot be used with exported_model. Optional
+        resolution: int. Number of cells along each axis. Must match the grid of the checkpoint if
+          there is one. Defaults to 128
+        threshold_hu: float. Attenuation in HU below which a cell is empty. Defaults to -950
+
     Args:
         config_path (Path): Path to the configuration file.
 
@@ -272,29 +662,39 @@ def get_inference_config(config_path: Path) -> InferenceConfig:
     with config_path.open("r") as f:
         conf_dict = yaml.load(f, Loader=yaml.SafeLoader)
 
-    # Get model and load checkpoint
-    if conf_dict["model_type"] == "coarse":
-        coarse_model = get_model(conf_dict)
-        fine_model = None
-    elif conf_dict["model_type"] == "fine":
+    # Get model and load checkpoint, unless an exported model is run instead
+    precision = conf_dict.get("precision", "fp32")
+    device = conf_dict.get("device") or torch.device("cpu")
+    if conf_dict.get("exported_model") is not None:
+        if precision != "fp32":
+            msg = "Exported models can only be run in fp32 precision."
+            raise ValueError(msg)
         coarse_model = None
-        fine_model = get_model(conf_dict)
+        fine_model = None
+        exported_model_path = get_model_dir() / conf_dict["exported_model"]
     else:
-        msg = f"Unknown model type: {conf_dict['model']}"
-        raise ValueError(msg)
-    load_checkpoint(conf_dict, coarse_model=coarse_model, fine_model=fine_model)
+        coarse_model, fine_model = _get_inference_models(conf_dict, precision, device)
+        exported_model_path = None
+
+    # Get occupancy grid from the checkpoint, or compute it from the model
+    grid_dict = conf_dict.get("occupancy_grid")
+    if grid_dict is not None:
+        if exported_model_path is not None:
+            msg = "occupancy_grid cannot be used with exported_model."
+            raise ValueError(msg)
+        occupancy_grid = get_occupancy_grid(conf_dict, grid_dict)
+        load_checkpoint(conf_dict, occupancy_grid=occupancy_grid)
+        if occupancy_grid.num_updates == 0:
+            occupancy_grid.update(fine_model or coarse_model)
+    else:
+        occupancy_grid = None
 
     # Get X-ray metadata
-    if "xray_dir" in conf_dict:
-        xray_metadata = get_dataset_metadata(get_xray_dir() / conf_dict["xray_dir"])
-    else:
-        xray_metadata = {
-            "size": conf_dict["xray_size"],
-            "spacing": conf_dict["xray_pixel_spacing"],
-        }
-    if conf_dict.get("image_size") is None and conf_dict.get("voxel_spacing") is None:
-        msg = "Either image_size or voxel_spacing must be specified."
-        raise ValueError(msg)
+    xray_metadata = numpy_inference.get_xray_metadata(
+        conf_dict,
+        get_xray_dir(),
+        get_dataset_metadata,
+    )
 
     # Create output directory
     output_dir = get_ct_dir() / conf_dict["output_dir"]
@@ -306,10 +706,158 @@ def get_inference_config(config_path: Path) -> InferenceConfig:
         fine_model=fine_model,
         output_path=output_dir / conf_dict["output_name"],
         chunk_size=conf_dict.get("chunk_size") or 4096 * 16,
-        device=conf_dict.get("device") or torch.device("cpu"),
+        precision=precision,
+        device=device,
         image_size=conf_dict.get("image_size"),
         voxel_spacing=conf_dict.get("voxel_spacing"),
         image_origin=conf_dict.get("image_origin") or [0, 0, 0],
         image_direction=conf_dict.get("image_direction") or [1, 0, 0, 0, 1, 0, 0, 0, 1],
-        xray_metadata=conf_dict.get("xray_metadata") or xray_metadata,
+        xray_metadata=xray_metadata,
+        exported_model_path=exported_model_path,
+        occupancy_grid=occupancy_grid,
+    )
+
+
+def _get_inference_models(
+    conf_dict: dict,
+    precision: str,
+    device: torch.device | str,
+) -> tuple[torch.nn.Module | None, torch.nn.Module | None]:
+    """Build the coarse or fine model to run inference with and load its checkpoint."""
+    conf_dict["model"] = get_checkpoint_model_config(conf_dict)
+    if conf_dict["model_type"] == "coarse":
+        coarse_model = get_model(conf_dict)
+        fine_model = None
+    elif conf_dict["model_type"] == "fine":
+        coarse_model = None
+        fine_model = get_model(conf_dict)
+    else:
+        msg = f"Unknown model type: {conf_dict['model']}"
+        raise ValueError(msg)
+    load_checkpoint(conf_dict, coarse_model=coarse_model, fine_model=fine_model)
+
+    if precision == "int8":
+        if coarse_model is not None:
+            coarse_model = quantize_model(coarse_model, device)
+        if fine_model is not None:
+            fine_model = quantize_model(fine_model, device)
+    elif precision not in ("fp32", "bf16"):
+        msg = f"Unknown precision: {precision}"
+        raise ValueError(msg)
+    return coarse_model, fine_model
+
+
+@dataclass(frozen=True)
+class DistillationConfig:
+    """Configuration for distilling a trained model into a smaller student model."""
+
+    teacher: XRayModel | HashGridModel | VoxelGridModel | TensorVMModel  # trained model
+    student: XRayModel | HashGridModel | VoxelGridModel | TensorVMModel  # model to train
+    optimizer: torch.optim.Optimizer  # optimizer of the student
+    device: torch.device  # device to run on
+    batch_size: int  # number of points in each batch
+    num_epochs: int  # number of epochs
+    steps_per_epoch: int  # number of batches in each epoch
+    edge_fraction: float  # fraction of each batch drawn in proportion to the edge strength
+    edge_resolution: int  # resolution of the grid the edge strength of the teacher is computed on
+    checkpoint_dir: Path  # directory to save checkpoints
+    checkpoint_interval: int  # interval to save checkpoints
+    tracker: Run  # aim tracker
+    model_config: dict  # model section of the configuration, stored in checkpoints
+    attenuation_scaling_factor: float | None  # scaling factor to raise X-rays to the reciprocal of
+    eval_image_size: tuple[int, int, int]  # size of the CT images compared in the report
+    eval_chunk_size: int  # number of points to process in each batch when comparing
+
+
+def get_distillation_config(config_path: Path) -> DistillationConfig:
+    """Get the configuration for distilling a trained model into a smaller student model.
+
+    The distillation yaml config file contains the following fields:
+
+    - name: str. Name of the run
+
+    - device: str. Device to run the teacher and student on
+
+    - teacher:
+        checkpoint_dir: str. Directory to load the teacher checkpoint from
+        resume_epoch: int. Epoch to load the teacher from
+        model_type: str. 'coarse' or 'fine'. Defaults to 'coarse'
+        model: dict. Model section the teacher was trained with. Only used if the checkpoint does
+          not store it. Optional
+
+    - model: Model section of the student, as described in get_training_config
+
+    - training:
+        lr: float. Learning rate
+        batch_size: int. Number of points in each batch
+        num_epochs: int. Number of epochs
+        steps_per_epoch: int. Number of batches in each epoch
+        edge_fraction: float. Fraction of each batch drawn in proportion to the gradient magnitude
+          of the teacher, the rest is drawn uniformly. Defaults to 0.5
+        edge_resolution: int. Resolution of the grid the gradient magnitude of the teacher is
+          computed on. Defaults to 128
+
+    - checkpoint:
+        checkpoint_interval: int. Interval to save checkpoints
+
+    - evaluation:
+        image_size: list[int, int, int]. Size of the CT images of the teacher and student that are
+          compared after distillation
+        chunk_size: int. Number of points to process in each batch when generating the CT images.
+          Defaults to 4096 * 16
+
+    - scaling:
+        attenuation_scaling_factor: float | None. Scaling factor the teacher was trained with
+
+    The student is checkpointed in the format of training checkpoints, so a checkpoint can be
+    loaded by get_inference_config with model_type: coarse.
+
+    Args:
+        config_path (Path): Path to the configuration file.
+
+    Returns:
+        DistillationConfig: The configuration for distillation.
+
+    """
+    # Load yaml config file
+    with config_path.open("r") as f:
+        conf_dict = yaml.load(f, Loader=yaml.SafeLoader)
+
+    # Get teacher, loaded like a model for inference
+    teacher_dict = {
+        "device": conf_dict["device"],
+        "model_type": conf_dict["teacher"].get("model_type", "coarse"),
+        "model": conf_dict["teacher"].get("model", {}),
+        "checkpoint": {
+            "checkpoint_dir": conf_dict["teacher"]["checkpoint_dir"],
+            "resume_epoch": conf_dict["teacher"]["resume_epoch"],
+        },
+    }
+    coarse_model, fine_model = _get_inference_models(teacher_dict, "fp32", conf_dict["device"])
+    teacher = (fine_model or coarse_model).eval().requires_grad_(requires_grad=False)
+
+    # Get student
+    student = get_model(conf_dict)
+    optimizer = get_optimizer(conf_dict, student)
+
+    checkpoint_dir = get_model_dir() / conf_dict["name"] / datetime.now().strftime("%Y%m%d-%H%M%S")
+    checkpoint_dir.mkdir(parents=True, exist_ok=True)
+
+    return DistillationConfig(
+        teacher=teacher,
+        student=student,
+        optimizer=optimizer,
+        device=torch.device(conf_dict["device"]),
+        batch_size=conf_dict["training"]["batch_size"],
+        num_epochs=conf_dict["training"]["num_epochs"],
+        steps_per_epoch=conf_dict["training"]["steps_per_epoch"],
+        edge_fraction=conf_dict["training"].get("edge_fraction", 0.5),
+        edge_resolution=conf_dict["training"].get("edge_resolution", 128),
+        checkpoint_dir=checkpoint_dir,
+        checkpoint_interval=conf_dict["checkpoint"]["checkpoint_interval"],
+        tracker=get_aim_run(conf_dict, ""),
+        model_config=conf_dict["model"],
+        attenuation_scaling_factor=conf_dict["scaling"].get("attenuation_scaling_factor"),
+        eval_image_size=conf_dict["evaluation"]["image_size"],
+        eval_chunk_size=conf_dict["evaluation"].get("chunk_size") or 4096 * 16,
     )
@@ -5,26 +5,62 @@ from pathlib import Path
 import torch
 from aim import Run
 
-from ctnerf.model import XRayModel
-from ctnerf.training.dataloading import XRayDataset
-from ctnerf.utils import get_model_dir, get_torch_dtype, get_xray_dir
+from ctnerf.image_creation import numpy_inference
+from ctnerf.model import HashGridModel, TensorVMModel, VoxelGridModel, XRayModel
+from ctnerf.occupancy_grid import OccupancyGrid
+from ctnerf.training.dataloading import RayBatchIterator, StreamingXRayDataset, XRayDataset
+from ctnerf.training.samplers import BlockShuffleSampler, LossWeightedSampler
+from ctnerf.utils import get_cache_dir, get_model_dir, get_torch_dtype, get_xray_dir
 
 
-def get_model(conf_dict: dict) -> XRayModel:
+def get_model(conf_dict: dict) -> XRayModel | HashGridModel | VoxelGridModel | TensorVMModel:
     """Get the CT-NeRF model and send it to the specified device.
 
+    The model is selected by model.encoding: 'sinusoidal' for the XRayModel MLP with sinusoidal
+    positional encoding, 'hashgrid' for the HashGridModel, 'voxelgrid' for the VoxelGridModel, or
+    'tensorvm' for the TensorVMModel.
+
     Args:
         conf_dict (dict): The configuration dictionary.
 
     Returns:
-        (XRayModel): The CT-NeRF model.
+        (XRayModel | HashGridModel | VoxelGridModel | TensorVMModel): The CT-NeRF model.
 
     """
-    return XRayModel(
-        n_layers=conf_dict["model"]["n_layers"],
-        layer_dim=conf_dict["model"]["layer_dim"],
-        L=conf_dict["model"]["L"],
-    ).to(conf_dict["device"])
+    model_conf = conf_dict["model"]
+    encoding = model_conf.get("encoding", "sinusoidal")
+    if encoding == "sinusoidal":
+        model = XRayModel(
+            n_layers=model_conf["n_layers"],
+            layer_dim=model_conf["layer_dim"],
+            L=model_conf["L"],
+            rank=model_conf.get("rank"),
+        )
+    elif encoding == "hashgrid":
+        model = HashGridModel(
+            n_levels=model_conf.get("n_levels", 16),
+            n_features_per_level=model_conf.get("n_features_per_level", 2),
+            log2_hashmap_size=model_conf.get("log2_hashmap_size", 19),
+            base_resolution=model_conf.get("base_resolution", 16),
+            max_resolution=model_conf.get("max_resolution", 2048),
+            hidden_dim=model_conf.get("hidden_dim", 64),
+            n_hidden_layers=model_conf.get("n_hidden_layers", 2),
+        )
+    elif encoding in ("voxelgrid", "tensorvm"):
+        resolution = model_conf.get("grid_resolution", 256)
+        if isinstance(resolution, int):
+            resolution = (resolution,) * 3
+        if encoding == "voxelgrid":
+            model = VoxelGridModel(resolution=tuple(resolution))
+        else:
+            model = TensorVMModel(
+                resolution=tuple(resolution),
+                n_components=model_conf.get("n_components", 16),
+            )
+    else:
+        msg = f"Unknown encoding: {encoding}"
+        raise ValueError(msg)
+    return model.to(conf_dict["device"])
 
 
 def get_optimizer(conf_dict: dict, model: XRayModel) -> torch.optim.Optimizer:
@@ -41,31 +77,54 @@ def get_optimizer(conf_dict: dict, model: XRayModel) -> torch.optim.Optimizer:
     return torch.optim.Adam(model.parameters(), fused=True, lr=conf_dict["training"]["lr"])
 
 
+def get_occupancy_grid(conf_dict: dict, grid_dict: dict) -> OccupancyGrid:
+    """Get an occupancy grid and send it to the specified device.
+
+    Args:
+        conf_dict (dict): The configuration dictionary.
+        grid_dict (dict): The occupancy_grid section of the configuration.
+
+    Returns:
+        OccupancyGrid: The occupancy grid, with every cell occupied.
+
+    """
+    return OccupancyGrid(
+        resolution=grid_dict.get("resolution", 128),
+        threshold_hu=grid_dict.get("threshold_hu", -950),
+        decay=grid_dict.get("decay", 0.95),
+        update_interval=grid_dict.get("update_interval", 16),
+        warmup_steps=grid_dict.get("warmup_steps", 256),
+        explore_fraction=grid_dict.get("explore_fraction", 0.05),
+        attenuation_scaling_factor=conf_dict["scaling"].get("attenuation_scaling_factor"),
+    ).to(conf_dict["device"])
+
+
 def load_checkpoint(
     conf_dict: dict,
     coarse_model: XRayModel | None = None,
     coarse_optimizer: torch.optim.Optimizer | None = None,
     fine_model: XRayModel | None = None,
     fine_optimizer: torch.optim.Optimizer | None = None,
+    occupancy_grid: OccupancyGrid | None = None,
 ) -> tuple[int, str]:
     """Load the checkpoint if it exists.
 
+    The occupancy grid is only loaded if the checkpoint holds one.
+
     Args:
         conf_dict (dict): The configuration dictionary.
         coarse_model (XRayModel, optional): The coarse model. Defaults to None.
         coarse_optimizer (torch.optim.Optimizer, optional): The coarse optimizer. Defaults to None.
         fine_model (XRayModel, optional): The fine model. Defaults to None.
         fine_optimizer (torch.optim.Optimizer, optional): The fine optimizer. Defaults to None.
+        occupancy_grid (OccupancyGrid, optional): The occupancy grid. Defaults to None.
 
     Returns:
         tuple[int, int, str]: The epoch and run hash of the checkpoint if it exists, else (0, "").
 
     """
-    if conf_dict["checkpoint"].get("checkpoint_dir") is not None:
-        checkpoint_path = Path(
-            get_model_dir() / conf_dict["checkpoint"]["checkpoint_dir"],
-            (str(conf_dict["checkpoint"]["resume_epoch"]) + ".pt"),
-        )
+    checkpoint_path = _get_checkpoint_path(conf_dict)
+    if checkpoint_path is not None:
         checkpoint = torch.load(
             checkpoint_path,
             weights_only=True,
@@ -79,38 +138,210 @@ def load_checkpoint(
             fine_model.load_state_dict(checkpoint["fine_model_state_dict"])
         if fine_optimizer is not None:
             fine_optimizer.load_state_dict(checkpoint["fine_optimizer_state_dict"])
+        if occupancy_grid is not None and "occupancy_grid_state_dict" in checkpoint:
+            occupancy_grid.load_state_dict(checkpoint["occupancy_grid_state_dict"])
         return checkpoint["epoch"], checkpoint["run_hash"]
     return 0, ""
 
 
-def get_dataloader(conf_dict: dict) -> torch.utils.data.DataLoader:
+def quantize_model(model: XRayModel, device: torch.device | str) -> XRayModel:
+    """Quantise the hidden layers of an XRayModel to int8 for CPU inference.
+
+    Uses dynamic quantisation, i.e. the weights are stored in int8 and the activations are
+    quantised on the fly. Only the square hidden layers are quantised. They hold most of the
+    computation, while keeping the input and middle layers in fp32 keeps XRayModel.forward_lattice
+    working.
+
+    Args:
+        model (XRayModel): The model to quantise.
+        device (torch.device | str): The device the model will run on. Must be cpu.
+
+    Returns:
+        (XRayModel): The quantised copy of the model.
+
+    """
+    if not isinstance(model, XRayModel):
+        msg = "int8 precision is only supported for model.encoding: sinusoidal."
+        raise ValueError(msg)  # noqa: TRY004
+    if torch.device(device).type != "cpu":
+        msg = "int8 precision is only supported on cpu."
+        raise ValueError(msg)
+    return torch.ao.quantization.quantize_dynamic(
+        model,
+        {"pre_concat_layers", "post_concat_layers"},
+        dtype=torch.qint8,
+    )
+
+
+def get_checkpoint_model_config(conf_dict: dict) -> dict:
+    """Get the model configuration to build the models with.
+
+    Checkpoints store the model section of the configuration they were trained with, since the
+    parameter shapes of the grid and factorised models depend on it. If a checkpoint is loaded and
+    stores one, it takes precedence over the model section of the configuration dictionary.
+
+    Args:
+        conf_dict (dict): The configuration dictionary.
+
+    Returns:
+        dict: The model section of the configuration.
+
+    """
+    checkpoint_path = _get_checkpoint_path(conf_dict)
+    if checkpoint_path is None:
+        return conf_dict["model"]
+    # Memory-map the checkpoint, so that the parameters are not read just to get the config
+    checkpoint = torch.load(checkpoint_path, weights_only=True, mmap=True, map_location="cpu")
+    return checkpoint.get("model_config", conf_dict["model"])
+
+
+def _get_checkpoint_path(conf_dict: dict) -> Path | None:
+    """Get the path of the checkpoint to load, or None if no checkpoint is loaded."""
+    return numpy_inference.get_checkpoint_path(conf_dict, get_model_dir())
+
+
+def get_dataloader(conf_dict: dict) -> torch.utils.data.DataLoader | RayBatchIterator:
     """Get the data loader for the specified configuration.
 
+    If data.ray_buffer is set, the rays are kept in one contiguous buffer and batches are gathered
+    from it by a RayBatchIterator instead of a DataLoader. If data.streaming is set, the X-rays are
+    streamed from disk by a StreamingXRayDataset instead of being held in memory.
+
     Args:
         conf_dict (dict): The configuration dictionary.
 
     Returns:
-        (torch.utils.data.DataLoader): The data loader.
+        (torch.utils.data.DataLoader | RayBatchIterator): The data loader.
 
     """
+    if conf_dict["data"].get("streaming", False):
+        return _get_streaming_dataloader(conf_dict)
+
+    air_rays = conf_dict["data"].get("air_rays") or {}
+    resolution_schedule = conf_dict["training"].get("resolution_schedule")
     dataset = XRayDataset(
         xray_dir=get_xray_dir() / conf_dict["data"]["xray_dir"],
         dtype=get_torch_dtype(conf_dict["training"]["dtype"]),
         attenuation_scaling_factor=conf_dict["scaling"].get("attenuation_scaling_factor"),
         s=conf_dict["scaling"].get("s"),
         k=conf_dict["scaling"].get("k"),
+        load_workers=conf_dict["data"].get("load_workers", 1),
+        compact=conf_dict["data"].get("compact_rays", False),
+        cache_dir=get_cache_dir() if conf_dict["data"].get("cache", False) else None,
+        air_policy=air_rays.get("policy", "keep"),
+        air_threshold=air_rays.get("threshold", 0.97),
+        air_keep_fraction=air_rays.get("keep_fraction", 0.1),
+        binning_factors=list(resolution_schedule) if resolution_schedule is not None else None,
     )
 
+    importance_sampling = conf_dict["training"].get("importance_sampling")
+    block_shuffle = conf_dict["data"].get("block_shuffle")
+    if importance_sampling is not None and conf_dict["data"].get("ray_buffer") is None:
+        msg = "training.importance_sampling requires data.ray_buffer to be set"
+        raise ValueError(msg)
+    if importance_sampling is not None and block_shuffle is not None:
+        msg = "training.importance_sampling cannot be used together with data.block_shuffle"
+        raise ValueError(msg)
+    if conf_dict["data"].get("ray_buffer") is not None:
+        return _get_ray_batch_iterator(conf_dict, dataset)
+
+    if conf_dict["data"]["num_workers"] > 0:
+        dataset.share_memory_()  # before the workers start, so they do not each get a copy
+
+    sampler = BlockShuffleSampler(dataset, **block_shuffle) if block_shuffle is not None else None
     return torch.utils.data.DataLoader(
         dataset=dataset,
         batch_size=conf_dict["training"]["batch_size"],
-        shuffle=True,
+        shuffle=sampler is None,
+        sampler=sampler,
+        num_workers=conf_dict["data"]["num_workers"],
+        pin_memory=conf_dict["data"]["pin_memory"],
+        pin_memory_device=conf_dict["device"],
+    )
+
+
+def _get_streaming_dataloader(conf_dict: dict) -> torch.utils.data.DataLoader:
+    """Get a data loader that streams the X-rays from disk.
+
+    Args:
+        conf_dict (dict): The configuration dictionary.
+
+    Returns:
+        (torch.utils.data.DataLoader): The data loader over a StreamingXRayDataset.
+
+    """
+    if conf_dict["data"].get("ray_buffer") is not None:
+        msg = "data.ray_buffer cannot be used together with data.streaming"
+        raise ValueError(msg)
+    if (conf_dict["data"].get("air_rays") or {}).get("policy", "keep") != "keep":
+        msg = "data.air_rays cannot be used together with data.streaming"
+        raise ValueError(msg)
+    if conf_dict["training"].get("resolution_schedule") is not None:
+        msg = "training.resolution_schedule cannot be used together with data.streaming"
+        raise ValueError(msg)
+    if conf_dict["data"].get("block_shuffle") is not None:
+        msg = "data.block_shuffle cannot be used together with data.streaming"
+        raise ValueError(msg)
+
+    dataset = StreamingXRayDataset(
+        xray_dir=get_xray_dir() / conf_dict["data"]["xray_dir"],
+        attenuation_scaling_factor=conf_dict["scaling"].get("attenuation_scaling_factor"),
+        batch_size=conf_dict["training"]["batch_size"],
+        s=conf_dict["scaling"].get("s"),
+        k=conf_dict["scaling"].get("k"),
+        dtype=get_torch_dtype(conf_dict["training"]["dtype"]),
+        shuffle_buffer_projections=conf_dict["data"].get("shuffle_buffer_projections", 8),
+    )
+    return torch.utils.data.DataLoader(
+        dataset=dataset,
+        batch_size=None,
         num_workers=conf_dict["data"]["num_workers"],
         pin_memory=conf_dict["data"]["pin_memory"],
         pin_memory_device=conf_dict["device"],
     )
 
 
+def _get_ray_batch_iterator(conf_dict: dict, dataset: XRayDataset) -> RayBatchIterator:
+    """Get a RayBatchIterator over a dataset, with the sampler given by the configuration.
+
+    Args:
+        conf_dict (dict): The configuration dictionary.
+        dataset (XRayDataset): The dataset to iterate over.
+
+    Returns:
+        (RayBatchIterator): The RayBatchIterator.
+
+    """
+    ray_buffer = conf_dict["data"]["ray_buffer"]
+    if conf_dict["training"].get("resolution_schedule") is not None:
+        msg = "training.resolution_schedule cannot be used together with data.ray_buffer"
+        raise ValueError(msg)
+    if ray_buffer not in ("cpu", "pinned", "device"):
+        msg = f"Unknown ray buffer: {ray_buffer}"
+        raise ValueError(msg)
+    buffer_device = conf_dict["device"] if ray_buffer == "device" else "cpu"
+
+    sampler = None
+    importance_sampling = conf_dict["training"].get("importance_sampling")
+    block_shuffle = conf_dict["data"].get("block_shuffle")
+    if importance_sampling is not None:
+        sampler = LossWeightedSampler(
+            num_rays=len(dataset),
+            device=buffer_device,
+            **importance_sampling,
+        )
+    elif block_shuffle is not None:
+        sampler = BlockShuffleSampler(dataset, device=buffer_device, **block_shuffle)
+
+    return RayBatchIterator(
+        dataset=dataset,
+        batch_size=conf_dict["training"]["batch_size"],
+        device=buffer_device,
+        pin_memory=ray_buffer == "pinned",
+        sampler=sampler,
+    )
+
+
 def get_aim_run(conf_dict: dict, run_hash: str) -> Run:
     """Get the Aim run for the specified configuration.
 
@@ -0,0 +1,166 @@
+"""Contains functions for compressing a trained model by pruning and low-rank factorisation."""
+
+import copy
+import itertools
+import time
+from dataclasses import replace
+from pathlib import Path
+
+import torch
+from tqdm import tqdm
+
+from ctnerf.image_creation.ct_creation import run_inference
+from ctnerf.model import XRayModel
+from ctnerf.setup.config import CompressionConfig, TrainingConfig, get_compression_config
+from ctnerf.training.training import save_checkpoint, train_batch
+
+# Number of points per forward pass when generating CT images, as in training evaluation
+chunk_size = 4096 * 64
+
+
+def compress(config_path: Path) -> list[dict[str, str | float]]:
+    """Compress a trained model into smaller variants, and compare their accuracy and cost.
+
+    Every combination of a layer dimension and a rank of the compression configuration is applied
+    to the coarse model of the checkpoint, see XRayModel.pruned and XRayModel.low_rank. Each variant
+    is fine-tuned on the training data, saved in the format of training checkpoints to a
+    subdirectory compressed_<layer_dim>_<rank> of the checkpoint directory, and compared to the
+    original model on a CT image. The saved model configuration holds the new layer dimension and
+    rank, so the checkpoint can be loaded for inference like any other.
+
+    If training uses an occupancy grid, each variant is fine-tuned with, and saved with, its own
+    copy of the grid of the checkpoint, while all variants are compared using the original grid.
+
+    Args:
+        config_path (Path): Path to the training configuration file with a compression section.
+
+    Returns:
+        list[dict[str, str | float]]: The name of each model and its comparison to the original,
+        see _compare. The original model comes first.
+
+    """
+    compression = get_compression_config(config_path)
+    conf = compression.training
+    model = conf.coarse_model.eval()
+    with torch.no_grad():
+        reference = run_inference(
+            model,
+            compression.image_size,
+            chunk_size,
+            conf.attenuation_scaling_factor,
+            conf.device,
+            occupancy_grid=conf.occupancy_grid,
+        )
+
+    rows = [{"name": "original"} | _compare(model, reference, compression)]
+    for layer_dim, rank in itertools.product(compression.layer_dims, compression.ranks):
+        if rank is None and layer_dim == model.layer_dim:
+            continue
+        if rank is not None and 2 * rank >= layer_dim:
+            continue  # the factorised layers would be no smaller than the dense ones
+        name = f"{layer_dim}_{rank or 'dense'}"
+
+        compressed = model.pruned(layer_dim)
+        if rank is not None:
+            compressed = compressed.low_rank(rank)
+        hu_mae_before_finetune = _compare(compressed, reference, compression)["hu_mae"]
+
+        compressed_conf = replace(
+            conf,
+            coarse_model=compressed,
+            coarse_optimizer=torch.optim.Adam(
+                compressed.parameters(),
+                fused=True,
+                lr=compression.lr,
+            ),
+            coarse_scaler=torch.GradScaler(),
+            occupancy_grid=copy.deepcopy(conf.occupancy_grid),
+            checkpoint_dir=conf.checkpoint_dir / f"compressed_{name}",
+            model_config=conf.model_config | {"layer_dim": layer_dim, "rank": rank},
+        )
+        _finetune(compressed_conf, compression.finetune_steps, name)
+
+        rows.append(
+            {"name": name}
+            | _compare(compressed.eval(), reference, compression)
+            | {"hu_mae_before_finetune": hu_mae_before_finetune},
+        )
+        compressed_conf.checkpoint_dir.mkdir(exist_ok=True)
+        save_checkpoint(
+            compressed_conf.checkpoint_dir,
+            conf.start_epoch,
+            conf.tracker.hash,
+            compressed_conf.model_config,
+            compressed,
+            compressed_conf.coarse_optimizer,
+            occupancy_grid=compressed_conf.occupancy_grid,
+        )
+
+    for row in rows:
+        for key, value in row.items():
+            if key != "name":
+                conf.tracker.track(value, name=key, context={"compression": row["name"]})
+    return rows
+
+
+def _finetune(conf: TrainingConfig, steps: int, name: str) -> None:
+    """Train the coarse model of a training configuration on a number of batches of its data."""
+    conf.coarse_model.train()
+    batches = itertools.chain.from_iterable(itertools.repeat(conf.dataloader))
+    for batch in tqdm(itertools.islice(batches, steps), total=steps, desc=name, leave=False):
+        coarse_loss, _ = train_batch(batch, conf)
+        conf.tracker.track(
+            coarse_loss.item(),
+            name="finetune_loss",
+            context={"compression": name},
+        )
+
+
+def _flops_per_point(model: XRayModel) -> int:
+    """Count the floating point operations of the linear layers of a model for one point."""
+    return sum(
+        2 * module.in_features * module.out_features
+        for module in model.modules()
+        if isinstance(module, torch.nn.Linear)
+    )
+
+
+@torch.no_grad()
+def _compare(
+    model: XRayModel,
+    reference: torch.Tensor,
+    compression: CompressionConfig,
+) -> dict[str, float]:
+    """Generate a CT image with a model and compare it to the image of the original model.
+
+    Args:
+        model (XRayModel): The model.
+        reference (torch.Tensor): The CT image of the original model, output of run_inference.
+        compression (CompressionConfig): The compression configuration.
+
+    Returns:
+        dict[str, float]: The number of parameters of the model, the floating point operations of
+        its linear layers per point in millions, the time taken to generate the image in seconds,
+        and the mean and maximum absolute HU error relative to the original model.
+
+    """
+    conf = compression.training
+    start = time.perf_counter()
+    image = run_inference(
+        model,
+        compression.image_size,
+        chunk_size,
+        conf.attenuation_scaling_factor,
+        conf.device,
+        occupancy_grid=conf.occupancy_grid,
+    )
+    seconds = time.perf_counter() - start
+
+    error = (image - reference).abs()
+    return {
+        "params": sum(p.numel() for p in model.parameters()),
+        "mflops_per_point": _flops_per_point(model) / 1e6,
+        "seconds": seconds,
+        "hu_mae": error.mean().item(),
+        "hu_max_error": error.max().item(),
+    }
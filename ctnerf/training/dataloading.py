@@ -1,16 +1,25 @@
 """Defines the dataset class for the X-ray dataset."""
 
+import hashlib
+import json
+import os
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from typing import Any
 
 import numpy as np
 import SimpleITK as sitk
 import torch
-from torch.utils.data import Dataset
+from torch.utils.data import Dataset, IterableDataset, get_worker_info
 from tqdm import tqdm
 
 from ctnerf.rays import get_rays
-from ctnerf.utils import get_dataset_metadata
+from ctnerf.training.samplers import BlockShuffleSampler, LossWeightedSampler
+from ctnerf.utils import convert_arrays_to_lists, get_dataset_metadata
+
+CACHE_VERSION = 4  # increment when the contents of the cached tensors change
+SCALING_CHUNK_SIZE = 2**22  # number of intensities scaled at a time
 
 
 class XRayDataset(Dataset):
@@ -23,6 +32,34 @@ class XRayDataset(Dataset):
         the rays.
     - ray_bounds: A tensor of shape (N, 2) containing the two t values that define the bounds of the
         rays.
+
+    In compact mode, the per-ray geometry is not stored. Since the rays are parallel, the heading
+    vector only depends on the angle of the projection and the ray bounds only depend on the
+    lateral detector coordinate. The dataset then contains the following attributes instead:
+    - intensities: A tensor of shape (N,) containing the intensities of the pixels associated with
+        the rays.
+    - projection_angles: A tensor of shape (P,) containing the angle of each projection in radians.
+    - column_bounds: A tensor of shape (W, 2) containing the ray bounds of each detector column.
+
+    Items are then (index, intensity) pairs, and the geometry of a batch of rays is rebuilt on the
+    training device by get_ray_geometry.
+
+    Rays that pass through air only reach the detector with a transmittance close to one and carry
+    little information about the volume. They are identified from the raw intensities at load time
+    and handled according to air_policy:
+    - 'keep': All rays are kept.
+    - 'drop': Air rays are removed from the dataset.
+    - 'subsample': A random air_keep_fraction of the air rays is kept.
+    - 'constrain': Air rays are removed from the dataset, but their indices are kept in the
+        air_ray_ids attribute so that points on them can be drawn by sample_air_points and
+        constrained to zero attenuation, which is far cheaper than rendering the rays.
+    If rays have been removed, the ray_ids attribute maps each index of the dataset to the index the
+    ray would have had without removal, i.e. projection * num_pixels + pixel.
+
+    For coarse-to-fine training, binned versions of the projections can be built as additional
+    resolution levels. A level with binning factor f averages the transmittance over blocks of f x f
+    detector pixels, and each binned pixel is traced as a single ray through the centre of its
+    block. Only one level is served at a time, and the level is selected with set_binning.
     """
 
     @torch.no_grad()
@@ -33,6 +70,13 @@ class XRayDataset(Dataset):
         s: float | None = 1,
         k: float | None = 0,
         dtype: torch.dtype = torch.float32,
+        load_workers: int = 1,
+        compact: bool = False,  # noqa: FBT001, FBT002
+        cache_dir: Path | None = None,
+        air_policy: str = "keep",
+        air_threshold: float = 0.97,
+        air_keep_fraction: float = 0.1,
+        binning_factors: list[int] | None = None,
         *args: tuple,
         **kwargs: dict[str, Any],
     ) -> None:
@@ -48,6 +92,24 @@ class XRayDataset(Dataset):
             s (float, optional): Scaling factor for intensity values. Defaults to 1.
             k (float, optional): Value added to intensity values before applying log. Defaults to 0.
             dtype (torch.dtype, optional): Data type for the tensors. Defaults to torch.float32.
+            load_workers (int, optional): Number of threads used to read and decode the X-ray
+                images. Defaults to 1.
+            compact (bool, optional): Whether to store only the projection stack, the angle of each
+                projection and the ray bounds of each detector column instead of the geometry of
+                every ray. Defaults to False.
+            cache_dir (Path, optional): Directory to cache the processed tensors in. If a cache file
+                for the same X-rays and processing parameters exists, the tensors are memory-mapped
+                from it instead of being rebuilt from the images. If None, no cache is used.
+                Defaults to None.
+            air_policy (str, optional): How to handle rays that pass through air only. 'keep',
+                'drop', 'subsample' or 'constrain'. Defaults to 'keep'.
+            air_threshold (float, optional): Raw intensity, i.e. transmittance, at or above which a
+                ray is considered to pass through air only. Defaults to 0.97.
+            air_keep_fraction (float, optional): Fraction of the air rays kept by the 'subsample'
+                policy. Defaults to 0.1.
+            binning_factors (list[int], optional): Binning factors of the coarse resolution levels
+                to build in addition to full resolution, e.g. [2, 4]. The dataset initially serves
+                full resolution. Defaults to None.
             *args: Additional positional arguments passed to the base class.
             **kwargs: Additional keyword arguments passed to the base class.
 
@@ -56,55 +118,148 @@ class XRayDataset(Dataset):
 
         """
         super().__init__(*args, **kwargs)
+        _check_scaling(attenuation_scaling_factor, s, k)
+        if air_policy not in ("keep", "drop", "subsample", "constrain"):
+            msg = f"Unknown air policy: {air_policy}"
+            raise ValueError(msg)
+
+        binning_factors = sorted({1, *(binning_factors or [])})
+        if binning_factors[0] < 1:
+            msg = f"Binning factors must be positive, got {binning_factors}"
+            raise ValueError(msg)
 
         # Read metadata
         metadata = get_dataset_metadata(xray_dir)
-        xray_size = metadata["size"]
-        num_xrays = len(metadata["file_angle_map"])
-        self.len = np.prod(xray_size) * num_xrays
-
-        # Get angles, intensities and pixel indices from images
-        angles, intensities, pixel_indices = self._read_images(xray_dir, metadata)
+        self.img_shape = torch.tensor(metadata["size"])
+        self.compact = compact
 
-        # Scale intensities
-        if attenuation_scaling_factor is not None and (s is not None and k is not None):
-            msg = "Both attenuation_scaling factor and s and k were set. Choose one"
-            raise ValueError(msg)
-        if attenuation_scaling_factor is not None:
-            intensities = intensities.to(torch.float64).pow(1/attenuation_scaling_factor)
-        elif s is not None and k is not None:
-            intensities = torch.log(intensities + k) / s
+        # Load the processed tensors from the cache if possible, else build them from the images
+        cache_path = None
+        if cache_dir is not None:
+            cache_key = get_cache_key(
+                xray_dir,
+                metadata,
+                attenuation_scaling_factor=attenuation_scaling_factor,
+                s=s,
+                k=k,
+                dtype=str(dtype),
+                compact=compact,
+                air_policy=air_policy,
+                air_threshold=air_threshold,
+                air_keep_fraction=air_keep_fraction,
+                binning_factors=binning_factors,
+            )
+            cache_path = cache_dir / f"{cache_key}.pt"
+        self._mmap_path = None
+        if cache_path is not None and cache_path.exists():
+            levels = torch.load(cache_path, mmap=True, weights_only=True)
+            self._mmap_path = cache_path
         else:
-            msg = "Either attenuation_scaling_factor, or both s and k must be set"
+            levels = self._build_tensors(
+                xray_dir,
+                metadata,
+                attenuation_scaling_factor,
+                s,
+                k,
+                dtype,
+                load_workers,
+                air_policy,
+                air_threshold,
+                air_keep_fraction,
+                binning_factors,
+            )
+            if cache_path is not None:
+                _write_cache(cache_path, levels)
+
+        self._levels = {int(binning): tensors for binning, tensors in levels.items()}
+        self.set_binning(1)
+
+    def set_binning(self, binning: int) -> None:
+        """Select the resolution level to serve rays from.
+
+        Args:
+            binning (int): Binning factor of the level. 1 is full resolution.
+
+        """
+        if binning not in self._levels:
+            msg = f"No resolution level with binning factor {binning} was built"
             raise ValueError(msg)
-        self.intensities = torch.nan_to_num(intensities)  # intensity 0 gives -inf after log
-
-        # Get positions and heading vectors in model space
-        size_tensor = torch.tensor(xray_size)
-        self.start_positions, self.heading_vectors, self.ray_bounds = get_rays(
-            pixel_indices,
-            angles,
-            size_tensor,
-        )
 
-        # Tensor setup
-        self.start_positions = self.start_positions.to(dtype=dtype)
-        self.heading_vectors = self.heading_vectors.to(dtype=dtype)
-        self.intensities = self.intensities.to(dtype=dtype)
-        self.ray_bounds = self.ray_bounds.to(dtype=dtype)
+        self.binning = binning
+        self.detector_size = [size // binning for size in self.img_shape.tolist()]
+        self.num_pixels = int(np.prod(self.detector_size))
+        self.ray_ids = None
+        self.air_ray_ids = None
+        self._device_tables = {}
+        for name, tensor in self._levels[binning].items():
+            setattr(self, name, tensor)
+        self.len = len(self.intensities)
+
+    def share_memory_(self) -> "XRayDataset":
+        """Move the tensors of the dataset to shared memory.
+
+        Should be called before starting DataLoader workers, so that every worker reads the same
+        copy of the rays instead of receiving its own. Tensors memory-mapped from the cache are
+        already backed by the page cache, which is shared between processes, and are left as they
+        are.
+
+        Returns:
+            XRayDataset: The dataset.
+
+        """
+        if self._mmap_path is None:
+            for tensors in self._levels.values():
+                for tensor in tensors.values():
+                    tensor.share_memory_()
+        return self
+
+    def __getstate__(self) -> dict[str, Any]:
+        """Get the state of the dataset for pickling, e.g. when sending it to a spawned worker.
+
+        If the tensors are memory-mapped from the cache, only the path of the cache file is pickled
+        and the tensors are memory-mapped again when unpickling, rather than being copied. Copies of
+        tensors on devices are never pickled.
+
+        Returns:
+            dict[str, Any]: The state of the dataset.
+
+        """
+        state = self.__dict__.copy()
+        state["_device_tables"] = {}
+        if self._mmap_path is not None:
+            for name in self._levels[self.binning]:
+                state.pop(name)
+            state["_levels"] = None
+        return state
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        """Restore the state of the dataset after unpickling.
+
+        Args:
+            state (dict[str, Any]): The state of the dataset.
+
+        """
+        self.__dict__.update(state)
+        if self._levels is None:
+            levels = torch.load(self._mmap_path, mmap=True, weights_only=True)
+            self._levels = {int(binning): tensors for binning, tensors in levels.items()}
+            self.set_binning(self.binning)
 
     def __getitem__(
         self, index: int,
-    ) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor]:
+    ) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor] | tuple[int, torch.Tensor]:
         """Get a sample from the dataset.
 
         Args:
             index (int): Index of the sample.
 
         Returns:
-            tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor]: Sample data.
+            tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor]: Sample data. In compact
+            mode, the index and intensity of the ray.
 
         """
+        if self.compact:
+            return index, self.intensities[index]
         return (
             self.start_positions[index],
             self.heading_vectors[index],
@@ -121,44 +276,766 @@ class XRayDataset(Dataset):
         """
         return self.len
 
-    def _read_images(
-        self, train_dir: Path, metadata: dict,
+    @torch.no_grad()
+    def get_ray_geometry(
+        self, indices: torch.Tensor,
     ) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
-        """Read xray images and return angles, intensities and pixel indices.
+        """Get the start positions, heading vectors and ray bounds of a batch of rays.
+
+        Rebuilds the geometry of the rays from their indices on the device of the indices. Used in
+        compact mode, where the geometry of each ray is not stored.
+
+        Args:
+            indices (torch.Tensor): shape (B,). Indices of the rays.
+
+        Returns:
+            torch.Tensor: shape (B, 3). Start position
+            torch.Tensor: shape (B, 3). Heading vector
+            torch.Tensor: shape (B, 2). Ray bounds
+
+        """
+        if self.ray_ids is not None:
+            indices = self._get_device_table("ray_ids", indices.device)[indices].long()
+        return self._get_geometry_from_ray_ids(indices)
+
+    @torch.no_grad()
+    def sample_air_points(self, num_points: int, device: torch.device) -> torch.Tensor:
+        """Draw random points on random air rays.
+
+        Only available with the 'constrain' air policy. The attenuation at these points is known to
+        be close to zero.
+
+        Args:
+            num_points (int): Number of points to draw.
+            device (torch.device): Device to draw the points on.
+
+        Returns:
+            torch.Tensor: shape (num_points, 3). The drawn points.
+
+        """
+        if self.air_ray_ids is None:
+            msg = "Air points can only be sampled with the 'constrain' air policy"
+            raise ValueError(msg)
+        air_ray_ids = self._get_device_table("air_ray_ids", device)
+        choice = torch.randint(len(air_ray_ids), (num_points,), device=device)
+        start_positions, heading_vectors, ray_bounds = self._get_geometry_from_ray_ids(
+            air_ray_ids[choice].long(),
+        )
+        t = torch.rand(num_points, device=device)
+        t = ray_bounds[:, 0] + t * (ray_bounds[:, 1] - ray_bounds[:, 0])
+        return start_positions + t.unsqueeze(1) * heading_vectors
+
+    def _get_geometry_from_ray_ids(
+        self, ray_ids: torch.Tensor,
+    ) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        """Get the geometry of rays from their index among all rays of the X-ray images.
+
+        Args:
+            ray_ids (torch.Tensor): shape (B,). Index of each ray, projection * num_pixels + pixel.
+
+        Returns:
+            torch.Tensor: shape (B, 3). Start position
+            torch.Tensor: shape (B, 3). Heading vector
+            torch.Tensor: shape (B, 2). Ray bounds
+
+        """
+        device = ray_ids.device
+        projection_angles = self._get_device_table("projection_angles", device)
+        column_bounds = self._get_device_table("column_bounds", device)
+        img_shape = self._get_device_table("img_shape", device)
+
+        # Images are stored row by row, with the lateral coordinate along the rows
+        width = self.detector_size[0]
+        projections = torch.div(ray_ids, self.num_pixels, rounding_mode="floor")
+        pixels = ray_ids - projections * self.num_pixels
+        rows = torch.div(pixels, width, rounding_mode="floor")
+        columns = pixels - rows * width
+        pixel_pos = torch.stack((columns, rows), dim=1).to(torch.float32)
+        if self.binning > 1:
+            pixel_pos = pixel_pos * self.binning + (self.binning - 1) / 2
+
+        return get_rays(
+            pixel_pos,
+            projection_angles[projections],
+            img_shape,
+            column_bounds[columns],
+        )
+
+    def _get_device_table(self, name: str, device: torch.device) -> torch.Tensor:
+        """Get a copy of one of the tensors of the dataset on a device, cached per device."""
+        if (name, device) not in self._device_tables:
+            self._device_tables[name, device] = getattr(self, name).to(device)
+        return self._device_tables[name, device]
+
+    def _build_tensors(
+        self,
+        xray_dir: Path,
+        metadata: dict,
+        attenuation_scaling_factor: float | None,
+        s: float | None,
+        k: float | None,
+        dtype: torch.dtype,
+        load_workers: int,
+        air_policy: str,
+        air_threshold: float,
+        air_keep_fraction: float,
+        binning_factors: list[int],
+    ) -> dict[str, dict[str, torch.Tensor]]:
+        """Read the X-ray images and build the tensors stored by the dataset.
+
+        Args:
+            xray_dir (Path): Directory containing X-ray image files and metadata.
+            metadata (dict): The metadata from the dataset.
+            attenuation_scaling_factor (float | None): Scaling factor for the attenuation values.
+            s (float | None): Scaling factor for intensity values.
+            k (float | None): Value added to intensity values before applying log.
+            dtype (torch.dtype): Data type for the tensors.
+            load_workers (int): Number of threads used to read the images.
+            air_policy (str): How to handle rays that pass through air only.
+            air_threshold (float): Raw intensity at or above which a ray passes through air only.
+            air_keep_fraction (float): Fraction of the air rays kept by the 'subsample' policy.
+            binning_factors (list[int]): Binning factors of the resolution levels to build.
+
+        Returns:
+            dict[str, dict[str, torch.Tensor]]: The tensors of each resolution level, keyed by
+            binning factor and attribute name.
+
+        """
+        # Get projection angles and intensities from images
+        angles, intensities = self._read_images(xray_dir, metadata, load_workers)
+
+        # Full resolution is built last, since it may scale the raw intensities in place
+        levels = {}
+        for binning in sorted(binning_factors, reverse=True):
+            levels[str(binning)] = self._build_level_tensors(
+                angles,
+                bin_intensities(intensities, self.img_shape.tolist(), binning),
+                binning,
+                attenuation_scaling_factor,
+                s,
+                k,
+                dtype,
+                air_policy,
+                air_threshold,
+                air_keep_fraction,
+            )
+        return levels
+
+    def _build_level_tensors(
+        self,
+        angles: torch.Tensor,
+        intensities: torch.Tensor,
+        binning: int,
+        attenuation_scaling_factor: float | None,
+        s: float | None,
+        k: float | None,
+        dtype: torch.dtype,
+        air_policy: str,
+        air_threshold: float,
+        air_keep_fraction: float,
+    ) -> dict[str, torch.Tensor]:
+        """Build the tensors of one resolution level from its raw intensities.
+
+        Args:
+            angles (torch.Tensor): shape (P,). Angle of each projection in radians.
+            intensities (torch.Tensor): shape (P * num_pixels,). Raw intensities of the level.
+            binning (int): Binning factor of the level.
+            attenuation_scaling_factor (float | None): Scaling factor for the attenuation values.
+            s (float | None): Scaling factor for intensity values.
+            k (float | None): Value added to intensity values before applying log.
+            dtype (torch.dtype): Data type for the tensors.
+            air_policy (str): How to handle rays that pass through air only.
+            air_threshold (float): Raw intensity at or above which a ray passes through air only.
+            air_keep_fraction (float): Fraction of the air rays kept by the 'subsample' policy.
+
+        Returns:
+            dict[str, torch.Tensor]: The tensors of the level, keyed by attribute name.
+
+        """
+        num_pixels = len(intensities) // len(angles)
+
+        # Index the air rays on the raw intensities, before scaling
+        ray_ids = None
+        air_ray_ids = None
+        if air_policy != "keep":
+            removed = intensities >= air_threshold
+            if air_policy == "subsample":
+                generator = torch.Generator().manual_seed(0)
+                removed &= torch.rand(len(removed), generator=generator) >= air_keep_fraction
+            elif air_policy == "constrain":
+                air_ray_ids = torch.nonzero(removed).squeeze(1)
+            ray_ids = torch.nonzero(~removed).squeeze(1)
+            intensities = intensities[ray_ids]
+
+        intensities = scale_intensities(intensities, attenuation_scaling_factor, s, k, dtype)
+        tensors = {"intensities": intensities}
+
+        # Tables needed to rebuild the geometry of each ray
+        tensors["projection_angles"] = angles.to(dtype=torch.float32)
+        tensors["column_bounds"] = self._get_column_bounds(binning)
+        if ray_ids is not None:
+            tensors["ray_ids"] = _to_index_dtype(ray_ids)
+        if air_ray_ids is not None:
+            tensors["air_ray_ids"] = _to_index_dtype(air_ray_ids)
+
+        if not self.compact:
+            # Get positions and heading vectors in model space
+            pixel_indices = self._get_pixel_indices(binning)
+            if ray_ids is None:
+                pixel_indices = pixel_indices.repeat(len(angles), 1)
+                angles = angles.repeat_interleave(num_pixels)
+            else:
+                pixel_indices = pixel_indices[ray_ids % num_pixels]
+                angles = angles[torch.div(ray_ids, num_pixels, rounding_mode="floor")]
+            start_positions, heading_vectors, ray_bounds = get_rays(
+                pixel_indices,
+                angles,
+                self.img_shape,
+            )
+            tensors["start_positions"] = start_positions.to(dtype=dtype)
+            tensors["heading_vectors"] = heading_vectors.to(dtype=dtype)
+            tensors["ray_bounds"] = ray_bounds.to(dtype=dtype)
+
+        return tensors
+
+    def _get_pixel_indices(self, binning: int = 1) -> torch.Tensor:
+        """Get the pixel indices of a single projection, in the order the intensities are stored.
+
+        Args:
+            binning (int, optional): Binning factor of the resolution level. Defaults to 1.
+
+        Returns:
+            torch.Tensor: shape (num_pixels, 2). The (y, z) index of each pixel, in full resolution
+            pixel coordinates.
+
+        """
+        pixel_indices = get_pixel_indices([size // binning for size in self.img_shape.tolist()])
+        if binning > 1:
+            # A binned pixel is centred on the block of pixels it was binned from
+            pixel_indices = pixel_indices * binning + (binning - 1) / 2
+        return pixel_indices
+
+    def _get_column_bounds(self, binning: int = 1) -> torch.Tensor:
+        """Get the ray bounds of each detector column.
+
+        The ray bounds are invariant to rotation about the z-axis and to the z coordinate, so they
+        can be computed from the first row of a projection taken at angle 0.
+
+        Args:
+            binning (int, optional): Binning factor of the resolution level. Defaults to 1.
+
+        Returns:
+            torch.Tensor: shape (W, 2). Ray bounds of each detector column.
+
+        """
+        pixel_pos = self._get_pixel_indices(binning)[: int(self.img_shape[0]) // binning]
+        _, _, column_bounds = get_rays(
+            pixel_pos,
+            torch.zeros(pixel_pos.shape[0]),
+            self.img_shape,
+        )
+        return column_bounds
+
+    def _read_images(
+        self, train_dir: Path, metadata: dict, load_workers: int,
+    ) -> tuple[torch.Tensor, torch.Tensor]:
+        """Read xray images and return projection angles and intensities.
+
+        The images are read concurrently by a pool of threads, each writing its image into a slice
+        of the shared preallocated buffers. SimpleITK and numpy release the GIL while decoding and
+        copying, so the threads run in parallel.
 
         Args:
             train_dir (Path): The directory containing the xray images.
             metadata (dict): The metadata from the dataset.
+            load_workers (int): Number of threads used to read the images.
 
         Returns:
-            tuple[torch.Tensor, torch.Tensor, torch.Tensor]: angles, intensities and pixel indices.
+            tuple[torch.Tensor, torch.Tensor]: angle of each projection in radians, shape (P,), and
+            intensity of each pixel in single precision, shape (P * num_pixels,).
 
         """
-        angles = []
-        intensities = np.ndarray(0, dtype=np.float64)
-        pixel_indices = torch.zeros(size=(0, 2))
+        xray_size = metadata["size"]
+        num_pixels = int(np.prod(xray_size))
+        num_xrays = len(metadata["file_angle_map"])
+
+        # Preallocate buffers for all projections and fill them one projection at a time
+        angles = torch.empty(num_xrays, dtype=torch.float64)
+        intensities = np.empty(num_pixels * num_xrays, dtype=np.float32)
+
+        def read_projection(i: int, file: str, angle: float) -> None:
+            xray_image = read_xray(train_dir / file, xray_size)
+            projection = slice(i * num_pixels, (i + 1) * num_pixels)
 
-        for file, angle in tqdm(metadata["file_angle_map"].items(), "Loading dataset"):
-            # Read image
-            xray_image = sitk.ReadImage(train_dir / file)
-            xray_size = xray_image.GetSize()
+            # Save angle of the projection and intensity of each pixel
+            angles[i] = np.radians(angle)
+            intensities[projection] = sitk.GetArrayViewFromImage(xray_image).reshape(-1)
 
-            # Save angle for each pixel
-            angles += [(np.radians(angle))] * np.prod(xray_size)
+        with ThreadPoolExecutor(max_workers=load_workers) as executor:
+            futures = [
+                executor.submit(read_projection, i, file, angle)
+                for i, (file, angle) in enumerate(metadata["file_angle_map"].items())
+            ]
+            for future in tqdm(as_completed(futures), "Loading dataset", total=len(futures)):
+                future.result()
 
-            # Save intensity for each pixel
-            xray_intensities = sitk.GetArrayFromImage(xray_image)
-            intensities = np.append(intensities, xray_intensities)
+        intensities = torch.from_numpy(intensities)
+
+        return angles, intensities
+
+
+def read_xray(xray_path: Path, xray_size: list[int]) -> sitk.Image:
+    """Read an X-ray image and check that its size matches the metadata.
+
+    Args:
+        xray_path (Path): Path to the X-ray image.
+        xray_size (list[int]): Size of the X-ray images according to the metadata.
+
+    Returns:
+        sitk.Image: The X-ray image.
+
+    """
+    xray_image = sitk.ReadImage(xray_path)
+    if list(xray_image.GetSize()) != list(xray_size):
+        msg = (
+            f"Size of {xray_path.name} is {xray_image.GetSize()}, "
+            f"but meta.json specifies {xray_size}"
+        )
+        raise ValueError(msg)
+    return xray_image
 
-            # Save pixel indices corresponding to intensities and angles
-            y = torch.linspace(0, xray_size[0] - 1, xray_size[0])
-            z = torch.linspace(0, xray_size[1] - 1, xray_size[1])
-            y, z = torch.meshgrid(y, z, indexing="xy")
-            pixel_indices = torch.cat(
-                [pixel_indices, torch.stack((y, z), dim=-1).reshape(-1, 2)], dim=0,
+
+def get_pixel_indices(xray_size: list[int]) -> torch.Tensor:
+    """Get the pixel indices of an X-ray image, in the order its intensities are stored.
+
+    Args:
+        xray_size (list[int]): Size of the X-ray image.
+
+    Returns:
+        torch.Tensor: shape (num_pixels, 2). The (y, z) index of each pixel.
+
+    """
+    width, height = xray_size
+    y = torch.linspace(0, width - 1, width)
+    z = torch.linspace(0, height - 1, height)
+    y, z = torch.meshgrid(y, z, indexing="xy")
+    return torch.stack((y, z), dim=-1).reshape(-1, 2)
+
+
+def bin_intensities(intensities: torch.Tensor, xray_size: list[int], binning: int) -> torch.Tensor:
+    """Bin the pixels of a stack of X-ray images by averaging blocks of binning x binning pixels.
+
+    Pixels beyond the last whole block in each direction are discarded.
+
+    Args:
+        intensities (torch.Tensor): shape (P * num_pixels,). Intensities of the images, stored row
+            by row.
+        xray_size (list[int]): Size of the X-ray images.
+        binning (int): Binning factor.
+
+    Returns:
+        torch.Tensor: shape (P * num_pixels // binning**2,). Intensities of the binned images. If
+        binning is 1, the intensities are returned unchanged.
+
+    """
+    if binning == 1:
+        return intensities
+    width, height = xray_size
+    binned_width, binned_height = width // binning, height // binning
+    images = intensities.reshape(-1, height, width)
+    images = images[:, : binned_height * binning, : binned_width * binning]
+    images = images.reshape(-1, binned_height, binning, binned_width, binning)
+    return images.mean(dim=(2, 4)).reshape(-1)
+
+
+def scale_intensities(
+    intensities: torch.Tensor,
+    attenuation_scaling_factor: float | None,
+    s: float | None,
+    k: float | None,
+    dtype: torch.dtype = torch.float32,
+    chunk_size: int = SCALING_CHUNK_SIZE,
+) -> torch.Tensor:
+    """Scale X-ray intensities for training.
+
+    If attenuation_scaling_factor is set, the intensities are raised to its reciprocal. Otherwise,
+    k is added to the intensities before taking the log and dividing by s.
+
+    The intensities are scaled in single precision, chunk_size at a time, and written directly into
+    a tensor of the target dtype, so that scaling needs at most one chunk of temporary memory. If
+    both the intensities and the target dtype are float32, the intensities are scaled in place.
+
+    Args:
+        intensities (torch.Tensor): shape (N,). The raw intensities.
+        attenuation_scaling_factor (float | None): Scaling factor for the attenuation values.
+        s (float | None): Scaling factor for intensity values.
+        k (float | None): Value added to intensity values before applying log.
+        dtype (torch.dtype, optional): Data type of the scaled intensities. Defaults to
+            torch.float32.
+        chunk_size (int, optional): Number of intensities to scale at a time. Defaults to
+            SCALING_CHUNK_SIZE.
+
+    Returns:
+        torch.Tensor: shape (N,). The scaled intensities.
+
+    """
+    in_place = intensities.dtype == torch.float32 and dtype == torch.float32
+    scaled = intensities if in_place else torch.empty(intensities.shape, dtype=dtype)
+
+    for start in range(0, len(intensities), chunk_size):
+        chunk = intensities[start : start + chunk_size]
+        if not in_place:
+            chunk = chunk.to(torch.float32, copy=True)
+        if attenuation_scaling_factor is not None:
+            chunk.pow_(1 / attenuation_scaling_factor)
+        else:
+            chunk.add_(k).log_().div_(s)
+        chunk.nan_to_num_()  # intensity 0 gives -inf after log
+        if not in_place:
+            scaled[start : start + chunk_size] = chunk
+
+    return scaled
+
+
+def _check_scaling(
+    attenuation_scaling_factor: float | None,
+    s: float | None,
+    k: float | None,
+) -> None:
+    """Check that exactly one way of scaling the intensities is configured.
+
+    Raises:
+        ValueError: If both or neither of attenuation_scaling_factor and s and k are set.
+
+    """
+    if attenuation_scaling_factor is not None and (s is not None and k is not None):
+        msg = "Both attenuation_scaling factor and s and k were set. Choose one"
+        raise ValueError(msg)
+    if attenuation_scaling_factor is None and (s is None or k is None):
+        msg = "Either attenuation_scaling_factor, or both s and k must be set"
+        raise ValueError(msg)
+
+
+def get_cache_key(xray_dir: Path, metadata: dict, **params: float | str | bool | None) -> str:
+    """Get the key identifying the processed tensors of a dataset.
+
+    The key is a hash of the metadata, the name, size and modification time of each X-ray image,
+    and the parameters used to process the images. Hashing the file statistics rather than the
+    image data keeps computing the key cheap, while still detecting replaced images.
+
+    Args:
+        xray_dir (Path): Directory containing X-ray image files and metadata.
+        metadata (dict): The metadata from the dataset.
+        **params: The parameters used to process the images.
+
+    Returns:
+        str: The cache key.
+
+    """
+    files = {}
+    for file in metadata["file_angle_map"]:
+        stat = (xray_dir / file).stat()
+        files[file] = [stat.st_size, stat.st_mtime_ns]
+    key_data = {
+        "version": CACHE_VERSION,
+        "metadata": convert_arrays_to_lists(metadata),
+        "files": files,
+        "params": params,
+    }
+    key_json = json.dumps(key_data, sort_keys=True, default=str)
+    return hashlib.sha256(key_json.encode()).hexdigest()
+
+
+def _to_index_dtype(indices: torch.Tensor) -> torch.Tensor:
+    """Convert ray indices to int32 if they fit, halving the memory needed to store them."""
+    if len(indices) == 0 or int(indices.max()) <= torch.iinfo(torch.int32).max:
+        return indices.to(torch.int32)
+    return indices
+
+
+def _write_cache(cache_path: Path, tensors: dict) -> None:
+    """Write the processed tensors of a dataset to a cache file.
+
+    The file is written under a temporary name and then renamed, so that an interrupted write never
+    leaves a partial cache file behind.
+
+    Args:
+        cache_path (Path): Path of the cache file.
+        tensors (dict): The tensors to cache, possibly nested in dicts.
+
+    """
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+    torch.save(tensors, tmp_path)
+    tmp_path.replace(cache_path)
+
+
+class RayBatchIterator:
+    """Iterator over shuffled batches of rays gathered from one contiguous buffer.
+
+    Alternative to wrapping an XRayDataset in a DataLoader. Rather than fetching every ray with a
+    separate __getitem__ call and collating the results, the rays are stored in a single (N, 9)
+    buffer, or an (N,) buffer of intensities in compact mode, and each batch is gathered from it
+    with one indexing operation using a new random permutation every epoch. The buffer can be
+    placed on the training device, in which case batches never leave the device, or in pinned
+    memory for fast asynchronous transfers.
+
+    Batches have the same format as those of a DataLoader over the dataset. The last incomplete
+    batch of each epoch is dropped.
+
+    If a sampler is given, each batch is instead made up of the indices drawn by the sampler, and
+    an epoch consists of as many batches as there are full batches in the dataset.
+    """
+
+    @torch.no_grad()
+    def __init__(
+        self,
+        dataset: XRayDataset,
+        batch_size: int,
+        device: torch.device | str = "cpu",
+        *,
+        pin_memory: bool = False,
+        sampler: LossWeightedSampler | BlockShuffleSampler | None = None,
+    ) -> None:
+        """Initialize the RayBatchIterator.
+
+        The tensors of the dataset are replaced by views into the buffer, so the rays are not
+        stored twice.
+
+        Args:
+            dataset (XRayDataset): The dataset to iterate over.
+            batch_size (int): Number of rays in each batch.
+            device (torch.device | str, optional): Device to place the buffer on. Defaults to cpu.
+            pin_memory (bool, optional): Whether to place the buffer in pinned memory. Only used if
+                the buffer is on the cpu. Defaults to False.
+            sampler (LossWeightedSampler | BlockShuffleSampler, optional): Sampler that draws the
+                indices of each batch. Should be on the same device as the buffer. If None, each
+                epoch is a random permutation of the rays. Defaults to None.
+
+        """
+        self.dataset = dataset
+        self.sampler = sampler
+        self.batch_size = batch_size
+        self.device = torch.device(device)
+        self.pin_memory = pin_memory and self.device.type == "cpu"
+
+        if dataset.compact:
+            buffer = dataset.intensities
+        else:
+            buffer = torch.cat(
+                (
+                    dataset.start_positions,
+                    dataset.heading_vectors,
+                    dataset.intensities.unsqueeze(1),
+                    dataset.ray_bounds,
+                ),
+                dim=1,
             )
+        buffer = buffer.to(self.device)
+        if self.pin_memory:
+            buffer = buffer.pin_memory()
+        self.buffer = buffer
+
+        if dataset.compact:
+            dataset.intensities = buffer
+        else:
+            dataset.start_positions = buffer[:, 0:3]
+            dataset.heading_vectors = buffer[:, 3:6]
+            dataset.intensities = buffer[:, 6]
+            dataset.ray_bounds = buffer[:, 7:9]
+
+    def __iter__(
+        self,
+    ) -> Iterator[tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor]]:
+        """Iterate over one epoch of shuffled batches.
 
-        angles = torch.tensor(angles)
-        intensities = torch.tensor(intensities)
+        Yields:
+            tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor]: start positions,
+            heading vectors, intensities and ray bounds of a batch. In compact mode, the indices
+            and intensities of a batch.
 
-        return angles, intensities, pixel_indices
+        """
+        for batch_indices in self._batch_indices():
+            if self.pin_memory:
+                batch = torch.empty(
+                    (self.batch_size, *self.buffer.shape[1:]),
+                    dtype=self.buffer.dtype,
+                    pin_memory=True,
+                )
+                torch.index_select(self.buffer, 0, batch_indices, out=batch)
+            else:
+                batch = self.buffer[batch_indices]
+
+            if self.dataset.compact:
+                yield batch_indices, batch
+            else:
+                yield batch[:, 0:3], batch[:, 3:6], batch[:, 6], batch[:, 7:9]
+
+    def __len__(self) -> int:
+        """Get the number of batches in an epoch.
+
+        Returns:
+            int: Number of full batches in the dataset.
+
+        """
+        return len(self.dataset) // self.batch_size
+
+    def _batch_indices(self) -> Iterator[torch.Tensor]:
+        """Iterate over the indices of the batches in an epoch.
+
+        Yields:
+            torch.Tensor: shape (batch_size,). Indices of the rays in a batch.
+
+        """
+        if self.sampler is not None:
+            for _ in range(len(self)):
+                yield self.sampler.sample(self.batch_size)
+            return
+
+        permutation = torch.randperm(len(self.dataset), device=self.device)
+        yield from permutation[: len(self) * self.batch_size].split(self.batch_size)
+
+
+class StreamingXRayDataset(IterableDataset):
+    """Streaming dataset for X-ray datasets that do not fit in memory.
+
+    Instead of holding every ray in memory, each X-ray image is treated as a shard that is read
+    from disk when needed. The shards are partitioned across DataLoader workers, and each worker
+    shuffles its rays within a bounded buffer that mixes the rays of several projections. Memory
+    use per worker is therefore bounded by the size of the buffer, regardless of the number of
+    X-ray images.
+
+    The dataset yields whole batches of rays in the same format as a DataLoader over an
+    XRayDataset, so it should be wrapped in a DataLoader with batch_size=None. Rays that do not
+    fill a whole batch at the end of an epoch are dropped.
+    """
+
+    compact = False
+
+    def __init__(
+        self,
+        xray_dir: Path,
+        attenuation_scaling_factor: float | None,
+        batch_size: int,
+        s: float | None = 1,
+        k: float | None = 0,
+        dtype: torch.dtype = torch.float32,
+        shuffle_buffer_projections: int = 8,
+    ) -> None:
+        """Initialize the StreamingXRayDataset.
+
+        Args:
+            xray_dir (Path): Directory containing X-ray image files and metadata.
+            attenuation_scaling_factor (float): Scaling factor for the attenuation values.
+            batch_size (int): Number of rays in each batch.
+            s (float, optional): Scaling factor for intensity values. Defaults to 1.
+            k (float, optional): Value added to intensity values before applying log. Defaults to 0.
+            dtype (torch.dtype, optional): Data type for the tensors. Defaults to torch.float32.
+            shuffle_buffer_projections (int, optional): Number of projections whose rays are
+                shuffled together in each worker. Defaults to 8.
+
+        """
+        super().__init__()
+        _check_scaling(attenuation_scaling_factor, s, k)
+
+        metadata = get_dataset_metadata(xray_dir)
+        self.xray_dir = xray_dir
+        self.xray_size = list(metadata["size"])
+        self.file_angle_map = metadata["file_angle_map"]
+        self.num_pixels = int(np.prod(self.xray_size))
+        self.attenuation_scaling_factor = attenuation_scaling_factor
+        self.s = s
+        self.k = k
+        self.dtype = dtype
+        self.batch_size = batch_size
+        self.shuffle_buffer_projections = shuffle_buffer_projections
+
+    def __iter__(
+        self,
+    ) -> Iterator[tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor]]:
+        """Iterate over one epoch of shuffled batches.
+
+        Yields:
+            tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor]: start positions,
+            heading vectors, intensities and ray bounds of a batch.
+
+        """
+        # Partition the shards across workers and shuffle the order of each worker's shards
+        files = list(self.file_angle_map)
+        worker_info = get_worker_info()
+        if worker_info is not None:
+            files = files[worker_info.id :: worker_info.num_workers]
+        files = [files[i] for i in torch.randperm(len(files))]
+
+        pixel_indices = get_pixel_indices(self.xray_size)
+        img_shape = torch.tensor(self.xray_size)
+        remainder = None
+        for i in range(0, len(files), self.shuffle_buffer_projections):
+            rays = [
+                self._read_shard(file, pixel_indices, img_shape)
+                for file in files[i : i + self.shuffle_buffer_projections]
+            ]
+
+            # Carry over the rays that did not fill a batch from the previous buffer
+            if remainder is not None:
+                rays.append(remainder)
+            rays = torch.cat(rays, dim=0)
+            rays = rays[torch.randperm(rays.shape[0])]
+
+            num_batches = rays.shape[0] // self.batch_size
+            for batch in rays[: num_batches * self.batch_size].split(self.batch_size):
+                yield batch[:, 0:3], batch[:, 3:6], batch[:, 6], batch[:, 7:9]
+            remainder = rays[num_batches * self.batch_size :]
+
+    def __len__(self) -> int:
+        """Get the approximate number of batches in an epoch.
+
+        Returns:
+            int: Number of full batches in the dataset. Each worker drops its last incomplete
+            batch, so slightly fewer batches may be yielded when using several workers.
+
+        """
+        return self.num_pixels * len(self.file_angle_map) // self.batch_size
+
+    @torch.no_grad()
+    def _read_shard(
+        self,
+        file: str,
+        pixel_indices: torch.Tensor,
+        img_shape: torch.Tensor,
+    ) -> torch.Tensor:
+        """Read an X-ray image and build the rays of its pixels.
+
+        Args:
+            file (str): Name of the X-ray image.
+            pixel_indices (torch.Tensor): shape (num_pixels, 2). Pixel indices of an X-ray image.
+            img_shape (torch.Tensor): shape (2,). Size of the X-ray image.
+
+        Returns:
+            torch.Tensor: shape (num_pixels, 9). Start positions, heading vectors, intensities and
+            ray bounds of the rays.
+
+        """
+        xray_image = read_xray(self.xray_dir / file, self.xray_size)
+        intensities = torch.from_numpy(sitk.GetArrayFromImage(xray_image).reshape(-1))
+        intensities = scale_intensities(
+            intensities,
+            self.attenuation_scaling_factor,
+            self.s,
+            self.k,
+            self.dtype,
+        )
+
+        angle = np.radians(self.file_angle_map[file])
+        angles = torch.full((self.num_pixels,), angle, dtype=torch.float64)
+        start_positions, heading_vectors, ray_bounds = get_rays(pixel_indices, angles, img_shape)
+
+        return torch.cat(
+            (
+                start_positions.to(self.dtype),
+                heading_vectors.to(self.dtype),
+                intensities.unsqueeze(1),
+                ray_bounds.to(self.dtype),
+            ),
+            dim=1,
+        )
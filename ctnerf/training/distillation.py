@@ -0,0 +1,155 @@
+"""Contains functions for distilling a trained model into a smaller student model."""
+
+import time
+from pathlib import Path
+
+import torch
+from tqdm import tqdm
+
+from ctnerf.image_creation.ct_creation import run_inference
+from ctnerf.setup.config import DistillationConfig, get_distillation_config
+from ctnerf.training.training import save_checkpoint
+
+
+def distill(config_path: Path) -> dict[str, float]:
+    """Distill a trained model into a smaller student model.
+
+    The student is trained to reproduce the attenuation coefficients of the teacher at points drawn
+    from the volume. A fraction of each batch is drawn in proportion to the gradient magnitude of
+    the teacher, so that edges, where a small student loses detail first, are weighted more heavily
+    than uniform regions. After training, CT images of the teacher and the student are generated
+    and compared.
+
+    Args:
+        config_path (Path): Path to the distillation configuration file.
+
+    Returns:
+        dict[str, float]: Comparison of the student to the teacher, see _compare.
+
+    """
+    conf = get_distillation_config(config_path)
+    edge_cdf = _get_edge_cdf(conf)
+
+    for epoch in range(1, conf.num_epochs + 1):
+        for _ in tqdm(range(conf.steps_per_epoch), desc=f"Epoch {epoch}", leave=False):
+            points = _sample_points(edge_cdf, conf)
+            with torch.no_grad():
+                target = conf.teacher(points)
+
+            loss = torch.nn.functional.mse_loss(conf.student(points), target)
+            loss.backward()
+            conf.optimizer.step()
+            conf.optimizer.zero_grad(set_to_none=True)
+
+            conf.tracker.track(loss.item(), name="distillation_loss")
+
+        if epoch % conf.checkpoint_interval == 0 or epoch == conf.num_epochs:
+            # The student is saved as the coarse model of a training checkpoint
+            save_checkpoint(
+                conf.checkpoint_dir,
+                epoch,
+                conf.tracker.hash,
+                conf.model_config,
+                conf.student,
+                conf.optimizer,
+            )
+
+    report = _compare(conf)
+    for name, value in report.items():
+        conf.tracker.track(value, name=name)
+    return report
+
+
+@torch.no_grad()
+def _get_edge_cdf(conf: DistillationConfig) -> torch.Tensor:
+    """Get the cumulative distribution of the gradient magnitude of the teacher over a grid.
+
+    Args:
+        conf (DistillationConfig): The distillation configuration.
+
+    Returns:
+        torch.Tensor: shape (R * R * R,). Cumulative sum of the gradient magnitude at the voxels of
+        a grid of resolution R = conf.edge_resolution, flattened in (x, y, z) order.
+
+    """
+    resolution = conf.edge_resolution
+    axis = torch.linspace(-1, 1, resolution, device=conf.device)
+    coords = torch.stack(torch.meshgrid(axis, axis, axis, indexing="ij"), dim=-1).view(-1, 3)
+    volume = torch.cat([conf.teacher(chunk) for chunk in coords.split(conf.eval_chunk_size)])
+    volume = volume.view(resolution, resolution, resolution)
+
+    magnitude = torch.sqrt(sum(gradient**2 for gradient in torch.gradient(volume)))
+    # Keep every voxel reachable, which also avoids an all-zero distribution
+    magnitude = magnitude.view(-1) + torch.finfo(magnitude.dtype).tiny
+    return torch.cumsum(magnitude, dim=0)
+
+
+def _sample_points(edge_cdf: torch.Tensor, conf: DistillationConfig) -> torch.Tensor:
+    """Draw a batch of points, a fraction of them in proportion to the gradient of the teacher.
+
+    Args:
+        edge_cdf (torch.Tensor): shape (R * R * R,). Output of _get_edge_cdf.
+        conf (DistillationConfig): The distillation configuration.
+
+    Returns:
+        torch.Tensor: shape (batch_size, 3). Points in [-1, 1].
+
+    """
+    resolution = conf.edge_resolution
+    n_edge_points = int(conf.batch_size * conf.edge_fraction)
+
+    # Inverse transform sampling, since torch.multinomial is limited to 2^24 categories
+    x = torch.rand(n_edge_points, device=conf.device) * edge_cdf[-1]
+    voxels = torch.searchsorted(edge_cdf, x).clamp_max(edge_cdf.shape[0] - 1)
+    voxels = torch.stack(
+        (voxels // resolution**2, voxels // resolution % resolution, voxels % resolution),
+        dim=-1,
+    )
+
+    # Jitter the points uniformly within their voxels
+    jitter = torch.rand(n_edge_points, 3, device=conf.device) - 0.5
+    edge_points = -1 + (voxels + jitter) * 2 / (resolution - 1)
+    uniform_points = torch.rand(conf.batch_size - n_edge_points, 3, device=conf.device) * 2 - 1
+    return torch.cat((edge_points.clamp(-1, 1), uniform_points))
+
+
+@torch.no_grad()
+def _compare(conf: DistillationConfig) -> dict[str, float]:
+    """Generate CT images with the teacher and the student, and compare their speed and HU values.
+
+    Args:
+        conf (DistillationConfig): The distillation configuration.
+
+    Returns:
+        dict[str, float]: The time taken to generate each image in seconds, the speed-up of the
+        student, and the mean and maximum absolute HU error of the student. The mean error is also
+        given over the edges, the 10% of voxels with the largest gradient magnitude in the image of
+        the teacher.
+
+    """
+    images = {}
+    seconds = {}
+    for name, model in (("teacher", conf.teacher), ("student", conf.student)):
+        start = time.perf_counter()
+        images[name] = run_inference(
+            model,
+            conf.eval_image_size,
+            conf.eval_chunk_size,
+            conf.attenuation_scaling_factor,
+            conf.device,
+        )
+        seconds[name] = time.perf_counter() - start
+
+    error = (images["student"] - images["teacher"]).abs().reshape(-1)
+    magnitude = torch.sqrt(sum(gradient**2 for gradient in torch.gradient(images["teacher"])))
+    magnitude = magnitude.reshape(-1)
+    edges = magnitude >= magnitude.kthvalue(int(0.9 * magnitude.shape[0])).values
+
+    return {
+        "teacher_seconds": seconds["teacher"],
+        "student_seconds": seconds["student"],
+        "speedup": seconds["teacher"] / seconds["student"],
+        "hu_mae": error.mean().item(),
+        "hu_mae_edges": error[edges].mean().item(),
+        "hu_max_error": error.max().item(),
+    }
@@ -0,0 +1,241 @@
+"""Samplers that decide which rays make up each training batch."""
+
+from collections.abc import Iterator, Sized
+
+import torch
+from torch.utils.data import Sampler
+
+
+class LossWeightedSampler:
+    """Sampler that draws rays in proportion to a running estimate of their loss.
+
+    The rays are grouped into tiles of tile_size consecutive rays, i.e. segments of detector rows,
+    and a running estimate of the loss of each tile is kept. Each batch is drawn by first drawing
+    tiles with probability proportional to their estimated loss, mixed with a uniform distribution
+    so that every ray keeps being visited, and then drawing a ray uniformly within each tile. Tiles
+    that have not been visited yet are treated as having the highest estimated loss.
+
+    To keep the loss an unbiased estimate of the loss under uniform sampling, each ray is given the
+    importance weight 1 / (N * p), where N is the number of rays and p is the probability of
+    drawing the ray. The weights of the last drawn batch are available as the weights attribute,
+    and the estimates are updated from the per-ray losses of that batch by calling update.
+    """
+
+    @torch.no_grad()
+    def __init__(
+        self,
+        num_rays: int,
+        tile_size: int = 64,
+        momentum: float = 0.1,
+        uniform_mix: float = 0.1,
+        device: torch.device | str = "cpu",
+    ) -> None:
+        """Initialize the LossWeightedSampler.
+
+        Args:
+            num_rays (int): Number of rays in the dataset.
+            tile_size (int, optional): Number of consecutive rays sharing a loss estimate. Use 1 to
+                keep an estimate per ray. Defaults to 64.
+            momentum (float, optional): Weight of a new loss observation in the running estimate
+                of a tile. Defaults to 0.1.
+            uniform_mix (float, optional): Fraction of the sampling distribution that is uniform.
+                Bounds the importance weights by 1 / uniform_mix. Defaults to 0.1.
+            device (torch.device | str, optional): Device to keep the estimates and draw indices on.
+                Should be the device of the ray buffer. Defaults to cpu.
+
+        """
+        self.num_rays = num_rays
+        self.tile_size = tile_size
+        self.momentum = momentum
+        self.uniform_mix = uniform_mix
+        self.device = torch.device(device)
+
+        num_tiles = -(-num_rays // tile_size)
+        self.tile_losses = torch.zeros(num_tiles, device=self.device)
+        self.visited = torch.zeros(num_tiles, dtype=torch.bool, device=self.device)
+        self.tile_lengths = torch.full(
+            (num_tiles,),
+            tile_size,
+            dtype=torch.long,
+            device=self.device,
+        )
+        self.tile_lengths[-1] = num_rays - (num_tiles - 1) * tile_size
+
+        self.indices = None
+        self.weights = None
+
+    @torch.no_grad()
+    def sample(self, batch_size: int) -> torch.Tensor:
+        """Draw a batch of ray indices and store their importance weights.
+
+        Args:
+            batch_size (int): Number of rays to draw.
+
+        Returns:
+            torch.Tensor: shape (batch_size,). Indices of the drawn rays.
+
+        """
+        # Unvisited tiles get the highest estimate so they are explored early
+        if self.visited.any():
+            highest_loss = self.tile_losses[self.visited].max()
+        else:
+            highest_loss = torch.ones((), device=self.device)
+        estimates = torch.where(self.visited, self.tile_losses, highest_loss)
+
+        # Total probability of each tile, scaled by tile length so the uniform part is per ray
+        tile_probs = estimates / estimates.sum().clamp_min(torch.finfo(estimates.dtype).tiny)
+        uniform_probs = self.tile_lengths / self.num_rays
+        tile_probs = (1 - self.uniform_mix) * tile_probs + self.uniform_mix * uniform_probs
+
+        # Inverse transform sampling, since torch.multinomial is limited to 2^24 categories
+        cdf = torch.cumsum(tile_probs, dim=0)
+        x = torch.rand(batch_size, device=self.device) * cdf[-1]
+        tiles = torch.searchsorted(cdf, x).clamp_max(cdf.shape[0] - 1)
+        tile_lengths = self.tile_lengths[tiles]
+        offsets = (torch.rand(batch_size, device=self.device) * tile_lengths).long()
+        offsets = torch.minimum(offsets, tile_lengths.long() - 1)
+
+        self.indices = tiles * self.tile_size + offsets
+        ray_probs = tile_probs[tiles] / cdf[-1] / tile_lengths
+        self.weights = 1 / (self.num_rays * ray_probs)
+        return self.indices
+
+    @torch.no_grad()
+    def update(self, ray_losses: torch.Tensor) -> None:
+        """Update the loss estimates of the tiles in the last drawn batch.
+
+        Args:
+            ray_losses (torch.Tensor): shape (batch_size,). Unweighted loss of each ray in the last
+                drawn batch.
+
+        """
+        tiles = torch.div(self.indices, self.tile_size, rounding_mode="floor")
+        tiles, inverse = torch.unique(tiles, return_inverse=True)
+        ray_losses = ray_losses.to(self.device, dtype=self.tile_losses.dtype)
+
+        # Average the losses of rays sharing a tile before updating the running estimate
+        loss_sums = torch.zeros(tiles.shape[0], device=self.device).index_add_(
+            0,
+            inverse,
+            ray_losses,
+        )
+        counts = torch.zeros(tiles.shape[0], device=self.device).index_add_(
+            0,
+            inverse,
+            torch.ones_like(ray_losses),
+        )
+        observed = loss_sums / counts
+
+        previous = self.tile_losses[tiles]
+        self.tile_losses[tiles] = torch.where(
+            self.visited[tiles],
+            (1 - self.momentum) * previous + self.momentum * observed,
+            observed,
+        )
+        self.visited[tiles] = True
+
+
+class BlockShuffleSampler(Sampler[int]):
+    """Sampler that shuffles contiguous blocks of rays, and then rays within windows of blocks.
+
+    The rays are grouped into blocks of block_size consecutive rays, i.e. segments of detector rows,
+    and the order of the blocks is shuffled every epoch. The stream of blocks is then cut into
+    windows of window_blocks consecutive blocks, and the rays are shuffled within each window.
+    Batches therefore mix rays from window_blocks random places in the projection stack, while every
+    read stays within a few contiguous regions of memory. This is far more cache friendly than a
+    full permutation, especially for memory-mapped datasets, and needs no permutation of all rays.
+
+    The sampler can be passed to a DataLoader, or to a RayBatchIterator, which draws its batches by
+    calling sample.
+    """
+
+    def __init__(
+        self,
+        data_source: Sized,
+        block_size: int = 256,
+        window_blocks: int = 64,
+        device: torch.device | str = "cpu",
+    ) -> None:
+        """Initialize the BlockShuffleSampler.
+
+        Args:
+            data_source (Sized): The dataset to sample from. Its length is read at the start of
+                every epoch.
+            block_size (int, optional): Number of consecutive rays in a block. Defaults to 256.
+            window_blocks (int, optional): Number of blocks whose rays are shuffled together.
+                Defaults to 64.
+            device (torch.device | str, optional): Device to draw indices on. Should be the device
+                of the ray buffer when used with a RayBatchIterator. Defaults to cpu.
+
+        """
+        self.data_source = data_source
+        self.block_size = block_size
+        self.window_blocks = window_blocks
+        self.device = torch.device(device)
+
+        self._windows = None
+        self._pending = torch.empty(0, dtype=torch.long, device=self.device)
+
+    def __iter__(self) -> Iterator[int]:
+        """Iterate over the indices of one epoch.
+
+        Yields:
+            int: Index of a ray.
+
+        """
+        for window in self._epoch_windows():
+            yield from window.tolist()
+
+    def __len__(self) -> int:
+        """Get the number of indices in an epoch.
+
+        Returns:
+            int: Number of rays in the dataset.
+
+        """
+        return len(self.data_source)
+
+    @torch.no_grad()
+    def sample(self, batch_size: int) -> torch.Tensor:
+        """Draw the next batch of indices, continuing into a new epoch when one runs out.
+
+        Args:
+            batch_size (int): Number of indices to draw.
+
+        Returns:
+            torch.Tensor: shape (batch_size,). Indices of the drawn rays.
+
+        """
+        pending = [self._pending]
+        num_pending = len(self._pending)
+        while num_pending < batch_size:
+            window = next(self._windows, None) if self._windows is not None else None
+            if window is None:
+                self._windows = self._epoch_windows()
+                continue
+            pending.append(window)
+            num_pending += len(window)
+
+        pending = torch.cat(pending)
+        self._pending = pending[batch_size:]
+        return pending[:batch_size]
+
+    @torch.no_grad()
+    def _epoch_windows(self) -> Iterator[torch.Tensor]:
+        """Iterate over the shuffled windows of one epoch.
+
+        Yields:
+            torch.Tensor: shape (window_blocks * block_size,). Shuffled indices of the rays in a
+            window. The window holding the last, partial block is shorter.
+
+        """
+        num_rays = len(self.data_source)
+        num_blocks = -(-num_rays // self.block_size)
+        block_order = torch.randperm(num_blocks, device=self.device)
+        offsets = torch.arange(self.block_size, device=self.device)
+
+        for blocks in block_order.split(self.window_blocks):
+            indices = (blocks.unsqueeze(1) * self.block_size + offsets).reshape(-1)
+            if blocks.max() == num_blocks - 1:
+                indices = indices[indices < num_rays]
+            yield indices[torch.randperm(len(indices), device=self.device)]
@@ -1,5 +1,7 @@
 """Contains functions for training the model."""
 
+import copy
+from dataclasses import dataclass
 from pathlib import Path
 
 import numpy as np
@@ -8,12 +10,25 @@ import SimpleITK as sitk
 import torch
 from aim import Figure
 from torch import GradScaler, autocast
+from torch.func import functional_call, vmap
 from tqdm import tqdm
 
 from ctnerf.image_creation.ct_creation import run_inference, tensor_to_sitk
 from ctnerf.model import XRayModel
-from ctnerf.rays import beer_lambert_law, get_coarse_samples, get_fine_samples
-from ctnerf.setup.config import TrainingConfig, get_training_config
+from ctnerf.occupancy_grid import OccupancyGrid
+from ctnerf.rays import (
+    beer_lambert_law,
+    get_coarse_samples,
+    get_fine_samples,
+    get_packed_samples,
+    packed_beer_lambert_law,
+)
+from ctnerf.setup.config import (
+    SweepMember,
+    TrainingConfig,
+    get_sweep_config,
+    get_training_config,
+)
 
 
 def train(config_path: Path) -> None:
@@ -21,19 +36,13 @@ def train(config_path: Path) -> None:
     conf = get_training_config(config_path)
 
     for epoch in range(1, 1000):
-        for start_positions, heading_vectors, intensities, ray_bounds in tqdm(conf.dataloader):
-            start_positions = start_positions.to(conf.device, dtype=conf.dtype, non_blocking=True)
-            heading_vectors = heading_vectors.to(conf.device, dtype=conf.dtype, non_blocking=True)
-            intensities = intensities.to(conf.device, dtype=conf.dtype, non_blocking=True)
-            ray_bounds = ray_bounds.to(conf.device, dtype=conf.dtype, non_blocking=True)
+        if conf.resolution_schedule is not None:
+            binning = _get_binning(conf.start_epoch + epoch, conf.resolution_schedule)
+            conf.dataloader.dataset.set_binning(binning)
+            conf.tracker.track(binning, name="binning", step=conf.start_epoch + epoch)
 
-            coarse_loss, fine_loss = _step(
-                start_positions,
-                heading_vectors,
-                intensities,
-                ray_bounds,
-                conf,
-            )
+        for batch in tqdm(conf.dataloader):
+            coarse_loss, fine_loss = train_batch(batch, conf)
 
             conf.tracker.track(coarse_loss.item(), name="coarse_loss")
             if fine_loss is not None:
@@ -55,16 +64,271 @@ def train(config_path: Path) -> None:
             )
 
         if epoch % conf.checkpoint_interval == 0:
-            checkpoint = {
-                "coarse_model_state_dict": conf.coarse_model.state_dict(),
-                "coarse_optimizer_state_dict": conf.coarse_optimizer.state_dict(),
-                "epoch": conf.start_epoch + epoch,
-                "run_hash": conf.tracker.hash,
-            }
-            if conf.fine_model is not None:
-                checkpoint["fine_model_state_dict"] = conf.fine_model.state_dict()
-                checkpoint["fine_optimizer_state_dict"] = conf.fine_optimizer.state_dict()
-            torch.save(checkpoint, conf.checkpoint_dir / f"{conf.start_epoch + epoch}.pt")
+            save_checkpoint(
+                conf.checkpoint_dir,
+                conf.start_epoch + epoch,
+                conf.tracker.hash,
+                conf.model_config,
+                conf.coarse_model,
+                conf.coarse_optimizer,
+                conf.fine_model,
+                conf.fine_optimizer,
+                conf.occupancy_grid,
+            )
+
+
+def train_batch(
+    batch: tuple[torch.Tensor, ...],
+    conf: TrainingConfig,
+) -> tuple[torch.Tensor, torch.Tensor | None]:
+    """Take an optimisation step of the models on a batch of rays from the dataloader.
+
+    Args:
+        batch (tuple[torch.Tensor, ...]): A batch of rays from conf.dataloader.
+        conf (TrainingConfig): The training configuration.
+
+    Returns:
+        tuple[torch.Tensor, torch.Tensor | None]: The losses of the coarse and fine models. The fine
+        loss is None when there is no fine model.
+
+    """
+    start_positions, heading_vectors, intensities, ray_bounds = _batch_to_device(batch, conf)
+
+    if conf.ray_sampler is not None:
+        weights = conf.ray_sampler.weights.to(conf.device, dtype=conf.dtype)
+    else:
+        weights = None
+
+    if conf.air_constraint_samples is not None:
+        air_points = conf.dataloader.dataset.sample_air_points(
+            conf.air_constraint_samples,
+            conf.device,
+        ).to(dtype=conf.dtype)
+    else:
+        air_points = None
+
+    coarse_loss, fine_loss, ray_losses = _step(
+        start_positions,
+        heading_vectors,
+        intensities,
+        ray_bounds,
+        weights,
+        air_points,
+        conf,
+    )
+
+    if conf.ray_sampler is not None:
+        conf.ray_sampler.update(ray_losses)
+
+    if conf.occupancy_grid is not None and conf.occupancy_grid.step(conf.coarse_model):
+        conf.tracker.track(conf.occupancy_grid.occupied_fraction(), name="occupied_fraction")
+
+    return coarse_loss, fine_loss
+
+
+def save_checkpoint(
+    checkpoint_dir: Path,
+    epoch: int,
+    run_hash: str,
+    model_config: dict,
+    coarse_model: torch.nn.Module,
+    coarse_optimizer: torch.optim.Optimizer,
+    fine_model: torch.nn.Module | None = None,
+    fine_optimizer: torch.optim.Optimizer | None = None,
+    occupancy_grid: OccupancyGrid | None = None,
+) -> None:
+    """Save the models and optimizers of an epoch to <checkpoint_dir>/<epoch>.pt.
+
+    Every checkpoint is written by this function, in the format read by load_checkpoint.
+
+    Args:
+        checkpoint_dir (Path): Directory to save the checkpoint to.
+        epoch (int): The epoch of the checkpoint.
+        run_hash (str): Hash of the aim run, to continue it when resuming.
+        model_config (dict): Model section of the configuration, used to rebuild the models.
+        coarse_model (torch.nn.Module): The coarse model.
+        coarse_optimizer (torch.optim.Optimizer): The optimizer of the coarse model.
+        fine_model (torch.nn.Module | None, optional): The fine model. Defaults to None.
+        fine_optimizer (torch.optim.Optimizer | None, optional): The optimizer of the fine model.
+            Defaults to None.
+        occupancy_grid (OccupancyGrid | None, optional): The occupancy grid. Defaults to None.
+
+    """
+    checkpoint = {
+        "coarse_model_state_dict": coarse_model.state_dict(),
+        "coarse_optimizer_state_dict": coarse_optimizer.state_dict(),
+        "epoch": epoch,
+        "run_hash": run_hash,
+        "model_config": model_config,
+    }
+    if fine_model is not None:
+        checkpoint["fine_model_state_dict"] = fine_model.state_dict()
+        checkpoint["fine_optimizer_state_dict"] = fine_optimizer.state_dict()
+    if occupancy_grid is not None:
+        checkpoint["occupancy_grid_state_dict"] = occupancy_grid.state_dict()
+    torch.save(checkpoint, checkpoint_dir / f"{epoch}.pt")
+
+
+def train_sweep(config_path: Path) -> None:
+    """Train the members of a hyperparameter sweep in one process, see get_sweep_config.
+
+    Every batch of rays is used by all members. Members with the same architecture are stacked and
+    trained together, with one call of the model vectorised over the members by torch.func.vmap.
+    """
+    sweep = get_sweep_config(config_path)
+    conf = sweep.training
+    stacks = _get_member_stacks(sweep.members)
+
+    for epoch in range(1, 1000):
+        if conf.resolution_schedule is not None:
+            binning = _get_binning(conf.start_epoch + epoch, conf.resolution_schedule)
+            conf.dataloader.dataset.set_binning(binning)
+            conf.tracker.track(binning, name="binning", step=conf.start_epoch + epoch)
+
+        for batch in tqdm(conf.dataloader):
+            start_positions, heading_vectors, intensities, ray_bounds = _batch_to_device(
+                batch,
+                conf,
+            )
+
+            if conf.air_constraint_samples is not None:
+                air_points = conf.dataloader.dataset.sample_air_points(
+                    conf.air_constraint_samples,
+                    conf.device,
+                ).to(dtype=conf.dtype)
+            else:
+                air_points = None
+
+            for stack in stacks:
+                losses = _sweep_step(
+                    stack,
+                    start_positions,
+                    heading_vectors,
+                    intensities,
+                    ray_bounds,
+                    air_points,
+                    conf,
+                )
+                for member, loss in zip(stack.members, losses.tolist(), strict=True):
+                    conf.tracker.track(loss, name="coarse_loss", context={"member": member.name})
+
+        for stack in stacks:
+            for index, member in enumerate(stack.members):
+                _eval(
+                    member.model,
+                    conf.start_epoch + epoch,
+                    "coarse",
+                    conf,
+                    context={"member": member.name},
+                )
+
+                if epoch % conf.checkpoint_interval == 0:
+                    model, optimizer = _unstack_member(stack, index)
+                    save_checkpoint(
+                        member.checkpoint_dir,
+                        conf.start_epoch + epoch,
+                        conf.tracker.hash,
+                        member.model_config,
+                        model,
+                        optimizer,
+                    )
+
+
+@dataclass
+class _SweepStack:
+    """Sweep members with the same architecture, trained together.
+
+    The parameters of the members are stacked along a new first dimension, and these stacked
+    tensors are the leaves of the vectorised forward pass. The parameters of each member's model
+    are views into them, so the optimizer of each member updates the stacked parameters in place.
+    Each member has its own gradient scaler, so a step skipped for infinite gradients in one member
+    does not skip the step or lower the loss scale of the others.
+    """
+
+    members: list[SweepMember]
+    parameters: dict[str, torch.Tensor]  # stacked parameters, shape (M, ...)
+    optimizers: list[torch.optim.Optimizer]  # optimizer of each member
+    scalers: list[GradScaler]  # gradient scaler of each member
+
+
+def _get_member_stacks(members: list[SweepMember]) -> list[_SweepStack]:
+    """Group the members of a sweep by the shapes of their parameters, and stack each group."""
+    groups: dict[tuple, list[SweepMember]] = {}
+    for member in members:
+        shapes = tuple((name, p.shape) for name, p in member.model.named_parameters())
+        groups.setdefault(shapes, []).append(member)
+
+    stacks = []
+    for group in groups.values():
+        parameters = {}
+        for name, _ in group[0].model.named_parameters():
+            stacked = torch.stack([member.model.get_parameter(name).detach() for member in group])
+            module_name, _, parameter_name = name.rpartition(".")
+            for member, values in zip(group, stacked, strict=True):
+                module = member.model.get_submodule(module_name)
+                setattr(module, parameter_name, torch.nn.Parameter(values))
+            parameters[name] = stacked.requires_grad_()
+        optimizers = [
+            torch.optim.Adam(member.model.parameters(), fused=True, lr=member.lr)
+            for member in group
+        ]
+        stacks.append(_SweepStack(group, parameters, optimizers, [GradScaler() for _ in group]))
+    return stacks
+
+
+def _unstack_member(stack: _SweepStack, index: int) -> tuple[XRayModel, torch.optim.Optimizer]:
+    """Copy the model of a sweep member out of its stack, with an optimizer holding its state."""
+    member = stack.members[index]
+    model = copy.deepcopy(member.model)
+    optimizer = torch.optim.Adam(model.parameters(), fused=True, lr=member.lr)
+    optimizer.load_state_dict(stack.optimizers[index].state_dict())
+    return model, optimizer
+
+
+def _get_binning(epoch: int, resolution_schedule: dict[int, int]) -> int:
+    """Get the binning factor to train at in an epoch.
+
+    Training starts at the largest binning factor of the schedule and moves to smaller ones, ending
+    at full resolution once every level has been trained for its number of epochs.
+
+    Args:
+        epoch (int): The epoch, starting from 1.
+        resolution_schedule (dict[int, int]): Number of epochs to train at each binning factor.
+
+    Returns:
+        int: The binning factor.
+
+    """
+    last_epoch = 0
+    for binning in sorted(resolution_schedule, reverse=True):
+        last_epoch += resolution_schedule[binning]
+        if epoch <= last_epoch:
+            return binning
+    return 1
+
+
+def _batch_to_device(
+    batch: tuple[torch.Tensor, ...],
+    conf: TrainingConfig,
+) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor]:
+    """Move a batch to the training device.
+
+    If the dataset is in compact mode, the batch consists of ray indices and intensities, and the
+    geometry of the rays is rebuilt on the training device.
+    """
+    dataset = conf.dataloader.dataset
+    if dataset.compact:
+        indices, intensities = batch
+        indices = indices.to(conf.device, non_blocking=True)
+        start_positions, heading_vectors, ray_bounds = dataset.get_ray_geometry(indices)
+    else:
+        start_positions, heading_vectors, intensities, ray_bounds = batch
+
+    start_positions = start_positions.to(conf.device, dtype=conf.dtype, non_blocking=True)
+    heading_vectors = heading_vectors.to(conf.device, dtype=conf.dtype, non_blocking=True)
+    intensities = intensities.to(conf.device, dtype=conf.dtype, non_blocking=True)
+    ray_bounds = ray_bounds.to(conf.device, dtype=conf.dtype, non_blocking=True)
+    return start_positions, heading_vectors, intensities, ray_bounds
 
 
 @torch.compile(mode="max-autotune", disable=False)
@@ -73,6 +337,8 @@ def _step(
     heading_vectors: torch.Tensor,
     intensities: torch.Tensor,
     ray_bounds: torch.Tensor,
+    weights: torch.Tensor | None,
+    air_points: torch.Tensor | None,
     conf: TrainingConfig,
 ) -> None:
     (
@@ -80,11 +346,14 @@ def _step(
         coarse_sample_ts,
         coarse_attenuation_coeff_pred,
         coarse_sampling_distances,
+        ray_losses,
     ) = _coarse_step(
         start_positions,
         heading_vectors,
         intensities,
         ray_bounds,
+        weights,
+        air_points,
         conf,
     )
 
@@ -97,12 +366,14 @@ def _step(
             coarse_sample_ts,
             coarse_attenuation_coeff_pred,
             coarse_sampling_distances,
+            weights,
+            air_points,
             conf,
         )
     else:
         fine_loss = None
 
-    return coarse_loss, fine_loss
+    return coarse_loss, fine_loss, ray_losses
 
 
 @torch.compile(mode="max-autotune", disable=True)
@@ -111,21 +382,31 @@ def _coarse_step(
     heading_vectors: torch.Tensor,
     intensities: torch.Tensor,
     ray_bounds: torch.Tensor,
+    weights: torch.Tensor | None,
+    air_points: torch.Tensor | None,
     conf: TrainingConfig,
-) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
-    coarse_sample_ts, coarse_samples, coarse_sampling_distances = get_coarse_samples(
-        start_positions,
-        heading_vectors,
-        conf.n_coarse_samples,
-        conf.batch_size,
-        conf.device,
-        ray_bounds,
-        conf.plateau_ratio,
-        conf.coarse_sampling_function,
-    )
+) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor]:
+    if conf.sample_step_size is not None:
+        coarse_sample_ts, coarse_samples, coarse_sampling_distances, ray_indices = (
+            get_packed_samples(start_positions, heading_vectors, ray_bounds, conf.sample_step_size)
+        )
+    else:
+        coarse_sample_ts, coarse_samples, coarse_sampling_distances = get_coarse_samples(
+            start_positions,
+            heading_vectors,
+            conf.n_coarse_samples,
+            conf.batch_size,
+            conf.device,
+            ray_bounds,
+            conf.plateau_ratio,
+            conf.coarse_sampling_function,
+        )
+        ray_indices = None
 
-    loss, attenuation_coeff_pred = _forward_backward(
+    loss, attenuation_coeff_pred, ray_losses = _forward_backward(
         intensities,
+        weights,
+        air_points,
         coarse_samples,
         coarse_sampling_distances,
         conf.coarse_model,
@@ -133,6 +414,7 @@ def _coarse_step(
         conf.coarse_scaler,
         conf.loss_fn,
         conf,
+        ray_indices,
     )
 
     return (
@@ -140,6 +422,7 @@ def _coarse_step(
         coarse_sample_ts.detach(),
         attenuation_coeff_pred.detach(),
         coarse_sampling_distances.detach(),
+        ray_losses,
     )
 
 
@@ -152,6 +435,8 @@ def _fine_step(
     coarse_sample_ts: torch.Tensor,
     attenuation_coeff_pred: torch.Tensor,
     coarse_sampling_distances: torch.Tensor,
+    weights: torch.Tensor | None,
+    air_points: torch.Tensor | None,
     conf: TrainingConfig,
 ) -> None:
     fine_samples, fine_sampling_distances = get_fine_samples(
@@ -164,8 +449,10 @@ def _fine_step(
         conf.n_fine_samples,
     )
 
-    loss, _ = _forward_backward(
+    loss, _, _ = _forward_backward(
         intensities,
+        weights,
+        air_points,
         fine_samples,
         fine_sampling_distances,
         conf.fine_model,
@@ -180,6 +467,8 @@ def _fine_step(
 
 def _forward_backward(
     intensities: torch.Tensor,
+    weights: torch.Tensor | None,
+    air_points: torch.Tensor | None,
     samples: torch.Tensor,
     sampling_distances: torch.Tensor,
     model: XRayModel,
@@ -187,22 +476,51 @@ def _forward_backward(
     scaler: GradScaler,
     loss_fn: torch.nn.Module,
     conf: TrainingConfig,
-) -> tuple[torch.Tensor, torch.Tensor]:
+    ray_indices: torch.Tensor | None = None,
+) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
     model.train()
 
     with autocast(device_type="cuda", enabled=conf.use_amp):
-        attenuation_coeff_pred = model(samples)
-        attenuation_coeff_pred = attenuation_coeff_pred.reshape(conf.batch_size, -1)
-        intensity_pred = beer_lambert_law(
-            attenuation_coeff_pred,
-            sampling_distances,
-            conf.s,
-            conf.k,
-            conf.slice_size_cm,
-        )
+        if conf.occupancy_grid is not None:
+            # Samples in empty space are not passed through the model
+            attenuation_coeff_pred = conf.occupancy_grid.query(model, samples)
+        else:
+            attenuation_coeff_pred = model(samples)
+        if ray_indices is not None:
+            # Packed samples, see get_packed_samples
+            attenuation_coeff_pred = attenuation_coeff_pred.reshape(-1)
+            intensity_pred = packed_beer_lambert_law(
+                attenuation_coeff_pred,
+                sampling_distances,
+                ray_indices,
+                intensities.shape[0],
+                conf.s,
+                conf.k,
+                conf.slice_size_cm,
+            )
+        else:
+            attenuation_coeff_pred = attenuation_coeff_pred.reshape(conf.batch_size, -1)
+            intensity_pred = beer_lambert_law(
+                attenuation_coeff_pred,
+                sampling_distances,
+                conf.s,
+                conf.k,
+                conf.slice_size_cm,
+            )
         loss = loss_fn(intensity_pred, intensities)
+        ray_losses = loss.detach()
+        if weights is not None:
+            loss = loss * weights  # importance weights of the sampled rays
         loss = torch.sum(loss)
 
+        if air_points is not None:
+            # Points on rays through air only are constrained to zero attenuation
+            air_attenuation_coeff_pred = model(air_points)
+            loss = loss + conf.air_constraint_weight * torch.sum(air_attenuation_coeff_pred**2)
+
+        if conf.tv_weight is not None:
+            loss = loss + conf.tv_weight * model.total_variation(conf.tv_samples)
+
     if conf.use_amp:
         scaler.scale(loss).backward()
         scaler.step(optimizer)
@@ -213,7 +531,102 @@ def _forward_backward(
 
     optimizer.zero_grad(set_to_none=True)
 
-    return loss, attenuation_coeff_pred
+    return loss, attenuation_coeff_pred, ray_losses
+
+
+def _sweep_step(
+    stack: _SweepStack,
+    start_positions: torch.Tensor,
+    heading_vectors: torch.Tensor,
+    intensities: torch.Tensor,
+    ray_bounds: torch.Tensor,
+    air_points: torch.Tensor | None,
+    conf: TrainingConfig,
+) -> torch.Tensor:
+    """Take an optimisation step for a stack of sweep members with the same architecture.
+
+    The losses of all members are computed in one call of the model with the stacked parameters,
+    vectorised over the members. The gradients of the stacked parameters are passed as views to
+    the parameters of the members, which the optimizer of each member updates in place. Members
+    with the same plateau ratio share their samples.
+
+    Returns:
+        torch.Tensor: shape (M,). Loss of each member.
+
+    """
+    samples = {}
+    for member in stack.members:
+        if member.plateau_ratio not in samples:
+            _, coarse_samples, coarse_sampling_distances = get_coarse_samples(
+                start_positions,
+                heading_vectors,
+                conf.n_coarse_samples,
+                conf.batch_size,
+                conf.device,
+                ray_bounds,
+                member.plateau_ratio,
+                conf.coarse_sampling_function,
+            )
+            samples[member.plateau_ratio] = (coarse_samples, coarse_sampling_distances)
+    member_samples = torch.stack([samples[member.plateau_ratio][0] for member in stack.members])
+    member_distances = torch.stack([samples[member.plateau_ratio][1] for member in stack.members])
+
+    # The first model is only used for its structure, its parameters are replaced
+    model = stack.members[0].model
+
+    def member_loss(
+        parameters: dict[str, torch.Tensor],
+        samples: torch.Tensor,
+        sampling_distances: torch.Tensor,
+    ) -> torch.Tensor:
+        attenuation_coeff_pred = functional_call(model, parameters, (samples,))
+        attenuation_coeff_pred = attenuation_coeff_pred.reshape(conf.batch_size, -1)
+        intensity_pred = beer_lambert_law(
+            attenuation_coeff_pred,
+            sampling_distances,
+            conf.s,
+            conf.k,
+            conf.slice_size_cm,
+        )
+        loss = torch.sum(conf.loss_fn(intensity_pred, intensities))
+
+        if air_points is not None:
+            air_attenuation_coeff_pred = functional_call(model, parameters, (air_points,))
+            loss = loss + conf.air_constraint_weight * torch.sum(air_attenuation_coeff_pred**2)
+        return loss
+
+    with autocast(device_type="cuda", enabled=conf.use_amp):
+        losses = vmap(member_loss)(stack.parameters, member_samples, member_distances)
+
+    _sweep_backward_step(stack, losses, use_amp=conf.use_amp)
+
+    return losses.detach()
+
+
+def _sweep_backward_step(stack: _SweepStack, losses: torch.Tensor, *, use_amp: bool) -> None:
+    """Backpropagate the losses of a stack of sweep members, and step the optimizer of each."""
+    # The loss of a member only depends on its own parameters, so the summed loss gives each
+    # member its own gradients, scaled by the scaler of the member
+    if use_amp:
+        scaled_losses = [
+            scaler.scale(loss) for scaler, loss in zip(stack.scalers, losses, strict=True)
+        ]
+        torch.stack(scaled_losses).sum().backward()
+    else:
+        losses.sum().backward()
+    for name, stacked in stack.parameters.items():
+        for member, grad in zip(stack.members, stacked.grad, strict=True):
+            member.model.get_parameter(name).grad = grad
+    for optimizer, scaler in zip(stack.optimizers, stack.scalers, strict=True):
+        if use_amp:
+            scaler.step(optimizer)
+            scaler.update()
+        else:
+            optimizer.step()
+        optimizer.zero_grad(set_to_none=True)
+
+    for stacked in stack.parameters.values():
+        stacked.grad = None
 
 
 @torch.no_grad()
@@ -222,8 +635,10 @@ def _eval(
     epoch: int,
     tag: str,
     conf: TrainingConfig,
+    context: dict | None = None,
 ) -> None:
     model.eval()
+    context = {"model": tag} | (context or {})
 
     if conf.source_ct_path is not None:
         generated_ct = run_inference(
@@ -232,6 +647,7 @@ def _eval(
             4096 * 64,
             conf.attenuation_scaling_factor,
             conf.device,
+            occupancy_grid=conf.occupancy_grid,
         )
         ct_direction = [1.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 1.0]
         generated_ct = tensor_to_sitk(generated_ct, direction=ct_direction)
@@ -241,25 +657,27 @@ def _eval(
         source_ct_image = sitk.GetArrayFromImage(source_ct_image)
 
         mae = np.mean(np.abs(generated_ct - source_ct_image))
-        conf.tracker.track(mae, name="mae", step=epoch, context={"model": tag})
+        conf.tracker.track(mae, name="mae", step=epoch, context=context)
 
         del generated_ct
         del source_ct_image
 
-    yv = torch.linspace(-1, 1, conf.ct_size[1])
-    zv = torch.linspace(-1, 1, conf.ct_size[2])
-    yv, zv = torch.meshgrid(yv, zv, indexing="xy")
-    coords = torch.stack([torch.zeros_like(yv), yv, zv], dim=-1)
-    coords = coords.reshape(-1, 3)
-    coords = coords.to(conf.device)
+    yv = torch.linspace(-1, 1, conf.ct_size[1], device=conf.device)
+    zv = torch.linspace(-1, 1, conf.ct_size[2], device=conf.device)
+    if isinstance(model, XRayModel):
+        output = model.forward_lattice(torch.zeros(1, device=conf.device), yv, zv)
+        output = output.reshape(conf.ct_size[1], conf.ct_size[2]).T
+    else:
+        yv, zv = torch.meshgrid(yv, zv, indexing="xy")
+        coords = torch.stack([torch.zeros_like(yv), yv, zv], dim=-1)
+        coords = coords.reshape(-1, 3)
 
-    output = model(coords)
-    output = output.reshape(conf.ct_size[2], conf.ct_size[1])
+        output = model(coords)
+        output = output.reshape(conf.ct_size[2], conf.ct_size[1])
 
     fig = px.imshow(output.cpu().numpy(), color_continuous_scale="gray")
-    conf.tracker.track(Figure(fig), name="cross section", step=epoch, context={"model": tag})
+    conf.tracker.track(Figure(fig), name="cross section", step=epoch, context=context)
 
     del output
-    del coords
 
     model.train()
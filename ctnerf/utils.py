@@ -1,6 +1,9 @@
 """Utility functions."""
 
+import copy
 import json
+import os
+import sys
 from pathlib import Path
 
 import numpy as np
@@ -23,6 +26,11 @@ def get_ct_dir() -> Path:
     return get_data_dir() / "ct_images"
 
 
+def get_cache_dir() -> Path:
+    """Get the path to the cache directory for processed datasets."""
+    return get_data_dir() / "cache"
+
+
 def get_model_dir() -> Path:
     """Get the path to the models directory."""
     return Path(__file__).parents[1] / "models"
@@ -48,9 +56,19 @@ def convert_arrays_to_lists(d: dict) -> dict:
     return d
 
 
+_metadata_cache: dict[Path, tuple[int, dict]] = {}
+
+# Fields that are added to the metadata from a sample X-ray image if missing from meta.json
+PROBED_METADATA_FIELDS = ("size", "spacing", "origin", "direction", "dtype", "extra_metadata")
+
+
 def get_dataset_metadata(dataset_path: Path) -> dict:
     """Read the metadata for a given dataset from the 'meta.json' file in the dataset directory.
 
+    Fields missing from meta.json are read from a sample X-ray image, and meta.json is then updated
+    with them so that later calls do not need to read any image data. The metadata is cached in
+    memory, keyed by the path and modification time of meta.json.
+
     Args:
         dataset_path (Path): The path to the dataset directory.
 
@@ -58,21 +76,61 @@ def get_dataset_metadata(dataset_path: Path) -> dict:
         dict: The metadata for the dataset.
 
     """
+    metadata_path = (dataset_path / "meta.json").resolve()
     try:
-        with (dataset_path / "meta.json").open() as f:
-            metadata = json.load(f)
+        mtime = metadata_path.stat().st_mtime_ns
     except FileNotFoundError as e:
         msg = f"Dataset not found: {dataset_path}"
         raise FileNotFoundError(msg) from e
-    for file in dataset_path.iterdir():
-        if file.suffix != ".json":
-            try:
-                xray = sitk.ReadImage(file)
-                metadata = add_xray_metadata(metadata, xray)
-                break
-            except (OSError, RuntimeError) as e:
-                print(f"Error reading {file}: {e}")  # noqa: T201
-                continue
+
+    cached = _metadata_cache.get(metadata_path)
+    if cached is not None and cached[0] == mtime:
+        return copy.deepcopy(cached[1])
+
+    with metadata_path.open() as f:
+        metadata = json.load(f)
+    if any(field not in metadata for field in PROBED_METADATA_FIELDS):
+        metadata = _probe_xray_metadata(dataset_path, metadata)
+        # Round trip through json so the metadata is the same as when read from meta.json later
+        metadata = json.loads(json.dumps(convert_arrays_to_lists(metadata)))
+        try:
+            tmp_path = metadata_path.with_suffix(f".{os.getpid()}.tmp")
+            with tmp_path.open("w") as f:
+                json.dump(metadata, f)
+            tmp_path.replace(metadata_path)
+            mtime = metadata_path.stat().st_mtime_ns
+        except OSError as e:
+            print(f"Could not update {metadata_path}: {e}")  # noqa: T201
+
+    _metadata_cache[metadata_path] = (mtime, metadata)
+    return copy.deepcopy(metadata)
+
+
+def _probe_xray_metadata(dataset_path: Path, metadata: dict) -> dict:
+    """Add metadata from the first readable X-ray image in the dataset to the metadata dictionary.
+
+    The images listed in the file to angle map are tried in order, so the same image is read every
+    time regardless of the order of the files in the directory.
+
+    Args:
+        dataset_path (Path): The path to the dataset directory.
+        metadata (dict): The metadata read from meta.json.
+
+    Returns:
+        dict: The updated metadata dictionary with the X-ray metadata.
+
+    """
+    files = [dataset_path / file for file in metadata.get("file_angle_map", {})]
+    if not files:
+        files = sorted(file for file in dataset_path.iterdir() if file.suffix != ".json")
+    for file in files:
+        try:
+            xray = sitk.ReadImage(file)
+            metadata = add_xray_metadata(metadata, xray)
+            break
+        except (OSError, RuntimeError) as e:
+            print(f"Error reading {file}: {e}")  # noqa: T201
+            continue
     return metadata
 
 
@@ -106,6 +164,24 @@ def add_xray_metadata(metadata: dict, xray: sitk.Image) -> dict:
     return metadata
 
 
+def get_peak_rss_mib() -> float | None:
+    """Get the peak resident set size of the process.
+
+    Returns:
+        float | None: The peak resident set size in MiB, or None if it cannot be measured on this
+        platform.
+
+    """
+    try:
+        import resource  # noqa: PLC0415
+    except ImportError:  # not available on Windows
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return peak_rss / 1024**2  # bytes on macOS
+    return peak_rss / 1024  # KiB on Linux
+
+
 def get_torch_dtype(dtype_str: str) -> torch.dtype:
     """Get the torch dtype from a string.
 
@@ -0,0 +1,82 @@
+"""Script for comparing the throughput of a DataLoader and a RayBatchIterator.
+
+Both loaders iterate over the same synthetic dataset, and every batch is moved to the training
+device as in train(). Throughput is reported in rays per second.
+"""
+
+import tempfile
+import time
+from collections.abc import Iterable
+from pathlib import Path
+
+import torch
+
+from ctnerf.training.dataloading import RayBatchIterator, XRayDataset
+from scripts.benchmark_loading import write_synthetic_projections
+
+num_projections = 32
+xray_size = (256, 268)
+batch_size = 4096
+num_batches = 200
+device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
+
+
+def _rays_per_second(loader: Iterable) -> float:
+    """Iterate over num_batches batches of a loader and return the throughput in rays per second."""
+    iterator = iter(loader)
+    next(iterator)  # exclude worker start-up from the measurement
+
+    start = time.perf_counter()
+    for _ in range(num_batches):
+        batch = next(iterator)
+        batch = [tensor.to(device, non_blocking=True) for tensor in batch]
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+    return num_batches * batch_size / (time.perf_counter() - start)
+
+
+def main() -> None:
+    """Compare the throughput of a DataLoader and a RayBatchIterator."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        xray_dir = Path(tmp_dir)
+        write_synthetic_projections(xray_dir, num_projections, xray_size)
+
+        print(f"{'loader':>30} {'rays/s':>12}")  # noqa: T201
+        for compact in (False, True):
+            dataset = XRayDataset(
+                xray_dir,
+                attenuation_scaling_factor=None,
+                s=1,
+                k=0.1,
+                compact=compact,
+            )
+            mode = "compact" if compact else "full"
+
+            for num_workers in (0, 4):
+                dataloader = torch.utils.data.DataLoader(
+                    dataset,
+                    batch_size=batch_size,
+                    shuffle=True,
+                    num_workers=num_workers,
+                    pin_memory=device.type == "cuda",
+                )
+                rays_per_second = _rays_per_second(dataloader)
+                name = f"DataLoader {mode} ({num_workers} workers)"
+                print(f"{name:>30} {rays_per_second:>12.0f}")  # noqa: T201
+                del dataloader
+
+            buffers = ["cpu"] + (["pinned", "device"] if device.type == "cuda" else [])
+            for ray_buffer in buffers:
+                iterator = RayBatchIterator(
+                    dataset,
+                    batch_size,
+                    device=device if ray_buffer == "device" else "cpu",
+                    pin_memory=ray_buffer == "pinned",
+                )
+                rays_per_second = _rays_per_second(iterator)
+                name = f"RayBatchIterator {mode} ({ray_buffer})"
+                print(f"{name:>30} {rays_per_second:>12.0f}")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Script for comparing an ahead-of-time compiled model with the eager model.
+
+The model of the inference config is exported to a temporary AOTInductor package. The cold start,
+i.e. the time from a fresh process to the output of its first batch, including the imports and the
+loading of the model, is measured in a new process for both the eager and the exported model. The
+steady-state throughput of generating the CT image of the inference config is then reported in
+voxels per second, together with the largest difference between the two images.
+
+Heavy modules are imported inside the functions, so that the imports are part of the cold starts.
+"""
+
+import multiprocessing
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+batch_size = 65536
+
+
+def _eager_cold_start(config_path: Path) -> float:
+    """Get the time to the first batch of the eager model in seconds."""
+    start = time.perf_counter()
+    import torch  # noqa: PLC0415
+
+    from ctnerf.setup.config import get_inference_config  # noqa: PLC0415
+
+    conf = get_inference_config(config_path)
+    model = (conf.fine_model or conf.coarse_model).eval()
+    with torch.no_grad():
+        model(torch.zeros(batch_size, 3, device=conf.device))
+    return time.perf_counter() - start
+
+
+def _exported_cold_start(package_path: Path, device: str) -> float:
+    """Get the time to the first batch of the exported model in seconds."""
+    start = time.perf_counter()
+    import torch  # noqa: PLC0415
+
+    from ctnerf.image_creation.ct_creation import load_exported_model  # noqa: PLC0415
+
+    model = load_exported_model(package_path)
+    with torch.no_grad():
+        model(torch.zeros(batch_size, 3, device=device))
+    return time.perf_counter() - start
+
+
+def main(config_path: Path) -> None:
+    """Compare the eager and exported model of an inference config.
+
+    Args:
+        config_path (Path): Path to the inference config.
+
+    """
+    import numpy as np  # noqa: PLC0415
+
+    from ctnerf.image_creation.ct_creation import (  # noqa: PLC0415
+        export_model,
+        get_image_geometry,
+        load_exported_model,
+        run_inference,
+    )
+    from ctnerf.setup.config import get_inference_config  # noqa: PLC0415
+
+    conf = get_inference_config(config_path)
+    eager_model = conf.fine_model or conf.coarse_model
+    image_size, _ = get_image_geometry(conf)
+    num_voxels = int(np.prod(image_size))
+
+    ctx = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        start = time.perf_counter()
+        package_path = export_model(eager_model, Path(tmp_dir) / "model.pt2")
+        print(f"Export and compilation took {time.perf_counter() - start:.1f} s")  # noqa: T201
+
+        with ctx.Pool(1) as pool:
+            eager_cold_start = pool.apply(_eager_cold_start, (config_path,))
+        with ctx.Pool(1) as pool:
+            exported_cold_start = pool.apply(
+                _exported_cold_start,
+                (package_path, str(conf.device)),
+            )
+
+        outputs = {}
+        print(f"{'model':>9} {'cold start (s)':>15} {'voxels/s':>12}")  # noqa: T201
+        for name, model, cold_start in (
+            ("eager", eager_model, eager_cold_start),
+            ("exported", load_exported_model(package_path), exported_cold_start),
+        ):
+            start = time.perf_counter()
+            outputs[name] = run_inference(
+                model,
+                image_size,
+                conf.chunk_size,
+                conf.attenuation_scaling_factor,
+                conf.device,
+            )
+            voxels_per_second = num_voxels / (time.perf_counter() - start)
+            print(f"{name:>9} {cold_start:>15.2f} {voxels_per_second:>12.0f}")  # noqa: T201
+
+    difference = (outputs["exported"] - outputs["eager"]).abs().max()
+    print(f"Largest difference between the images: {difference:.3f} HU")  # noqa: T201
+
+
+if __name__ == "__main__":
+    from ctnerf.utils import get_config_dir
+
+    main(Path(sys.argv[1]) if len(sys.argv) > 1 else get_config_dir() / "inference_config.yaml")
@@ -0,0 +1,85 @@
+"""Script for benchmarking XRayDataset construction on a synthetic projection directory.
+
+Each dataset is constructed in a fresh process so that the reported peak RSS belongs to that
+construction alone. Construction time and peak RSS should grow linearly with the number of
+projections.
+"""
+
+import json
+import multiprocessing
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import SimpleITK as sitk
+
+from ctnerf.training.dataloading import XRayDataset
+from ctnerf.utils import get_peak_rss_mib
+
+projection_counts = [8, 16, 32, 64]
+load_workers = [1, 8]
+xray_size = (256, 268)  # (width, height), i.e. the "size" field in meta.json
+spacing = (1.5234375, 3.0)
+
+
+def write_synthetic_projections(
+    output_dir: Path,
+    num_projections: int,
+    size: tuple[int, int],
+) -> None:
+    """Write random transmittance images and a matching meta.json to a directory.
+
+    Args:
+        output_dir (Path): Directory to write the projections to.
+        num_projections (int): Number of projections to write, evenly spread over 180 degrees.
+        size (tuple[int, int]): Size of each projection as (width, height).
+
+    """
+    output_dir.mkdir(exist_ok=True, parents=True)
+    rng = np.random.default_rng(0)
+
+    file_angle_map = {}
+    for i, angle in enumerate(np.linspace(0, 180, num_projections, endpoint=False)):
+        output_file = f"{i}.nii.gz"
+        xray = sitk.GetImageFromArray(rng.random((size[1], size[0])))
+        xray.SetSpacing(spacing)
+        sitk.WriteImage(xray, output_dir / output_file)
+        file_angle_map[output_file] = float(angle)
+
+    metadata = {"file_angle_map": file_angle_map, "spacing": spacing, "size": size}
+    with (output_dir / "meta.json").open("w") as f:
+        json.dump(metadata, f)
+
+
+def _load(xray_dir: Path, workers: int) -> tuple[float, float | None]:
+    """Construct the dataset and return the construction time and peak RSS in MiB."""
+    start = time.perf_counter()
+    XRayDataset(xray_dir, attenuation_scaling_factor=None, s=1, k=0.1, load_workers=workers)
+    elapsed = time.perf_counter() - start
+    return elapsed, get_peak_rss_mib()
+
+
+def main() -> None:
+    """Benchmark dataset construction for increasing numbers of projections."""
+    ctx = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        print(  # noqa: T201
+            f"{'projections':>12} {'rays':>12} {'workers':>8} {'time (s)':>10} "
+            f"{'peak RSS (MiB)':>15}",
+        )
+        for num_projections in projection_counts:
+            xray_dir = Path(tmp_dir) / str(num_projections)
+            write_synthetic_projections(xray_dir, num_projections, xray_size)
+            num_rays = num_projections * int(np.prod(xray_size))
+            for workers in load_workers:
+                with ctx.Pool(1) as pool:
+                    elapsed, peak_rss = pool.apply(_load, (xray_dir, workers))
+                print(  # noqa: T201
+                    f"{num_projections:>12} {num_rays:>12} {workers:>8} {elapsed:>10.2f} "
+                    f"{peak_rss if peak_rss is not None else float('nan'):>15.0f}",
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Script for comparing the NumPy-only inference runtime with the torch runtime.
+
+The cold start, i.e. the time from a fresh process to a loaded model, including the imports, is
+measured in a new process for both runtimes. The CT image of the inference config is then
+generated by both, and the time taken and the difference between the images are reported.
+
+Without an inference config, a reference model is written to a temporary directory and used
+instead, see scripts/benchmark_precision.py. Heavy modules are imported inside the functions, so
+that the imports are part of the cold starts.
+"""
+
+import multiprocessing
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+
+def _torch_cold_start(config_path: Path) -> float:
+    """Get the time to a loaded model of the torch runtime in seconds."""
+    start = time.perf_counter()
+    from ctnerf.setup.config import get_inference_config  # noqa: PLC0415
+
+    get_inference_config(config_path)
+    return time.perf_counter() - start
+
+
+def _numpy_cold_start(checkpoint_path: Path, model_type: str) -> float:
+    """Get the time to a loaded model of the NumPy runtime in seconds."""
+    start = time.perf_counter()
+    from ctnerf.image_creation import numpy_inference  # noqa: PLC0415
+
+    numpy_inference.NumpyXRayModel(numpy_inference.load_state_dict(checkpoint_path, model_type))
+    return time.perf_counter() - start
+
+
+def main(config_path: Path) -> None:
+    """Compare the NumPy and torch runtimes on the model of an inference config.
+
+    Args:
+        config_path (Path): Path to the inference config.
+
+    """
+    import numpy as np  # noqa: PLC0415
+    import yaml  # noqa: PLC0415
+
+    from ctnerf.image_creation import numpy_inference  # noqa: PLC0415
+    from ctnerf.image_creation.ct_creation import get_image_geometry, run_inference  # noqa: PLC0415
+    from ctnerf.setup.config import get_inference_config  # noqa: PLC0415
+    from ctnerf.utils import get_model_dir  # noqa: PLC0415
+
+    with config_path.open("r") as f:
+        conf_dict = yaml.load(f, Loader=yaml.SafeLoader)
+    checkpoint_path = (
+        get_model_dir()
+        / conf_dict["checkpoint"]["checkpoint_dir"]
+        / f"{conf_dict['checkpoint']['resume_epoch']}.pt"
+    )
+
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(1) as pool:
+        torch_cold_start = pool.apply(_torch_cold_start, (config_path,))
+    with ctx.Pool(1) as pool:
+        numpy_cold_start = pool.apply(
+            _numpy_cold_start,
+            (checkpoint_path, conf_dict["model_type"]),
+        )
+
+    conf = get_inference_config(config_path)
+    image_size, _ = get_image_geometry(conf)
+    numpy_model = numpy_inference.NumpyXRayModel(
+        numpy_inference.load_state_dict(checkpoint_path, conf_dict["model_type"]),
+    )
+
+    outputs = {}
+    print(f"{'runtime':>8} {'cold start (s)':>15} {'time (s)':>9}")  # noqa: T201
+    for name, cold_start in (("torch", torch_cold_start), ("numpy", numpy_cold_start)):
+        start = time.perf_counter()
+        if name == "torch":
+            outputs[name] = run_inference(
+                conf.fine_model or conf.coarse_model,
+                image_size,
+                conf.chunk_size,
+                conf.attenuation_scaling_factor,
+                conf.device,
+            ).numpy(force=True)
+        else:
+            outputs[name] = numpy_inference.run_inference(
+                numpy_model,
+                image_size,
+                conf.chunk_size,
+                conf.attenuation_scaling_factor,
+            )
+        elapsed = time.perf_counter() - start
+        print(f"{name:>8} {cold_start:>15.2f} {elapsed:>9.2f}")  # noqa: T201
+
+    difference = np.abs(outputs["numpy"] - outputs["torch"])
+    print(  # noqa: T201
+        f"Difference between the images: mean {difference.mean():.4f} HU, "
+        f"max {difference.max():.4f} HU",
+    )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        main(Path(sys.argv[1]))
+    else:
+        from scripts.benchmark_precision import write_reference_config
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            main(write_reference_config(Path(tmp_dir)))
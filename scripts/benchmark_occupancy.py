@@ -0,0 +1,77 @@
+"""Script for measuring the empty-space skipping of an occupancy grid at inference.
+
+The CT image of the inference config is generated without and with an occupancy grid, using the
+occupancy_grid section of the config, or the default grid if it has none. The grid is loaded from
+the checkpoint if it holds one, otherwise it is computed from the model, which is included in the
+setup time. The fraction of the voxels that are evaluated, the time taken, and the error of the
+image against the image without the grid are reported.
+"""
+
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import torch
+import yaml
+
+from ctnerf.image_creation import numpy_inference
+from ctnerf.image_creation.ct_creation import get_image_geometry, run_inference
+from ctnerf.setup.config import get_inference_config
+from ctnerf.utils import get_config_dir
+
+
+def main(config_path: Path) -> None:
+    """Compare inference without and with an occupancy grid on the model of an inference config.
+
+    Args:
+        config_path (Path): Path to the inference config.
+
+    """
+    with config_path.open("r") as f:
+        conf_dict = yaml.load(f, Loader=yaml.SafeLoader)
+    grid_dict = conf_dict.get("occupancy_grid") or {}
+
+    print(  # noqa: T201
+        f"{'grid':>5} {'setup (s)':>9} {'evaluated':>9} {'time (s)':>9} {'speed-up':>9} "
+        f"{'MAE (HU)':>9} {'max (HU)':>9}",
+    )
+    for name, grid in (("none", None), ("grid", grid_dict)):
+        with tempfile.NamedTemporaryFile("w", suffix=".yaml") as f:
+            yaml.dump({**conf_dict, "occupancy_grid": grid}, f)
+            start = time.perf_counter()
+            conf = get_inference_config(Path(f.name))
+            setup_time = time.perf_counter() - start
+
+        image_size, _ = get_image_geometry(conf)
+        if conf.occupancy_grid is not None:
+            axes = (
+                torch.from_numpy(axis).to(conf.device)
+                for axis in numpy_inference.lattice_axes(image_size)
+            )
+            evaluated = conf.occupancy_grid.lattice_mask(*axes).float().mean().item()
+        else:
+            evaluated = 1.0
+
+        start = time.perf_counter()
+        output = run_inference(
+            conf.fine_model or conf.coarse_model,
+            image_size,
+            conf.chunk_size,
+            conf.attenuation_scaling_factor,
+            conf.device,
+            occupancy_grid=conf.occupancy_grid,
+        )
+        elapsed = time.perf_counter() - start
+
+        if conf.occupancy_grid is None:
+            reference, reference_time = output, elapsed
+        error = (output - reference).abs()
+        print(  # noqa: T201
+            f"{name:>5} {setup_time:>9.2f} {evaluated:>9.3f} {elapsed:>9.2f} "
+            f"{reference_time / elapsed:>9.2f} {error.mean():>9.2f} {error.max():>9.1f}",
+        )
+
+
+if __name__ == "__main__":
+    main(Path(sys.argv[1]) if len(sys.argv) > 1 else get_config_dir() / "inference_config.yaml")
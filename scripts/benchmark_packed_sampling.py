@@ -0,0 +1,168 @@
+"""Script for comparing the cost and accuracy of fixed and packed numbers of samples per ray.
+
+Rays of the training data of a training config are rendered with the coarse model of its
+checkpoint, with the coarse sampling function of the config, and with packed samples at several
+step sizes, see get_packed_samples. Each is compared to a reference rendered with
+reference_samples samples per ray. The number of model evaluations per ray, the time taken, and the
+mean absolute error of the optical depth of the rays are reported. The checkpoint should hold a
+trained model, otherwise the errors are those of a random model.
+"""
+
+import itertools
+import sys
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+import torch
+
+from ctnerf import ray_sampling
+from ctnerf.rays import (
+    beer_lambert_law,
+    get_coarse_samples,
+    get_packed_samples,
+    packed_beer_lambert_law,
+)
+from ctnerf.setup.config import TrainingConfig, get_training_config
+from ctnerf.training.training import _batch_to_device
+from ctnerf.utils import get_config_dir
+
+num_batches = 8
+reference_samples = 4096
+# Step sizes of the packed samples, relative to 2 / num_coarse_samples
+step_size_factors = [1, 1.5, 2]
+# Number of points per forward pass of the model
+chunk_size = 4096 * 64
+
+
+def _evaluate(model: torch.nn.Module, samples: torch.Tensor) -> torch.Tensor:
+    """Evaluate a model at the samples of a batch of rays, in chunks."""
+    return torch.cat([model(chunk) for chunk in samples.split(chunk_size)]).reshape(-1)
+
+
+def _optical_depths(
+    render: Callable[[torch.Tensor, torch.Tensor, torch.Tensor], tuple[torch.Tensor, int]],
+    batches: list[tuple[torch.Tensor, ...]],
+) -> tuple[torch.Tensor, float, float]:
+    """Render batches of rays, and return their optical depths, samples per ray and time taken."""
+    optical_depths = []
+    n_samples = 0
+    start = time.perf_counter()
+    for start_positions, heading_vectors, ray_bounds in batches:
+        transmittance, batch_samples = render(start_positions, heading_vectors, ray_bounds)
+        optical_depths.append(-torch.log(transmittance))
+        n_samples += batch_samples
+    elapsed = time.perf_counter() - start
+    optical_depths = torch.cat(optical_depths)
+    return optical_depths, n_samples / optical_depths.shape[0], elapsed
+
+
+def _dense_renderer(
+    conf: TrainingConfig,
+    n_samples: int,
+    sampling_function: Callable,
+) -> Callable[[torch.Tensor, torch.Tensor, torch.Tensor], tuple[torch.Tensor, int]]:
+    """Get a function rendering rays with n_samples samples per ray."""
+
+    def render(
+        start_positions: torch.Tensor,
+        heading_vectors: torch.Tensor,
+        ray_bounds: torch.Tensor,
+    ) -> tuple[torch.Tensor, int]:
+        _, samples, sampling_distances = get_coarse_samples(
+            start_positions,
+            heading_vectors,
+            n_samples,
+            start_positions.shape[0],
+            conf.device,
+            ray_bounds,
+            conf.plateau_ratio,
+            sampling_function,
+        )
+        attenuation_coeffs = _evaluate(conf.coarse_model, samples)
+        attenuation_coeffs = attenuation_coeffs.reshape(start_positions.shape[0], -1)
+        transmittance = beer_lambert_law(
+            attenuation_coeffs,
+            sampling_distances,
+            None,
+            None,
+            conf.slice_size_cm,
+        )
+        return transmittance, samples.shape[0]
+
+    return render
+
+
+def _packed_renderer(
+    conf: TrainingConfig,
+    step_size: float,
+) -> Callable[[torch.Tensor, torch.Tensor, torch.Tensor], tuple[torch.Tensor, int]]:
+    """Get a function rendering rays with packed samples at a step size."""
+
+    def render(
+        start_positions: torch.Tensor,
+        heading_vectors: torch.Tensor,
+        ray_bounds: torch.Tensor,
+    ) -> tuple[torch.Tensor, int]:
+        _, samples, sampling_distances, ray_indices = get_packed_samples(
+            start_positions,
+            heading_vectors,
+            ray_bounds,
+            step_size,
+        )
+        transmittance = packed_beer_lambert_law(
+            _evaluate(conf.coarse_model, samples),
+            sampling_distances,
+            ray_indices,
+            start_positions.shape[0],
+            None,
+            None,
+            conf.slice_size_cm,
+        )
+        return transmittance, samples.shape[0]
+
+    return render
+
+
+@torch.no_grad()
+def main(config_path: Path) -> None:
+    """Compare fixed and packed numbers of samples per ray on the model of a training config.
+
+    Args:
+        config_path (Path): Path to the training config.
+
+    """
+    conf = get_training_config(config_path)
+    conf.coarse_model.eval()
+    batches = [
+        (start_positions, heading_vectors, ray_bounds)
+        for start_positions, heading_vectors, _, ray_bounds in (
+            _batch_to_device(batch, conf)
+            for batch in itertools.islice(conf.dataloader, num_batches)
+        )
+    ]
+
+    reference, _, _ = _optical_depths(
+        _dense_renderer(conf, reference_samples, ray_sampling.cylinder_sampling),
+        batches,
+    )
+    renderers = {
+        conf.coarse_sampling_function.__name__: _dense_renderer(
+            conf,
+            conf.n_coarse_samples,
+            conf.coarse_sampling_function,
+        ),
+    }
+    for factor in step_size_factors:
+        step_size = factor * 2 / conf.n_coarse_samples
+        renderers[f"packed {step_size:.4g}"] = _packed_renderer(conf, step_size)
+
+    print(f"{'sampling':>26} {'samples/ray':>11} {'time (s)':>9} {'MAE':>9}")  # noqa: T201
+    for name, render in renderers.items():
+        optical_depths, samples_per_ray, elapsed = _optical_depths(render, batches)
+        error = (optical_depths - reference).abs().mean()
+        print(f"{name:>26} {samples_per_ray:>11.1f} {elapsed:>9.2f} {error:>9.4f}")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main(Path(sys.argv[1]) if len(sys.argv) > 1 else get_config_dir() / "train_config.yaml")
@@ -0,0 +1,143 @@
+"""Script for comparing the speed and accuracy of the inference precisions.
+
+The model of the inference config is used to generate its CT image in every precision, and the
+time taken and the error of the image against the fp32 image are reported. The mean absolute error
+in HU tells which reduced precisions are within tolerance, and the speed-up which of them is worth
+using. Precisions that are not supported for the model or device are skipped.
+
+Without an inference config, a model of the default architecture is briefly fitted to an analytic
+phantom of nested ellipsoids, written to a temporary directory, and benchmarked instead.
+"""
+
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import torch
+import yaml
+
+from ctnerf.image_creation.ct_creation import get_image_geometry, run_inference
+from ctnerf.model import XRayModel
+from ctnerf.setup.config import get_inference_config
+
+precisions = ["fp32", "bf16", "int8"]
+reference_model_config = {"encoding": "sinusoidal", "n_layers": 8, "layer_dim": 128, "L": 20}
+reference_image_size = [128, 128, 134]
+reference_fit_steps = 300
+# Centre, radii and attenuation per cm of the ellipsoids of the phantom
+phantom_ellipsoids = [
+    ((0.0, 0.0, 0.0), (0.8, 0.6, 0.9), 0.2),
+    ((0.3, 0.1, 0.2), (0.2, 0.25, 0.3), 0.05),
+    ((-0.3, -0.2, -0.1), (0.15, 0.1, 0.2), 0.25),
+]
+
+
+def _phantom(points: torch.Tensor) -> torch.Tensor:
+    """Get the attenuation of the phantom at points of shape (N, 3), with shape (N, 1)."""
+    attenuation = torch.zeros(points.shape[0], 1)
+    for centre, radii, value in phantom_ellipsoids:
+        distances = (((points - torch.tensor(centre)) / torch.tensor(radii)) ** 2).sum(dim=1)
+        attenuation[distances < 1] += value
+    return attenuation
+
+
+def write_reference_config(output_dir: Path) -> Path:
+    """Write a model fitted to the phantom and an inference config running it to a directory.
+
+    Args:
+        output_dir (Path): Directory to write the checkpoint, config and output directory to.
+
+    Returns:
+        Path: Path of the inference config.
+
+    """
+    torch.manual_seed(0)
+    model = XRayModel(
+        reference_model_config["n_layers"],
+        reference_model_config["layer_dim"],
+        reference_model_config["L"],
+    )
+    optimizer = torch.optim.Adam(model.parameters(), lr=1e-4)
+    for _ in range(reference_fit_steps):
+        points = torch.rand(4096, 3) * 2 - 1
+        loss = torch.nn.functional.mse_loss(model(points), _phantom(points))
+        loss.backward()
+        optimizer.step()
+        optimizer.zero_grad(set_to_none=True)
+
+    checkpoint = {
+        "coarse_model_state_dict": model.state_dict(),
+        "epoch": 1,
+        "run_hash": None,
+        "model_config": reference_model_config,
+    }
+    torch.save(checkpoint, output_dir / "1.pt")
+
+    # Absolute paths take precedence over the model and CT directories they are joined to
+    conf_dict = {
+        "device": "cpu",
+        "model_type": "coarse",
+        "model": reference_model_config,
+        "checkpoint": {"checkpoint_dir": str(output_dir), "resume_epoch": 1},
+        "output_dir": str(output_dir / "output"),
+        "output_name": "reference.nrrd",
+        "xray_size": reference_image_size[1:],
+        "xray_pixel_spacing": [3.0, 3.0],
+        "image_size": reference_image_size,
+        "chunk_size": 4096 * 64,
+        "scaling": {},
+    }
+    config_path = output_dir / "inference_config.yaml"
+    with config_path.open("w") as f:
+        yaml.dump(conf_dict, f)
+    return config_path
+
+
+def main(config_path: Path) -> None:
+    """Compare the inference precisions on the model of an inference config.
+
+    Args:
+        config_path (Path): Path to the inference config.
+
+    """
+    with config_path.open("r") as f:
+        conf_dict = yaml.load(f, Loader=yaml.SafeLoader)
+
+    print(f"{'precision':>9} {'time (s)':>9} {'speed-up':>9} {'MAE (HU)':>9} {'max (HU)':>9}")  # noqa: T201
+    for precision in precisions:
+        with tempfile.NamedTemporaryFile("w", suffix=".yaml") as f:
+            yaml.dump({**conf_dict, "precision": precision}, f)
+            try:
+                conf = get_inference_config(Path(f.name))
+            except ValueError as e:
+                print(f"{precision:>9} skipped: {e}")  # noqa: T201
+                continue
+
+        image_size, _ = get_image_geometry(conf)
+        start = time.perf_counter()
+        output = run_inference(
+            conf.fine_model or conf.coarse_model,
+            image_size,
+            conf.chunk_size,
+            conf.attenuation_scaling_factor,
+            conf.device,
+            autocast_dtype=torch.bfloat16 if precision == "bf16" else None,
+        )
+        elapsed = time.perf_counter() - start
+
+        if precision == "fp32":
+            reference, reference_time = output, elapsed
+        error = (output - reference).abs()
+        print(  # noqa: T201
+            f"{precision:>9} {elapsed:>9.2f} {reference_time / elapsed:>9.2f} "
+            f"{error.mean():>9.2f} {error.max():>9.1f}",
+        )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        main(Path(sys.argv[1]))
+    else:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            main(write_reference_config(Path(tmp_dir)))
@@ -0,0 +1,106 @@
+"""Script for comparing the throughput of random and block-shuffled sampling of rays.
+
+Each sampler is benchmarked on a dataset held in RAM and on the same dataset memory-mapped from the
+cache. Before every memory-mapped run, the cache file is evicted from the page cache, so the run
+starts cold. Full permutations are gathered through a DataLoader over the full dataset, and through
+a RayBatchIterator over the compact dataset, whose buffer is the memory-mapped intensities
+themselves. The DataLoaders are timed over num_batches batches, and the RayBatchIterators over a
+whole epoch, so that the cost of drawing a full permutation is included. Throughput is reported in
+rays per second.
+"""
+
+import os
+import tempfile
+import time
+from collections.abc import Callable, Iterable
+from pathlib import Path
+
+import torch
+
+from ctnerf.training.dataloading import RayBatchIterator, XRayDataset
+from ctnerf.training.samplers import BlockShuffleSampler
+from scripts.benchmark_loading import write_synthetic_projections
+
+num_projections = 64
+xray_size = (256, 268)
+batch_size = 4096
+num_batches = 100
+
+
+def _evict_from_page_cache(cache_dir: Path) -> None:
+    """Drop the cached pages of every file in a directory from the page cache."""
+    for path in cache_dir.iterdir():
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+
+def _rays_per_second(loader: Iterable) -> float:
+    """Iterate over batches of a loader and return the throughput in rays per second."""
+    batches = len(loader) if isinstance(loader, RayBatchIterator) else num_batches
+    start = time.perf_counter()
+    iterator = iter(loader)
+    for _ in range(batches):
+        next(iterator)
+    return batches * batch_size / (time.perf_counter() - start)
+
+
+def _loaders(dataset: XRayDataset) -> dict[str, Callable[[], Iterable]]:
+    """Get constructors of the loaders to compare for a dataset."""
+    if dataset.compact:
+        return {
+            "RayBatchIterator random": lambda: RayBatchIterator(dataset, batch_size),
+            "RayBatchIterator block": lambda: RayBatchIterator(
+                dataset,
+                batch_size,
+                sampler=BlockShuffleSampler(dataset),
+            ),
+        }
+    return {
+        "DataLoader random": lambda: torch.utils.data.DataLoader(
+            dataset,
+            batch_size=batch_size,
+            shuffle=True,
+        ),
+        "DataLoader block": lambda: torch.utils.data.DataLoader(
+            dataset,
+            batch_size=batch_size,
+            sampler=BlockShuffleSampler(dataset),
+        ),
+    }
+
+
+def main() -> None:
+    """Compare random and block-shuffled sampling on in-RAM and memory-mapped datasets."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        xray_dir = Path(tmp_dir) / "xrays"
+        cache_dir = Path(tmp_dir) / "cache"
+        cache_dir.mkdir()
+        write_synthetic_projections(xray_dir, num_projections, xray_size)
+
+        print(f"{'loader':>26} {'storage':>8} {'rays/s':>12}")  # noqa: T201
+        for compact in (False, True):
+            dataset_kwargs = {
+                "xray_dir": xray_dir,
+                "attenuation_scaling_factor": None,
+                "s": 1,
+                "k": 0.1,
+                "compact": compact,
+            }
+            in_ram = XRayDataset(**dataset_kwargs, cache_dir=cache_dir)  # also writes the cache
+
+            for name, loader in _loaders(in_ram).items():
+                rays_per_second = _rays_per_second(loader())
+                print(f"{name:>26} {'RAM':>8} {rays_per_second:>12.0f}")  # noqa: T201
+
+            for name in _loaders(in_ram):
+                _evict_from_page_cache(cache_dir)
+                mmapped = XRayDataset(**dataset_kwargs, cache_dir=cache_dir)
+                rays_per_second = _rays_per_second(_loaders(mmapped)[name]())
+                print(f"{name:>26} {'mmap':>8} {rays_per_second:>12.0f}")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
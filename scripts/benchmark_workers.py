@@ -0,0 +1,100 @@
+"""Script for checking that the memory used by DataLoader workers does not grow with their number.
+
+A DataLoader over a synthetic dataset is started with an increasing number of workers, under both
+the fork and the spawn start methods, and a few batches are drawn so that every worker has touched
+the dataset. The total proportional set size (PSS) of the main process and its workers is then
+reported. PSS divides each shared page between the processes sharing it, so unlike RSS, it does not
+count a dataset shared by several workers more than once. It should stay roughly constant as the
+number of workers grows when the dataset tensors are shared. Every worker also holds its own
+interpreter and copy of torch, so the same measurement over a tiny dataset is reported as a
+baseline, and only growth beyond the baseline is due to the dataset.
+
+Linux only, since PSS is read from /proc.
+"""
+
+import os
+import tempfile
+from pathlib import Path
+
+import torch
+
+from ctnerf.training.dataloading import XRayDataset
+from scripts.benchmark_loading import write_synthetic_projections
+
+num_projections = 64
+xray_size = (256, 268)
+batch_size = 4096
+num_batches = 8
+worker_counts = [0, 1, 2, 4]
+
+
+def _pss_mib(pid: int) -> float:
+    """Get the PSS of a process in MiB."""
+    with Path(f"/proc/{pid}/smaps_rollup").open() as f:
+        for line in f:
+            if line.startswith("Pss:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def _total_pss_mib() -> float:
+    """Get the total PSS of this process and its child processes in MiB."""
+    pid = os.getpid()
+    children = Path(f"/proc/{pid}/task/{pid}/children").read_text().split()
+    return _pss_mib(pid) + sum(_pss_mib(int(child)) for child in children)
+
+
+def _measure(dataset: XRayDataset, num_workers: int, start_method: str) -> float:
+    """Draw a few batches with a number of workers and return the total PSS in MiB."""
+    dataloader = torch.utils.data.DataLoader(
+        dataset,
+        batch_size=batch_size,
+        shuffle=True,
+        num_workers=num_workers,
+        multiprocessing_context=start_method if num_workers > 0 else None,
+    )
+    iterator = iter(dataloader)
+    for _ in range(num_batches):
+        next(iterator)
+    pss = _total_pss_mib()
+    del iterator
+    return pss
+
+
+def main() -> None:
+    """Report the total PSS for increasing numbers of workers."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        xray_dir = Path(tmp_dir) / "xrays"
+        cache_dir = Path(tmp_dir) / "cache"
+        cache_dir.mkdir()
+        tiny_xray_dir = Path(tmp_dir) / "tiny"
+        write_synthetic_projections(xray_dir, num_projections, xray_size)
+        write_synthetic_projections(tiny_xray_dir, 1, xray_size)
+        scaling = {"attenuation_scaling_factor": None, "s": 1, "k": 0.1}
+        XRayDataset(xray_dir, **scaling, cache_dir=cache_dir)  # write the cache
+
+        print(  # noqa: T201
+            f"{'storage':>14} {'start method':>13} "
+            + " ".join(f"{f'{n} workers':>10}" for n in worker_counts)
+            + "  total PSS (MiB)",
+        )
+        for storage in ("baseline", "RAM", "RAM shared", "mmap"):
+            for start_method in ("fork", "spawn"):
+                if storage == "baseline":
+                    dataset = XRayDataset(tiny_xray_dir, **scaling)
+                elif storage == "mmap":
+                    dataset = XRayDataset(xray_dir, **scaling, cache_dir=cache_dir)
+                else:
+                    dataset = XRayDataset(xray_dir, **scaling)
+                if storage == "RAM shared":
+                    dataset.share_memory_()
+
+                pss = [_measure(dataset, n, start_method) for n in worker_counts]
+                print(  # noqa: T201
+                    f"{storage:>14} {start_method:>13} " + " ".join(f"{p:>10.0f}" for p in pss),
+                )
+                del dataset
+
+
+if __name__ == "__main__":
+    main()
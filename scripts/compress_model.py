@@ -0,0 +1,29 @@
+"""Script for compressing a trained model by pruning and low-rank factorisation.
+
+Reads the training config, whose checkpoint section names the trained model and whose compression
+section lists the layer dimensions and ranks to compress it to, see get_compression_config. Prints
+a table of the size, cost, and accuracy of each compressed model relative to the original.
+"""
+
+from ctnerf.training.compression import compress
+from ctnerf.utils import get_config_dir
+
+
+def main() -> None:
+    """Compress a trained model and print the trade-off between accuracy and cost."""
+    rows = compress(get_config_dir() / "train_config.yaml")
+
+    print(  # noqa: T201
+        f"{'model':>12} {'params':>9} {'MFLOPs/pt':>10} {'seconds':>8} "
+        f"{'HU MAE':>8} {'before ft':>10} {'HU max':>8}",
+    )
+    for row in rows:
+        print(  # noqa: T201
+            f"{row['name']:>12} {row['params']:>9} {row['mflops_per_point']:>10.3f} "
+            f"{row['seconds']:>8.2f} {row['hu_mae']:>8.2f} "
+            f"{row.get('hu_mae_before_finetune', 0.0):>10.2f} {row['hu_max_error']:>8.1f}",
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+"""Script for distilling a trained model into a smaller student model."""
+
+from ctnerf.training.distillation import distill
+from ctnerf.utils import get_config_dir
+
+
+def main() -> None:
+    """Distill a trained model and report the speed-up and HU error of the student."""
+    report = distill(get_config_dir() / "distill_config.yaml")
+    for name, value in report.items():
+        print(f"{name:>16}: {value:.3f}")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""Script for compiling the model of the inference config ahead of time.
+
+The model is exported with torch.export and compiled with AOTInductor for the inference device. The
+package is written next to the checkpoint, and can be run by setting exported_model in the
+inference config.
+"""
+
+import sys
+from pathlib import Path
+
+import yaml
+
+from ctnerf.image_creation.ct_creation import export_model
+from ctnerf.setup.config import get_inference_config
+from ctnerf.utils import get_config_dir, get_model_dir
+
+
+def main(config_path: Path) -> None:
+    """Export the model of an inference config.
+
+    Args:
+        config_path (Path): Path to the inference config.
+
+    """
+    conf = get_inference_config(config_path)
+    if conf.exported_model_path is not None:
+        msg = "The inference config already runs an exported model."
+        raise ValueError(msg)
+
+    with config_path.open("r") as f:
+        conf_dict = yaml.load(f, Loader=yaml.SafeLoader)
+    checkpoint = conf_dict["checkpoint"]
+    package_path = (
+        get_model_dir()
+        / checkpoint["checkpoint_dir"]
+        / f"{checkpoint['resume_epoch']}_{conf_dict['model_type']}.pt2"
+    )
+    package_path = export_model(conf.fine_model or conf.coarse_model, package_path)
+    print(f"Exported model to {package_path}")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main(Path(sys.argv[1]) if len(sys.argv) > 1 else get_config_dir() / "inference_config.yaml")
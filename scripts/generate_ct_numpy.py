@@ -0,0 +1,73 @@
+"""Script for generating a CT image from a trained model with the NumPy-only runtime.
+
+Reads the same inference config as generate_ct.py, but neither torch nor the training stack is
+imported, so the script starts in a fraction of the time. Only sinusoidal models are supported, and
+they are run in fp32 on the cpu, so the precision, device, and exported_model fields are ignored.
+Output is streamed over the lattice in slabs of about chunk_size points.
+"""
+
+from pathlib import Path
+
+import SimpleITK as sitk
+import yaml
+
+from ctnerf.image_creation import numpy_inference
+
+# Directories of ctnerf.utils, which imports torch
+repo_dir = Path(__file__).parents[1]
+config_path = repo_dir / "config_yamls" / "inference_config.yaml"
+model_dir = repo_dir / "models"
+xray_dir = repo_dir / "data" / "xrays"
+ct_dir = repo_dir / "data" / "ct_images"
+
+
+def generate_ct(config_path: Path) -> None:
+    """Generate a CT image from a trained model with the NumPy-only runtime.
+
+    Args:
+        config_path (Path): Path of the inference configuration file.
+
+    """
+    with config_path.open("r") as f:
+        conf_dict = yaml.load(f, Loader=yaml.SafeLoader)
+
+    checkpoint_path = numpy_inference.get_checkpoint_path(conf_dict, model_dir)
+    if checkpoint_path is None:
+        msg = "checkpoint.checkpoint_dir must be specified."
+        raise ValueError(msg)
+    state_dict = numpy_inference.load_state_dict(checkpoint_path, conf_dict["model_type"])
+    model = numpy_inference.NumpyXRayModel(state_dict)
+
+    xray_metadata = numpy_inference.get_xray_metadata(conf_dict, xray_dir)
+
+    image_size, voxel_spacing = numpy_inference.get_image_geometry(
+        xray_metadata,
+        conf_dict.get("voxel_spacing"),
+        conf_dict.get("image_size"),
+    )
+    output = numpy_inference.run_inference(
+        model,
+        image_size,
+        conf_dict.get("chunk_size") or 4096 * 16,
+        conf_dict["scaling"].get("attenuation_scaling_factor"),
+    )
+
+    ct_image = numpy_inference.array_to_sitk(
+        output,
+        metadata=xray_metadata,
+        direction=conf_dict.get("image_direction") or [1, 0, 0, 0, 1, 0, 0, 0, 1],
+        origin=conf_dict.get("image_origin") or [0, 0, 0],
+        spacing=voxel_spacing,
+    )
+    output_dir = ct_dir / conf_dict["output_dir"]
+    output_dir.mkdir(exist_ok=True, parents=True)
+    sitk.WriteImage(ct_image, output_dir / conf_dict["output_name"])
+
+
+def main() -> None:
+    """Generate a CT image from a trained model with the NumPy-only runtime."""
+    generate_ct(config_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,14 @@
+"""Script for training the members of a hyperparameter sweep in one process."""
+
+import torch
+
+from ctnerf.training.training import train_sweep
+from ctnerf.utils import get_config_dir
+
+torch.set_float32_matmul_precision("high")
+torch.backends.cuda.matmul.allow_tf32 = True
+torch.backends.cuda.matmul.allow_fp16_reduced_precision_reduction = True
+torch.backends.cuda.matmul.allow_bf16_reduced_precision_reduction = True
+
+if __name__ == "__main__":
+    train_sweep(get_config_dir() / "train_config.yaml")
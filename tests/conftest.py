@@ -0,0 +1,42 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+import SimpleITK as sitk
+import torch
+
+_xray_size = (12, 10)  # (width, height), i.e. the "size" field in meta.json
+_num_projections = 4
+
+
+@pytest.fixture
+def xray_dir(tmp_path: Path) -> Path:
+    """Write a small stack of random transmittance images with their meta.json."""
+    xray_dir = tmp_path / "xrays"
+    xray_dir.mkdir()
+    rng = np.random.default_rng(0)
+
+    file_angle_map = {}
+    for i, angle in enumerate(np.linspace(0, 180, _num_projections, endpoint=False)):
+        file = f"{i}.nii.gz"
+        xray = sitk.GetImageFromArray(rng.random((_xray_size[1], _xray_size[0])))
+        xray.SetSpacing((1.5, 3.0))
+        sitk.WriteImage(xray, xray_dir / file)
+        file_angle_map[file] = float(angle)
+
+    metadata = {"file_angle_map": file_angle_map, "spacing": [1.5, 3.0], "size": _xray_size}
+    with (xray_dir / "meta.json").open("w") as f:
+        json.dump(metadata, f)
+    return xray_dir
+
+
+@pytest.fixture
+def raw_intensities(xray_dir: Path) -> torch.Tensor:
+    """Read the raw intensities of the images in xray_dir, in the order the dataset stores them."""
+    with (xray_dir / "meta.json").open() as f:
+        files = json.load(f)["file_angle_map"]
+    intensities = np.concatenate(
+        [sitk.GetArrayFromImage(sitk.ReadImage(xray_dir / file)).reshape(-1) for file in files],
+    )
+    return torch.from_numpy(intensities.astype(np.float32))
@@ -0,0 +1,211 @@
+import os
+import pickle
+from pathlib import Path
+
+import pytest
+import torch
+
+from ctnerf.training.dataloading import (
+    XRayDataset,
+    bin_intensities,
+    get_cache_key,
+    scale_intensities,
+)
+from ctnerf.utils import get_dataset_metadata
+
+# The images hold uniform random transmittances, so about a fifth of the rays pass through air
+air_threshold = 0.8
+
+
+def test_compact_geometry_matches_full_rays(xray_dir: Path) -> None:
+    full = XRayDataset(xray_dir, None, s=1, k=0.1)
+    compact = XRayDataset(xray_dir, None, s=1, k=0.1, compact=True)
+    assert len(compact) == len(full)
+    assert torch.equal(compact.intensities, full.intensities)
+
+    indices = torch.randperm(len(compact))
+    start_positions, heading_vectors, ray_bounds = compact.get_ray_geometry(indices)
+    torch.testing.assert_close(start_positions, full.start_positions[indices])
+    torch.testing.assert_close(heading_vectors, full.heading_vectors[indices])
+    # Rays at the edge of the detector are tangent to the cylinder, where the bounds are the square
+    # root of a difference near zero, so they only agree to about the square root of the precision
+    torch.testing.assert_close(ray_bounds, full.ray_bounds[indices], rtol=0, atol=1e-3)
+
+    index, intensity = compact[5]
+    assert index == 5
+    assert intensity == full[5][2]
+
+
+def test_cache_key_changes_with_images_and_parameters(xray_dir: Path) -> None:
+    metadata = get_dataset_metadata(xray_dir)
+    key = get_cache_key(xray_dir, metadata, s=1, k=0.1)
+    assert get_cache_key(xray_dir, metadata, s=1, k=0.1) == key
+    assert get_cache_key(xray_dir, metadata, s=1, k=0.2) != key
+
+    # A replaced image is detected from its modification time
+    image = xray_dir / "0.nii.gz"
+    stat = image.stat()
+    os.utime(image, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert get_cache_key(xray_dir, metadata, s=1, k=0.1) != key
+
+
+def test_cache_round_trip(xray_dir: Path, tmp_path: Path) -> None:
+    cache_dir = tmp_path / "cache"
+    built = XRayDataset(xray_dir, None, s=1, k=0.1, cache_dir=cache_dir)
+    assert len(list(cache_dir.glob("*.pt"))) == 1
+
+    cached = XRayDataset(xray_dir, None, s=1, k=0.1, cache_dir=cache_dir)
+    assert cached._mmap_path is not None  # noqa: SLF001
+    for name in ("start_positions", "heading_vectors", "intensities", "ray_bounds"):
+        assert torch.equal(getattr(cached, name), getattr(built, name))
+
+    # Only the path of the cache file is pickled, and the tensors are memory-mapped again
+    unpickled = pickle.loads(pickle.dumps(cached))  # noqa: S301
+    assert torch.equal(unpickled.intensities, built.intensities)
+
+    # Different processing parameters get their own cache file
+    XRayDataset(xray_dir, None, s=1, k=0.2, cache_dir=cache_dir)
+    assert len(list(cache_dir.glob("*.pt"))) == 2
+
+
+@pytest.mark.parametrize("air_policy", ["keep", "drop", "subsample", "constrain"])
+def test_air_policies(xray_dir: Path, raw_intensities: torch.Tensor, air_policy: str) -> None:
+    is_air = raw_intensities >= air_threshold
+    num_air_rays = int(is_air.sum())
+    assert 0 < num_air_rays < len(raw_intensities)
+
+    dataset = XRayDataset(
+        xray_dir,
+        None,
+        s=1,
+        k=0.1,
+        air_policy=air_policy,
+        air_threshold=air_threshold,
+        air_keep_fraction=0.5,
+    )
+    if air_policy == "keep":
+        assert len(dataset) == len(raw_intensities)
+        assert dataset.ray_ids is None
+        return
+
+    ray_ids = dataset.ray_ids.long()
+    # Every ray through matter is kept, and the intensities are those of the kept rays
+    assert int((~is_air[ray_ids]).sum()) == len(raw_intensities) - num_air_rays
+    torch.testing.assert_close(dataset.intensities, torch.log(raw_intensities[ray_ids] + 0.1))
+
+    num_kept_air_rays = int(is_air[ray_ids].sum())
+    if air_policy == "subsample":
+        assert 0 < num_kept_air_rays < num_air_rays
+    else:
+        assert num_kept_air_rays == 0
+
+    if air_policy == "constrain":
+        assert torch.equal(dataset.air_ray_ids.long(), torch.nonzero(is_air).squeeze(1))
+        points = dataset.sample_air_points(100, torch.device("cpu"))
+        assert points.shape == (100, 3)
+        assert (points[:, :2].norm(dim=1) <= 1 + 1e-5).all()
+    else:
+        with pytest.raises(ValueError, match="constrain"):
+            dataset.sample_air_points(100, torch.device("cpu"))
+
+
+def test_compact_geometry_matches_full_rays_after_culling(xray_dir: Path) -> None:
+    full = XRayDataset(xray_dir, None, s=1, k=0.1, air_policy="drop", air_threshold=air_threshold)
+    compact = XRayDataset(
+        xray_dir,
+        None,
+        s=1,
+        k=0.1,
+        compact=True,
+        air_policy="drop",
+        air_threshold=air_threshold,
+    )
+    start_positions, heading_vectors, _ = compact.get_ray_geometry(torch.arange(len(compact)))
+    torch.testing.assert_close(start_positions, full.start_positions)
+    torch.testing.assert_close(heading_vectors, full.heading_vectors)
+
+
+@pytest.mark.parametrize("dtype", [torch.float32, torch.float16, torch.bfloat16, torch.float64])
+@pytest.mark.parametrize(
+    ("attenuation_scaling_factor", "s", "k"),
+    [(None, 2, 0.1), (3, None, None)],
+)
+def test_scale_intensities_matches_fp64(
+    dtype: torch.dtype,
+    attenuation_scaling_factor: float | None,
+    s: float | None,
+    k: float | None,
+) -> None:
+    intensities = torch.rand(1000, generator=torch.Generator().manual_seed(0))
+    reference = intensities.double()
+    if attenuation_scaling_factor is not None:
+        reference = reference.pow(1 / attenuation_scaling_factor)
+    else:
+        reference = reference.add(k).log().div(s)
+
+    # A chunk size that does not divide the number of intensities covers the partial last chunk
+    scaled = scale_intensities(intensities.clone(), attenuation_scaling_factor, s, k, dtype, 64)
+    assert scaled.dtype == dtype
+    # Scaling in single precision adds a few float32 rounding errors to the rounding of the cast
+    rtol = max(torch.finfo(dtype).eps, 1e-6)
+    torch.testing.assert_close(scaled.double(), reference, rtol=rtol, atol=1e-6)
+
+
+def test_scale_intensities_in_place() -> None:
+    intensities = torch.tensor([0.5, 1.0, 0.0])
+    scaled = scale_intensities(intensities, None, 1, 0, torch.float32)
+    assert scaled.data_ptr() == intensities.data_ptr()
+    # An intensity of zero gives -inf after the log, which is replaced by a finite value
+    assert torch.isfinite(scaled).all()
+
+
+def test_bin_intensities() -> None:
+    width, height, binning = 7, 5, 2
+    intensities = torch.rand(3 * height * width)
+    binned = bin_intensities(intensities, [width, height], binning)
+    assert binned.shape == (3 * (height // binning) * (width // binning),)
+
+    # Average each whole block by hand, dropping the last row and column
+    images = intensities.reshape(3, height, width)
+    expected = torch.empty(3, height // binning, width // binning)
+    for row in range(height // binning):
+        for column in range(width // binning):
+            block = images[
+                :,
+                row * binning : (row + 1) * binning,
+                column * binning : (column + 1) * binning,
+            ]
+            expected[:, row, column] = block.mean(dim=(1, 2))
+    torch.testing.assert_close(binned, expected.reshape(-1))
+
+    assert bin_intensities(intensities, [width, height], 1) is intensities
+
+
+def test_binned_levels(xray_dir: Path, raw_intensities: torch.Tensor) -> None:
+    full = XRayDataset(xray_dir, None, s=1, k=0.1, binning_factors=[2])
+    compact = XRayDataset(xray_dir, None, s=1, k=0.1, compact=True, binning_factors=[2])
+    metadata = get_dataset_metadata(xray_dir)
+    width, height = metadata["size"]
+    num_projections = len(metadata["file_angle_map"])
+
+    for dataset in (full, compact):
+        dataset.set_binning(2)
+        assert len(dataset) == num_projections * (width // 2) * (height // 2)
+        expected = bin_intensities(raw_intensities, [width, height], 2)
+        torch.testing.assert_close(dataset.intensities, torch.log(expected + 0.1))
+        with pytest.raises(ValueError, match="binning factor 4"):
+            dataset.set_binning(4)
+
+    # Each binned ray passes through the centre of its block of pixels
+    start_positions, heading_vectors, ray_bounds = compact.get_ray_geometry(
+        torch.arange(len(compact)),
+    )
+    torch.testing.assert_close(start_positions, full.start_positions)
+    torch.testing.assert_close(heading_vectors, full.heading_vectors)
+    torch.testing.assert_close(ray_bounds, full.ray_bounds, rtol=0, atol=1e-3)
+    pixel_size = 2 / (torch.tensor([width, height]) - 1)
+    first_pixel = full.start_positions[0, 1:]
+    torch.testing.assert_close(first_pixel, -1 + pixel_size / 2)
+
+    full.set_binning(1)
+    assert len(full) == num_projections * width * height
@@ -0,0 +1,57 @@
+from pathlib import Path
+
+import torch
+
+from ctnerf.model import VoxelGridModel, XRayModel
+from ctnerf.setup.config import DistillationConfig
+from ctnerf.training import distillation
+
+
+def _config(teacher: torch.nn.Module, edge_resolution: int) -> DistillationConfig:
+    student = XRayModel(2, 8, 2)
+    return DistillationConfig(
+        teacher=teacher,
+        student=student,
+        optimizer=torch.optim.Adam(student.parameters()),
+        device=torch.device("cpu"),
+        batch_size=4096,
+        num_epochs=1,
+        steps_per_epoch=1,
+        edge_fraction=0.5,
+        edge_resolution=edge_resolution,
+        checkpoint_dir=Path(),
+        checkpoint_interval=1,
+        tracker=None,
+        model_config={},
+        attenuation_scaling_factor=None,
+        eval_image_size=(4, 4, 4),
+        eval_chunk_size=1024,
+    )
+
+
+def test_sample_points_stay_in_the_volume() -> None:
+    torch.manual_seed(0)
+    conf = _config(XRayModel(4, 16, 4), 8)
+    edge_cdf = distillation._get_edge_cdf(conf)  # noqa: SLF001
+    assert edge_cdf.shape == (8**3,)
+
+    points = distillation._sample_points(edge_cdf, conf)  # noqa: SLF001
+    assert points.shape == (4096, 3)
+    assert (points >= -1).all()
+    assert (points <= 1).all()
+
+
+def test_edge_points_follow_the_edges_of_the_teacher() -> None:
+    torch.manual_seed(0)
+    # A teacher with a single edge, a step along x between two voxels of the edge grid
+    teacher = VoxelGridModel(resolution=(8, 8, 8))
+    with torch.no_grad():
+        teacher.volume[..., 4:] = 1
+    conf = _config(teacher, 8)
+
+    points = distillation._sample_points(distillation._get_edge_cdf(conf), conf)  # noqa: SLF001
+    assert (points >= -1).all()
+    assert (points <= 1).all()
+    # The edge points are drawn from the two voxels next to the step, at x = -1 / 7 and 1 / 7
+    edge_points = points[: int(conf.batch_size * conf.edge_fraction)]
+    assert (edge_points[:, 0].abs() < 3 / 7).all()
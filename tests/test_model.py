@@ -0,0 +1,160 @@
+import pytest
+import torch
+
+from ctnerf.model import (
+    HashGridModel,
+    LowRankLinear,
+    TensorVMModel,
+    VoxelGridModel,
+    XRayModel,
+)
+from ctnerf.setup.setup_functions import get_model
+
+
+def _lattice() -> tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+    return torch.linspace(-1, 1, 17), torch.linspace(-1, 1, 13), torch.linspace(-1, 1, 11)
+
+
+def _dense(
+    model: torch.nn.Module,
+    x: torch.Tensor,
+    y: torch.Tensor,
+    z: torch.Tensor,
+) -> torch.Tensor:
+    """Evaluate a model at the points of meshgrid((x, y, z), indexing="xy") with forward."""
+    coords = torch.stack(torch.meshgrid(x, y, z, indexing="xy"), dim=-1)
+    with torch.no_grad():
+        return model(coords.reshape(-1, 3)).reshape(*coords.shape[:-1], -1)
+
+
+def test_forward_lattice_matches_forward() -> None:
+    torch.manual_seed(0)
+    model = XRayModel(8, 64, 10)
+    x, y, z = _lattice()
+    lattice = model.forward_lattice(x, y, z)
+    assert lattice.shape == (len(y), len(x), len(z), 1)
+    assert (lattice - _dense(model, x, y, z)).abs().max() < 1e-7
+
+
+def test_hash_grid_model_forward() -> None:
+    torch.manual_seed(0)
+    model = HashGridModel(
+        n_levels=4,
+        log2_hashmap_size=10,
+        base_resolution=4,
+        max_resolution=32,
+        hidden_dim=16,
+    )
+    # The coarse levels fit in their tables and are indexed directly, the fine ones are hashed
+    assert model.resolutions == [4, 8, 16, 32]
+    assert model.table_sizes == [5**3, 9**3, 2**10, 2**10]
+
+    points = torch.rand(100, 3) * 2 - 1
+    output = model(points)
+    assert output.shape == (100, 1)
+    output.sum().backward()
+    assert (model.embeddings.grad != 0).any()
+
+
+@pytest.mark.parametrize(
+    ("model_conf", "model_type"),
+    [
+        ({"n_layers": 4, "layer_dim": 16, "L": 4}, XRayModel),
+        ({"encoding": "sinusoidal", "n_layers": 4, "layer_dim": 16, "L": 4}, XRayModel),
+        ({"encoding": "hashgrid", "n_levels": 2, "log2_hashmap_size": 8}, HashGridModel),
+        ({"encoding": "voxelgrid", "grid_resolution": 8}, VoxelGridModel),
+        ({"encoding": "tensorvm", "grid_resolution": [8, 6, 4], "n_components": 2}, TensorVMModel),
+    ],
+)
+def test_get_model_dispatches_on_encoding(model_conf: dict, model_type: type) -> None:
+    model = get_model({"model": model_conf, "device": "cpu"})
+    assert type(model) is model_type
+    assert model(torch.rand(10, 3) * 2 - 1).shape == (10, 1)
+
+
+def test_get_model_rejects_unknown_encodings() -> None:
+    with pytest.raises(ValueError, match="Unknown encoding"):
+        get_model({"model": {"encoding": "fourier"}, "device": "cpu"})
+
+
+@torch.no_grad()
+def test_voxel_grid_model_orientation() -> None:
+    torch.manual_seed(0)
+    model = VoxelGridModel(resolution=(4, 5, 6))
+    model.volume.normal_()
+    assert model.volume.shape == (1, 1, 6, 5, 4)
+
+    # The corner voxels are centred on the corners of the volume, (z, y, x) order
+    corners = torch.tensor([[-1.0, -1, -1], [1, -1, -1], [-1, 1, -1], [-1, -1, 1]])
+    expected = model.volume[0, 0, [0, 0, 0, -1], [0, 0, -1, 0], [0, -1, 0, 0]]
+    torch.testing.assert_close(model(corners).view(-1), expected)
+
+    # Resampling to the size of the grid gives back the grid
+    torch.testing.assert_close(model.resample((6, 5, 4)), model.volume[0, 0])
+
+    # A resampled image holds the model at the lattice of run_inference, in (z, y, x) order
+    x, y, z = _lattice()
+    image = model.resample((len(z), len(y), len(x)))
+    torch.testing.assert_close(image, _dense(model, x, y, z)[..., 0].permute(2, 0, 1))
+
+
+@torch.no_grad()
+def test_tensor_vm_model_orientation() -> None:
+    torch.manual_seed(0)
+    model = TensorVMModel(resolution=(4, 5, 6), n_components=3)
+
+    # The volume is the sum of the products of the planes and lines, in (z, y, x) order
+    xy, xz, yz = (plane[0] for plane in model.planes)
+    z, y, x = (line[0, :, :, 0] for line in model.lines)
+    volume = (
+        torch.einsum("ryx,rz->zyx", xy, z)
+        + torch.einsum("rzx,ry->zyx", xz, y)
+        + torch.einsum("rzy,rx->zyx", yz, x)
+    )
+    torch.testing.assert_close(model.resample((6, 5, 4)), volume)
+
+    # A resampled image holds the model at the lattice of run_inference, in (z, y, x) order
+    x, y, z = _lattice()
+    image = model.resample((len(z), len(y), len(x)))
+    assert image.shape == (len(z), len(y), len(x))
+    expected = _dense(model, x, y, z)[..., 0].permute(2, 0, 1)
+    torch.testing.assert_close(image, expected, rtol=1e-4, atol=1e-5)
+
+
+@torch.no_grad()
+def test_pruning_to_the_full_width_reproduces_the_model() -> None:
+    torch.manual_seed(0)
+    model = XRayModel(6, 32, 4)
+    points = torch.rand(1000, 3) * 2 - 1
+    torch.testing.assert_close(model.pruned(32)(points), model(points))
+
+    pruned = model.pruned(16)
+    assert pruned.layer_dim == 16
+    assert pruned.middle_layer.weight.shape == (16, 16 + 3 * 2 * 4)
+    assert pruned(points).shape == (1000, 1)
+
+
+@torch.no_grad()
+def test_low_rank_at_full_rank_reproduces_the_model() -> None:
+    torch.manual_seed(0)
+    model = XRayModel(6, 32, 4)
+    points = torch.rand(1000, 3) * 2 - 1
+    factorised = model.low_rank(32)
+    assert all(isinstance(layer, LowRankLinear) for layer in factorised.pre_concat_layers)
+    torch.testing.assert_close(factorised(points), model(points), rtol=1e-4, atol=1e-5)
+
+    # A factorised model can be factorised again, and pruned back to a dense model
+    torch.testing.assert_close(factorised.low_rank(32)(points), model(points), rtol=1e-4, atol=1e-5)
+    torch.testing.assert_close(factorised.pruned(32)(points), model(points), rtol=1e-4, atol=1e-5)
+    assert model.low_rank(4)(points).shape == (1000, 1)
+
+
+@torch.no_grad()
+def test_low_rank_linear_factorises_a_dense_layer() -> None:
+    torch.manual_seed(0)
+    dense = torch.nn.Linear(16, 16)
+    layer = LowRankLinear(16, 16, 16)
+    layer.factorise(dense.weight, dense.bias)
+    torch.testing.assert_close(layer.dense_weight(), dense.weight, rtol=1e-4, atol=1e-5)
+    inputs = torch.rand(10, 16)
+    torch.testing.assert_close(layer(inputs), dense(inputs), rtol=1e-4, atol=1e-5)
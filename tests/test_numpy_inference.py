@@ -0,0 +1,102 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+import torch
+
+from ctnerf.constants import MU_WATER
+from ctnerf.image_creation import numpy_inference
+from ctnerf.image_creation.ct_creation import run_inference
+from ctnerf.model import XRayModel
+
+
+@pytest.fixture(params=[None, 8], ids=["dense", "low_rank"])
+def models(
+    request: pytest.FixtureRequest,
+    tmp_path: Path,
+) -> tuple[XRayModel, numpy_inference.NumpyXRayModel]:
+    """Get an XRayModel and the NumpyXRayModel loaded from its checkpoint."""
+    torch.manual_seed(0)
+    model = XRayModel(4, 32, 6, rank=request.param).eval()
+    # Shift the output of the random model to around the attenuation of water, so that images are
+    # not clamped to -1024 HU everywhere
+    torch.nn.init.constant_(model.output_layer.bias, MU_WATER)
+    checkpoint_path = tmp_path / "1.pt"
+    torch.save(
+        {
+            "coarse_model_state_dict": model.state_dict(),
+            "model_config": {"n_layers": 4, "layer_dim": 32, "L": 6, "rank": request.param},
+        },
+        checkpoint_path,
+    )
+    state_dict = numpy_inference.load_state_dict(checkpoint_path)
+    return model, numpy_inference.NumpyXRayModel(state_dict)
+
+
+@torch.no_grad()
+def test_forward_matches_torch(models: tuple[XRayModel, numpy_inference.NumpyXRayModel]) -> None:
+    model, numpy_model = models
+    points = torch.rand(5000, 3) * 2 - 1
+    output = numpy_model.forward(points.numpy())
+    assert output.dtype == np.float32
+    assert np.abs(output - model(points).numpy()).max() < 1e-7
+
+
+@torch.no_grad()
+def test_forward_lattice_matches_torch(
+    models: tuple[XRayModel, numpy_inference.NumpyXRayModel],
+) -> None:
+    model, numpy_model = models
+    x, y, z = numpy_inference.lattice_axes((9, 7, 5))
+    expected = model.forward_lattice(*(torch.from_numpy(values) for values in (x, y, z)))
+    assert np.abs(numpy_model.forward_lattice(x, y, z) - expected.numpy()).max() < 1e-7
+
+
+def test_run_inference_matches_torch(
+    models: tuple[XRayModel, numpy_inference.NumpyXRayModel],
+) -> None:
+    model, numpy_model = models
+    expected = run_inference(model, (9, 7, 5), 50, None, "cpu").numpy()
+    output = numpy_inference.run_inference(numpy_model, (9, 7, 5), 50, None)
+    assert output.shape == expected.shape
+    assert (expected > -1024).all()
+    # 1 HU is an attenuation of about 2e-4 per cm
+    assert np.abs(output - expected).max() < 1e-3
+
+
+def test_only_sinusoidal_models_are_loaded(tmp_path: Path) -> None:
+    checkpoint_path = tmp_path / "1.pt"
+    torch.save(
+        {"coarse_model_state_dict": {}, "model_config": {"encoding": "hashgrid"}},
+        checkpoint_path,
+    )
+    with pytest.raises(ValueError, match="sinusoidal"):
+        numpy_inference.load_state_dict(checkpoint_path)
+
+
+def test_checkpoint_path() -> None:
+    conf_dict = {"checkpoint": {"checkpoint_dir": "run", "resume_epoch": 3}}
+    assert numpy_inference.get_checkpoint_path(conf_dict, Path("models")) == Path("models/run/3.pt")
+    conf_dict = {"checkpoint": {"checkpoint_dir": None}}
+    assert numpy_inference.get_checkpoint_path(conf_dict, Path("models")) is None
+
+
+def test_xray_metadata(tmp_path: Path) -> None:
+    metadata = {"size": [4, 4], "spacing": [1.0, 1.0]}
+    (tmp_path / "dataset").mkdir()
+    (tmp_path / "dataset" / "meta.json").write_text(json.dumps(metadata))
+
+    conf_dict = {"xray_dir": "dataset", "image_size": [4, 4, 4]}
+    assert numpy_inference.get_xray_metadata(conf_dict, tmp_path) == metadata
+    conf_dict = {"xray_size": [8, 8], "xray_pixel_spacing": [0.5, 0.5], "voxel_spacing": [1, 1, 1]}
+    assert numpy_inference.get_xray_metadata(conf_dict, tmp_path) == {
+        "size": [8, 8],
+        "spacing": [0.5, 0.5],
+    }
+    # xray_metadata takes precedence
+    conf_dict = {"xray_dir": "dataset", "image_size": [4, 4, 4], "xray_metadata": {"size": [2, 2]}}
+    assert numpy_inference.get_xray_metadata(conf_dict, tmp_path) == {"size": [2, 2]}
+
+    with pytest.raises(ValueError, match="image_size or voxel_spacing"):
+        numpy_inference.get_xray_metadata({"xray_dir": "dataset"}, tmp_path)
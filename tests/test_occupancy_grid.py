@@ -0,0 +1,149 @@
+import torch
+
+from ctnerf.constants import MU_WATER
+from ctnerf.model import XRayModel
+from ctnerf.occupancy_grid import OccupancyGrid
+from ctnerf.rays import beer_lambert_law
+
+
+class _ConstantModel(torch.nn.Module):
+    def __init__(self, value: float) -> None:
+        super().__init__()
+        self.value = value
+
+    def forward(self, coords: torch.Tensor) -> torch.Tensor:
+        return torch.full((len(coords), 1), self.value)
+
+
+def _grid_with_one_occupied_cell() -> OccupancyGrid:
+    grid = OccupancyGrid(resolution=4)
+    grid.occupied.zero_()
+    grid.occupied[1, 2, 3] = True
+    return grid
+
+
+def test_query_skips_empty_cells() -> None:
+    torch.manual_seed(0)
+    grid = _grid_with_one_occupied_cell()
+    model = XRayModel(2, 16, 4)
+    # Cell 1, 2, 3 spans [-0.5, 0] x [0, 0.5] x [0.5, 1]
+    points = torch.tensor([[-0.25, 0.25, 0.75], [0.25, 0.25, 0.75], [-0.9, -0.9, -0.9]])
+    assert grid.is_occupied(points).tolist() == [True, False, False]
+
+    output = grid.query(model, points)
+    assert output.shape == (3, 1)
+    torch.testing.assert_close(output[0], model(points[:1])[0])
+    assert (output[1:] == 0).all()
+
+
+def test_lattice_mask_matches_is_occupied() -> None:
+    torch.manual_seed(0)
+    grid = OccupancyGrid(resolution=4)
+    grid.occupied = torch.rand(4, 4, 4) < 0.5
+    x, y, z = torch.linspace(-1, 1, 9), torch.linspace(-1, 1, 7), torch.linspace(-1, 1, 5)
+    mask = grid.lattice_mask(x, y, z)
+    assert mask.shape == (len(y), len(x), len(z))
+
+    coords = torch.stack(torch.meshgrid(x, y, z, indexing="xy"), dim=-1)
+    expected = grid.is_occupied(coords.reshape(-1, 3)).reshape(mask.shape)
+    assert torch.equal(mask, expected)
+
+    # The masked lattice is the dense lattice with the empty points set to zero
+    model = XRayModel(2, 16, 4)
+    output = model.forward_lattice(x, y, z, mask)
+    dense = model.forward_lattice(x, y, z)
+    torch.testing.assert_close(output[mask], dense[mask])
+    assert (output[~mask] == 0).all()
+
+
+def test_update_marks_cells_from_the_model() -> None:
+    grid = OccupancyGrid(resolution=4, decay=0.5, explore_fraction=0)
+    assert grid.occupied_fraction() == 1
+
+    grid.update(_ConstantModel(0))
+    assert grid.occupied_fraction() == 0
+
+    grid.update(_ConstantModel(MU_WATER))
+    assert grid.occupied_fraction() == 1
+
+    # The estimate decays towards the new attenuation, so cells stay occupied for a few updates
+    grid.update(_ConstantModel(0))
+    assert grid.occupied_fraction() == 1
+    for _ in range(10):
+        grid.update(_ConstantModel(0))
+    assert grid.occupied_fraction() == 0
+    assert grid.num_updates == 13
+
+
+def test_update_from_xray_model_matches_the_generic_path() -> None:
+    torch.manual_seed(0)
+    model = XRayModel(2, 16, 4)
+    torch.nn.init.constant_(model.output_layer.bias, MU_WATER / 2)
+    grids = [OccupancyGrid(resolution=8, threshold_hu=-500) for _ in range(2)]
+
+    # The same jitter is drawn for both grids, one through forward_lattice and one through forward
+    torch.manual_seed(1)
+    grids[0].update(model)
+    torch.manual_seed(1)
+    grids[1].update(lambda coords: model(coords))  # noqa: PLW0108
+    torch.testing.assert_close(grids[0].attenuation, grids[1].attenuation)
+    assert torch.equal(grids[0].occupied, grids[1].occupied)
+
+
+def test_update_keeps_some_empty_cells_occupied() -> None:
+    torch.manual_seed(0)
+    grid = OccupancyGrid(resolution=16, explore_fraction=0.1)
+    grid.update(_ConstantModel(0))
+    assert 0.05 < grid.occupied_fraction() < 0.15
+
+    # The explored cells are drawn again at each update
+    occupied = grid.occupied.clone()
+    grid.update(_ConstantModel(0))
+    assert not torch.equal(grid.occupied, occupied)
+
+
+def test_step_waits_for_the_warmup() -> None:
+    grid = OccupancyGrid(resolution=4, update_interval=2, warmup_steps=5, explore_fraction=0)
+    model = _ConstantModel(0)
+    assert [grid.step(model) for _ in range(8)] == [False] * 5 + [True, False, True]
+    assert grid.num_updates == 2
+    assert grid.occupied_fraction() == 0
+
+
+def test_training_from_scratch_with_the_grid() -> None:
+    torch.manual_seed(0)
+    # Parallel rays along the x axis, through a cylinder of water of radius 0.5 around the x axis
+    n_rays, n_samples = 128, 32
+    t = torch.linspace(-1, 1, n_samples)
+    distances = torch.full((n_rays, n_samples), 2 / n_samples)
+    model = XRayModel(4, 64, 6)
+    # The model starts at zero attenuation everywhere, so an update would find every cell empty
+    torch.nn.init.zeros_(model.output_layer.weight)
+    torch.nn.init.zeros_(model.output_layer.bias)
+    grid = OccupancyGrid(resolution=16, update_interval=5, warmup_steps=30)
+    optimizer = torch.optim.Adam(model.parameters(), lr=1e-3)
+
+    losses = []
+    for step in range(1, 151):
+        yz = torch.rand(n_rays, 2) * 2 - 1
+        intensities = torch.exp(-MU_WATER * 20 * (yz.norm(dim=1) < 0.5).float())
+        samples = torch.cat(
+            (t[None, :, None].expand(n_rays, -1, 1), yz[:, None].expand(-1, n_samples, 2)),
+            dim=-1,
+        )
+
+        attenuation = grid.query(model, samples.reshape(-1, 3)).reshape(n_rays, n_samples)
+        intensity_pred = beer_lambert_law(attenuation, distances, None, None, 20)
+        loss = torch.mean((intensity_pred - intensities) ** 2)
+        loss.backward()
+        optimizer.step()
+        optimizer.zero_grad()
+        losses.append(loss.item())
+
+        grid.step(model)
+        if step < 30:
+            assert grid.occupied_fraction() == 1
+
+    assert grid.num_updates == 25
+    assert 0 < grid.occupied_fraction() < 1
+    assert sum(losses[-10:]) < sum(losses[:10]) / 4
@@ -0,0 +1,48 @@
+import pytest
+import torch
+
+from ctnerf.model import VoxelGridModel, XRayModel
+from ctnerf.setup.setup_functions import quantize_model
+
+
+@pytest.fixture
+def model_and_points() -> tuple[XRayModel, torch.Tensor]:
+    torch.manual_seed(0)
+    return XRayModel(8, 128, 20).eval(), torch.rand(20000, 3) * 2 - 1
+
+
+@torch.no_grad()
+def test_int8_matches_fp32(model_and_points: tuple[XRayModel, torch.Tensor]) -> None:
+    model, points = model_and_points
+    reference = model(points)
+    error = (quantize_model(model, "cpu")(points) - reference).abs()
+    assert error.mean() < 5e-4
+    assert error.max() < 5e-3
+
+
+@torch.no_grad()
+def test_bf16_matches_fp32(model_and_points: tuple[XRayModel, torch.Tensor]) -> None:
+    model, points = model_and_points
+    reference = model(points)
+    with torch.autocast("cpu", dtype=torch.bfloat16):
+        output = model(points)
+    error = (output.float() - reference).abs()
+    assert error.mean() < 3e-4
+    assert error.max() < 3e-3
+
+
+@torch.no_grad()
+def test_int8_forward_lattice(model_and_points: tuple[XRayModel, torch.Tensor]) -> None:
+    model, _ = model_and_points
+    quantized = quantize_model(model, "cpu")
+    x, y, z = torch.linspace(-1, 1, 9), torch.linspace(-1, 1, 7), torch.linspace(-1, 1, 5)
+    coords = torch.stack(torch.meshgrid(x, y, z, indexing="xy"), dim=-1)
+    dense = quantized(coords.reshape(-1, 3)).reshape(*coords.shape[:-1], 1)
+    torch.testing.assert_close(quantized.forward_lattice(x, y, z), dense, rtol=0, atol=1e-4)
+
+
+def test_int8_is_only_supported_for_xray_models_on_cpu() -> None:
+    with pytest.raises(ValueError, match="sinusoidal"):
+        quantize_model(VoxelGridModel((4, 4, 4)), "cpu")
+    with pytest.raises(ValueError, match="cpu"):
+        quantize_model(XRayModel(2, 8, 2), "cuda")
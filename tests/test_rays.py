@@ -0,0 +1,81 @@
+import pytest
+import torch
+
+from ctnerf.rays import (
+    beer_lambert_law,
+    get_packed_samples,
+    get_sampling_distances,
+    packed_beer_lambert_law,
+)
+
+
+def _rays(ray_bounds: torch.Tensor) -> tuple[torch.Tensor, torch.Tensor]:
+    """Get parallel rays along the negative x axis, spread along y."""
+    n_rays = ray_bounds.shape[0]
+    start_positions = torch.stack(
+        (torch.ones(n_rays), torch.linspace(-0.5, 0.5, n_rays), torch.zeros(n_rays)),
+        dim=1,
+    )
+    heading_vectors = torch.tensor([-1.0, 0, 0]).expand(n_rays, 3)
+    return start_positions, heading_vectors
+
+
+@pytest.mark.parametrize(("s", "k"), [(None, None), (2, 0.1)])
+def test_packed_matches_dense_on_equal_sample_counts(s: float | None, k: float | None) -> None:
+    torch.manual_seed(0)
+    n_rays, n_samples = 16, 8
+    ray_bounds = torch.tensor([[0.0, 2.0]]).repeat(n_rays, 1)
+    start_positions, heading_vectors = _rays(ray_bounds)
+
+    t_samples, samples, distances, ray_indices = get_packed_samples(
+        start_positions,
+        heading_vectors,
+        ray_bounds,
+        2 / n_samples,
+    )
+    assert torch.equal(ray_indices, torch.arange(n_rays).repeat_interleave(n_samples))
+    torch.testing.assert_close(
+        distances.reshape(n_rays, n_samples),
+        get_sampling_distances(t_samples.reshape(n_rays, n_samples), ray_bounds),
+    )
+    torch.testing.assert_close(
+        samples,
+        start_positions[ray_indices] + t_samples.unsqueeze(1) * heading_vectors[ray_indices],
+    )
+
+    attenuation_coeffs = torch.rand(n_rays * n_samples)
+    packed = packed_beer_lambert_law(attenuation_coeffs, distances, ray_indices, n_rays, s, k, 2)
+    dense = beer_lambert_law(
+        attenuation_coeffs.reshape(n_rays, n_samples),
+        distances.reshape(n_rays, n_samples),
+        s,
+        k,
+        2,
+    )
+    torch.testing.assert_close(packed, dense)
+
+
+def test_packed_sample_counts_follow_ray_lengths() -> None:
+    torch.manual_seed(0)
+    # Exactly representable bounds and step size, so the counts are not affected by rounding
+    step_size = 0.125
+    ray_bounds = torch.tensor([[0.0, 2.0], [0.5, 1.5], [0.75, 1.25], [1.0, 1.0]])
+    start_positions, heading_vectors = _rays(ray_bounds)
+
+    t_samples, _, distances, ray_indices = get_packed_samples(
+        start_positions,
+        heading_vectors,
+        ray_bounds,
+        step_size,
+    )
+    counts = torch.bincount(ray_indices, minlength=len(ray_bounds))
+    # A ray of length zero still gets one sample
+    assert counts.tolist() == [16, 8, 4, 1]
+
+    # The samples stay within their ray bounds, and their distances add up to the far bound
+    assert (t_samples >= ray_bounds[ray_indices, 0]).all()
+    assert (t_samples <= ray_bounds[ray_indices, 1]).all()
+    assert (distances >= 0).all()
+    first_samples = torch.cumsum(counts, dim=0) - counts
+    total_distances = torch.zeros(len(ray_bounds)).index_add(0, ray_indices, distances)
+    torch.testing.assert_close(total_distances, ray_bounds[:, 1] - t_samples[first_samples])
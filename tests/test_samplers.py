@@ -0,0 +1,55 @@
+import torch
+
+from ctnerf.training.samplers import BlockShuffleSampler, LossWeightedSampler
+
+
+def test_loss_weighted_sampler_weights_are_one_under_uniform_losses() -> None:
+    torch.manual_seed(0)
+    sampler = LossWeightedSampler(4096, tile_size=64)
+    for _ in range(20):
+        indices = sampler.sample(512)
+        assert indices.min() >= 0
+        assert indices.max() < 4096
+        torch.testing.assert_close(sampler.weights, torch.ones(512))
+        sampler.update(torch.ones(512))
+
+
+def test_loss_weighted_sampler_weights_average_to_one() -> None:
+    torch.manual_seed(0)
+    # The last tile is shorter than the others, and the losses are far from uniform
+    sampler = LossWeightedSampler(1000, tile_size=64)
+    sampler.sample(1000)
+    sampler.update(torch.rand(1000) * 10)
+
+    indices = sampler.sample(200_000)
+    assert indices.max() < 1000
+    assert abs(sampler.weights.mean().item() - 1) < 0.01
+    assert sampler.weights.max() <= 1 / sampler.uniform_mix + 1e-4
+
+
+def test_block_shuffle_sampler_covers_each_index_once_per_epoch() -> None:
+    torch.manual_seed(0)
+    # The last block is partial, and the last window holds fewer blocks than the others
+    num_rays = 1000
+    sampler = BlockShuffleSampler(range(num_rays), block_size=16, window_blocks=5)
+    assert len(sampler) == num_rays
+
+    for _ in range(2):
+        indices = list(sampler)
+        assert sorted(indices) == list(range(num_rays))
+        assert indices != list(range(num_rays))
+
+    # Batches drawn by sample carry on into the next epoch without repeating or skipping rays
+    batches = torch.cat([sampler.sample(300) for _ in range(7)])
+    for epoch in batches[: 2 * num_rays].split(num_rays):
+        assert sorted(epoch.tolist()) == list(range(num_rays))
+
+
+def test_block_shuffle_sampler_keeps_blocks_within_windows() -> None:
+    torch.manual_seed(0)
+    sampler = BlockShuffleSampler(range(1024), block_size=16, window_blocks=4)
+    indices = torch.tensor(list(sampler))
+    for window in indices.split(16 * 4):
+        blocks = torch.div(window, 16, rounding_mode="floor")
+        assert len(blocks.unique()) == 4
+        assert torch.bincount(blocks).max() == 16
@@ -0,0 +1,131 @@
+import copy
+from dataclasses import fields, replace
+from pathlib import Path
+
+import torch
+
+from ctnerf.model import XRayModel
+from ctnerf.ray_sampling import uniform_sampling
+from ctnerf.rays import beer_lambert_law, get_coarse_samples
+from ctnerf.setup.config import SweepMember, TrainingConfig
+from ctnerf.training import training
+
+
+def _config() -> TrainingConfig:
+    """Get a training configuration with only the fields used by _sweep_step set."""
+    return TrainingConfig(
+        **{field.name: None for field in fields(TrainingConfig)}
+        | {
+            "batch_size": 16,
+            "loss_fn": torch.nn.MSELoss(reduction="none"),
+            "use_amp": False,
+            "device": torch.device("cpu"),
+            "n_coarse_samples": 8,
+            "coarse_sampling_function": uniform_sampling,
+            "slice_size_cm": 20,
+        },
+    )
+
+
+def _rays(conf: TrainingConfig) -> tuple[torch.Tensor, ...]:
+    start_positions = torch.cat((torch.ones(conf.batch_size, 1), torch.rand(conf.batch_size, 2)), 1)
+    heading_vectors = torch.tensor([-1.0, 0, 0]).expand(conf.batch_size, 3)
+    intensities = torch.rand(conf.batch_size)
+    ray_bounds = torch.tensor([[0.0, 2.0]]).expand(conf.batch_size, 2)
+    return start_positions, heading_vectors, intensities, ray_bounds
+
+
+def test_sweep_step_matches_separate_steps() -> None:
+    torch.manual_seed(0)
+    conf = _config()
+    lrs = [1e-3, 1e-2]
+    members = [SweepMember(str(lr), XRayModel(2, 16, 4), lr, None, Path(), {}) for lr in lrs]
+    references = [copy.deepcopy(member.model) for member in members]
+    optimizers = [
+        torch.optim.Adam(model.parameters(), fused=True, lr=lr)
+        for model, lr in zip(references, lrs, strict=True)
+    ]
+    (stack,) = training._get_member_stacks(members)  # noqa: SLF001
+
+    for step in range(3):
+        start_positions, heading_vectors, intensities, ray_bounds = _rays(conf)
+        torch.manual_seed(step)
+        losses = training._sweep_step(  # noqa: SLF001
+            stack,
+            start_positions,
+            heading_vectors,
+            intensities,
+            ray_bounds,
+            None,
+            conf,
+        )
+
+        # The members share the same samples, drawn from the same seed
+        torch.manual_seed(step)
+        _, samples, distances = get_coarse_samples(
+            start_positions,
+            heading_vectors,
+            conf.n_coarse_samples,
+            conf.batch_size,
+            conf.device,
+            ray_bounds,
+            None,
+            conf.coarse_sampling_function,
+        )
+        for model, optimizer, loss in zip(references, optimizers, losses, strict=True):
+            attenuation_coeff_pred = model(samples).reshape(conf.batch_size, -1)
+            intensity_pred = beer_lambert_law(attenuation_coeff_pred, distances, None, None, 20)
+            reference_loss = torch.sum(conf.loss_fn(intensity_pred, intensities))
+            torch.testing.assert_close(loss, reference_loss.detach())
+            reference_loss.backward()
+            optimizer.step()
+            optimizer.zero_grad()
+
+    for member, model in zip(members, references, strict=True):
+        for parameter, reference in zip(member.model.parameters(), model.parameters(), strict=True):
+            torch.testing.assert_close(parameter, reference)
+
+    # The unstacked members hold their own copy of the parameters and the optimizer state
+    for index, (model, optimizer) in enumerate(zip(references, optimizers, strict=True)):
+        unstacked_model, unstacked_optimizer = training._unstack_member(stack, index)  # noqa: SLF001
+        for parameter, reference in zip(
+            unstacked_model.parameters(),
+            model.parameters(),
+            strict=True,
+        ):
+            torch.testing.assert_close(parameter, reference)
+            assert parameter.untyped_storage().size() == reference.untyped_storage().size()
+        state = unstacked_optimizer.state_dict()
+        reference_state = optimizer.state_dict()
+        assert state["param_groups"][0]["lr"] == lrs[index]
+        # The vectorised gradients are summed in a different order, so they match less closely
+        for i, values in reference_state["state"].items():
+            for key in ("exp_avg", "exp_avg_sq"):
+                torch.testing.assert_close(
+                    state["state"][i][key],
+                    values[key],
+                    rtol=1e-3,
+                    atol=1e-4,
+                )
+
+
+def test_sweep_step_skips_only_the_members_with_infinite_gradients() -> None:
+    torch.manual_seed(0)
+    conf = replace(_config(), use_amp=True)
+    members = [SweepMember(str(i), XRayModel(2, 16, 4), 1e-3, None, Path(), {}) for i in range(2)]
+    initial = [copy.deepcopy(member.model) for member in members]
+    (stack,) = training._get_member_stacks(members)  # noqa: SLF001
+    # The loss of the first member overflows when scaled
+    stack.scalers = [torch.GradScaler("cpu", init_scale=scale) for scale in (2.0**127, 2.0**16)]
+
+    training._sweep_step(stack, *_rays(conf), None, conf)  # noqa: SLF001
+
+    assert stack.scalers[0].get_scale() == 2.0**126
+    assert stack.scalers[1].get_scale() == 2.0**16
+    for parameter, reference in zip(
+        members[0].model.parameters(),
+        initial[0].parameters(),
+        strict=True,
+    ):
+        assert torch.equal(parameter, reference)
+    assert not torch.equal(members[1].model.input_layer.weight, initial[1].input_layer.weight)